@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class App1Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app1'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (keeps the student gallery in sync)
@@ -0,0 +1,83 @@
+"""
+Control plane of the camera recognition service, kept apart from
+app1/recognizer.py so the web views can start, stop and inspect the service
+without importing cv2 or the face models.
+
+The state lives in the RecognizerState row, so it needs nothing but the
+database: the views set the desired state, and `manage.py run_recognizer`
+publishes its status and heartbeat there.
+"""
+import os
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import RecognizerState
+
+STATE_ID = 1
+HEARTBEAT_TIMEOUT = 15  # seconds without a heartbeat before the service counts as down
+
+
+def _state():
+    return RecognizerState.objects.get_or_create(pk=STATE_ID)[0]
+
+
+def get_desired():
+    return _state().desired
+
+
+def set_desired(desired):
+    RecognizerState.objects.update_or_create(pk=STATE_ID, defaults={'desired': desired})
+
+
+def publish_status(status):
+    """Called by the service on every loop; `status['heartbeat']` is a time.time() stamp."""
+    RecognizerState.objects.update_or_create(pk=STATE_ID, defaults={'status': status})
+
+
+def get_status():
+    """Last status published by the service plus whether its heartbeat is fresh."""
+    state = _state()
+    status = dict(state.status) or {'state': 'exited', 'cameras': []}
+    status['alive'] = (
+        status.get('state') == 'running'
+        and time.time() - status.get('heartbeat', 0) < HEARTBEAT_TIMEOUT
+    )
+    status['desired'] = state.desired
+    return status
+
+
+def spawn_service():
+    """Start `manage.py run_recognizer` as a detached background process."""
+    subprocess.Popen(
+        [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'run_recognizer'],
+        cwd=settings.BASE_DIR,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _claim_spawn():
+    """True for exactly one caller per HEARTBEAT_TIMEOUT: a conditional UPDATE is the lock."""
+    now = timezone.now()
+    return RecognizerState.objects.filter(pk=STATE_ID).filter(
+        Q(spawned_at__isnull=True) | Q(spawned_at__lt=now - timedelta(seconds=HEARTBEAT_TIMEOUT))
+    ).update(spawned_at=now) == 1
+
+
+def request_start():
+    set_desired('running')
+    # Only spawn when no service is alive; the claim stops concurrent clicks from starting two
+    if not get_status()['alive'] and _claim_spawn():
+        spawn_service()
+
+
+def request_stop():
+    set_desired('stopped')
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Student
+from face_engine.embedding import detect_and_embed
+from face_engine.images import decode_image
+from face_engine.search import create_index
+
+EMBEDDING_DIM = 512
+
+
+def image_fingerprint(name, path):
+    """Cache key of an image file from its name, mtime and size: one stat(), no read."""
+    stat = os.stat(path)
+    return hashlib.sha256(f'{name}:{stat.st_mtime_ns}:{stat.st_size}'.encode()).hexdigest()
+
+
+def refresh_student_embedding(student):
+    """
+    Make sure `student.face_embedding` matches the current image file.
+
+    The embedding is keyed by the image name, mtime and size, so a gallery
+    rebuild only stats the files, and MTCNN and ResNet only run when the
+    image is new or has been replaced. The largest face in the photo is
+    the student. Returns True if the embedding was recomputed.
+    """
+    image_path = os.path.join(settings.MEDIA_ROOT, str(student.image))
+    image_hash = image_fingerprint(str(student.image), image_path)
+    if student.face_embedding and student.image_hash == image_hash:
+        return False
+
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    try:
+        detections = detect_and_embed(decode_image(data))
+    except ValueError:
+        detections = None  # Unreadable image file
+    student.face_embedding = detections.embeddings[detections.largest()].tolist() if detections else []
+    student.image_hash = image_hash
+    student.save(update_fields=['face_embedding', 'image_hash'])
+    return True
+
+
+class StudentGallery:
+    """
+    In-memory matrix of authorized students' embeddings for the camera loop.
+
+    Built from the stored Student.face_embedding values and rebuilt only after
+    a Student is saved or deleted, so each frame costs one probe embedding
+    plus one matrix lookup. Saves in this process invalidate it through
+    app1/signals.py. Saves from the web app happen in another process, so
+    `manage.py run_recognizer` calls refresh_if_changed() on every loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._entries = None
+        self._version = None
+
+    @staticmethod
+    def version():
+        """Cheap stamp of the Student table that changes on every insert, delete and save()."""
+        stamp = Student.objects.aggregate(count=Count('id'), last_id=Max('id'), updated=Max('updated_at'))
+        return stamp['count'], stamp['last_id'], stamp['updated']
+
+    def refresh_if_changed(self):
+        """Invalidate the gallery if the students changed since the last check. Returns True if so."""
+        version = self.version()
+        if version == self._version:
+            return False
+        self._version = version
+        self.invalidate()
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries = None
+
+    def _build(self):
+        embeddings, names, ids = [], [], []
+        for student in Student.objects.filter(authorized=True):
+            try:
+                refresh_student_embedding(student)
+            except OSError:
+                continue  # Image missing from MEDIA_ROOT
+            if len(student.face_embedding) != EMBEDDING_DIM:
+                continue  # No face found in the enrolment image
+            embeddings.append(student.face_embedding)
+            names.append(student.name)
+            ids.append(student.id)
+        matrix = np.array(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        return matrix, names, ids, create_index().build(matrix)
+
+    def get(self):
+        """Return (matrix, names, student_ids, search_index) for all authorized students."""
+        entries = self._entries
+        if entries is not None:
+            return entries
+        generation = self._generation
+        entries = self._build()
+        with self._lock:
+            # A save that landed while we were building makes this result stale
+            if generation == self._generation:
+                self._entries = entries
+        return entries
+
+
+student_gallery = StudentGallery()
@@ -0,0 +1,34 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app1.control import get_status, set_desired
+from app1.recognizer import RecognizerService
+
+
+class Command(BaseCommand):
+    help = 'Runs the headless face recognition service for every configured camera'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle', action='store_true',
+                            help='Wait for a start request from the web UI instead of starting the cameras right away')
+        parser.add_argument('--no-sound', action='store_true', help='Do not play the check-in/check-out chime')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds between camera configuration / control checks')
+
+    def handle(self, *args, **options):
+        if get_status()['alive']:
+            raise CommandError('Another recognizer service is already running.')
+
+        if not options['idle']:
+            set_desired('running')
+
+        service = RecognizerService(poll_interval=options['poll_interval'], play_sound=not options['no_sound'])
+        signal.signal(signal.SIGTERM, lambda *_: service.shutdown())
+
+        self.stdout.write(self.style.SUCCESS('Recognizer service started'))
+        try:
+            service.run_forever()
+        except KeyboardInterrupt:
+            service.shutdown()
+        self.stdout.write(self.style.SUCCESS('Recognizer service stopped'))
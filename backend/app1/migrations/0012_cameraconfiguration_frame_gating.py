@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0011_student_face_embedding_student_image_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cameraconfiguration',
+            name='frame_stride',
+            field=models.PositiveIntegerField(default=1, help_text='Consider only every Nth frame for detection (1 = every frame)'),
+        ),
+        migrations.AddField(
+            model_name='cameraconfiguration',
+            name='max_fps',
+            field=models.FloatField(default=0, help_text='Upper bound on detections per second (0 = no limit)'),
+        ),
+        migrations.AddField(
+            model_name='cameraconfiguration',
+            name='motion_threshold',
+            field=models.FloatField(default=2.0, help_text='Mean grey-level change (0-255) between downscaled frames needed to run detection (0 = always detect)'),
+        ),
+    ]
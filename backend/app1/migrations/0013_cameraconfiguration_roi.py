@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0012_cameraconfiguration_frame_gating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cameraconfiguration',
+            name='roi_left',
+            field=models.FloatField(default=0.0, help_text='Left edge of the region of interest (0-1 of frame width)'),
+        ),
+        migrations.AddField(
+            model_name='cameraconfiguration',
+            name='roi_top',
+            field=models.FloatField(default=0.0, help_text='Top edge of the region of interest (0-1 of frame height)'),
+        ),
+        migrations.AddField(
+            model_name='cameraconfiguration',
+            name='roi_right',
+            field=models.FloatField(default=1.0, help_text='Right edge of the region of interest (0-1 of frame width)'),
+        ),
+        migrations.AddField(
+            model_name='cameraconfiguration',
+            name='roi_bottom',
+            field=models.FloatField(default=1.0, help_text='Bottom edge of the region of interest (0-1 of frame height)'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0015_student_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecognizerState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desired', models.CharField(choices=[('running', 'Running'), ('stopped', 'Stopped')], default='stopped', max_length=10)),
+                ('status', models.JSONField(blank=True, default=dict)),
+                ('spawned_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
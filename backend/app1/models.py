@@ -9,6 +9,11 @@ class Student(models.Model):
     student_class = models.CharField(max_length=100)
     image = models.ImageField(upload_to='students/')
     authorized = models.BooleanField(default=False)
+    # Cached InceptionResnetV1 embedding of `image`, valid while image_hash (name, mtime, size) matches the file
+    face_embedding = models.JSONField(default=list, blank=True)
+    image_hash = models.CharField(max_length=64, blank=True, default='')
+    # Part of StudentGallery.version(), so other processes notice edits; the embedding cache writes don't touch it
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -19,6 +24,12 @@ class Attendance(models.Model):
     check_in_time = models.DateTimeField(null=True, blank=True)
     check_out_time = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        # The recognizer's get_or_create(student, date) and the per-student attendance list
+        indexes = [
+            models.Index(fields=['student', 'date'], name='attendance_student_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student.name} - {self.date}"
 
@@ -53,6 +64,37 @@ class CameraConfiguration(models.Model):
     name = models.CharField(max_length=100, unique=True, help_text="Give a name to this camera configuration")
     camera_source = models.CharField(max_length=255, help_text="Camera index (0 for default webcam or RTSP/HTTP URL for IP camera)")
     threshold = models.FloatField(default=0.6, help_text="Face recognition confidence threshold")
+    frame_stride = models.PositiveIntegerField(default=1, help_text="Consider only every Nth frame for detection (1 = every frame)")
+    max_fps = models.FloatField(default=0, help_text="Upper bound on detections per second (0 = no limit)")
+    motion_threshold = models.FloatField(default=2.0, help_text="Mean grey-level change (0-255) between downscaled frames needed to run detection (0 = always detect)")
+    # Region of interest as fractions of the frame; only this part is searched for faces
+    roi_left = models.FloatField(default=0.0, help_text="Left edge of the region of interest (0-1 of frame width)")
+    roi_top = models.FloatField(default=0.0, help_text="Top edge of the region of interest (0-1 of frame height)")
+    roi_right = models.FloatField(default=1.0, help_text="Right edge of the region of interest (0-1 of frame width)")
+    roi_bottom = models.FloatField(default=1.0, help_text="Bottom edge of the region of interest (0-1 of frame height)")
 
     def __str__(self):
         return self.name
+
+    def crop_to_roi(self, frame):
+        """View of `frame` inside the region of interest; the whole frame if the region is unset or empty."""
+        height, width = frame.shape[:2]
+        x1, x2 = (int(round(min(max(v, 0.0), 1.0) * width)) for v in (self.roi_left, self.roi_right))
+        y1, y2 = (int(round(min(max(v, 0.0), 1.0) * height)) for v in (self.roi_top, self.roi_bottom))
+        if x2 <= x1 or y2 <= y1 or (x2 - x1, y2 - y1) == (width, height):
+            return frame
+        return frame[y1:y2, x1:x2]
+
+
+class RecognizerState(models.Model):
+    """
+    Single row shared by the web views and `manage.py run_recognizer`
+    (see app1/control.py): the requested state, the last status the service
+    published, and when a web request last spawned the service.
+    """
+    desired = models.CharField(max_length=10, choices=[('running', 'Running'), ('stopped', 'Stopped')], default='stopped')
+    status = models.JSONField(default=dict, blank=True)
+    spawned_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Recognizer ({self.desired})"
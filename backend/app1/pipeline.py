@@ -0,0 +1,240 @@
+"""
+Staged frame pipeline for the camera recognition service.
+
+    capture thread (one per camera)
+        -> FrameScheduler: bounded per-camera queues, drop-oldest
+    inference pool (shared by all cameras)
+        -> AttendanceWriter queue
+    attendance writer thread (database + chime)
+
+A slow database write therefore never stalls cap.read(), and a busy
+inference pool drops stale frames instead of falling behind the stream.
+Every stage records its queue depth and latency in a StageStats.
+"""
+import collections
+import logging
+import queue
+import threading
+import time
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class StageStats:
+    """Throughput and latency counters for one pipeline stage."""
+
+    def __init__(self, smoothing=0.1):
+        self._lock = threading.Lock()
+        self._smoothing = smoothing
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.avg_wait_ms = 0.0  # time spent queued before the stage picked the item up
+        self.avg_latency_ms = 0.0  # time the stage spent on the item
+        self.max_latency_ms = 0.0
+
+    def record(self, wait_seconds, latency_seconds):
+        with self._lock:
+            self.processed += 1
+            alpha = 1.0 if self.processed == 1 else self._smoothing
+            self.avg_wait_ms += alpha * (wait_seconds * 1000 - self.avg_wait_ms)
+            self.avg_latency_ms += alpha * (latency_seconds * 1000 - self.avg_latency_ms)
+            self.max_latency_ms = max(self.max_latency_ms, latency_seconds * 1000)
+
+    def record_drop(self, count=1):
+        with self._lock:
+            self.dropped += count
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def as_dict(self, depth=None):
+        with self._lock:
+            data = {
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'avg_wait_ms': round(self.avg_wait_ms, 2),
+                'avg_latency_ms': round(self.avg_latency_ms, 2),
+                'max_latency_ms': round(self.max_latency_ms, 2),
+            }
+        if depth is not None:
+            data['queue_depth'] = depth
+        return data
+
+
+class FrameScheduler:
+    """
+    Bounded per-camera frame queues feeding a shared inference pool.
+
+    put() never blocks: when a camera's queue is full its oldest frame is
+    dropped. get() hands out the oldest queued frame among cameras that are
+    not already being processed, so frames of one camera stay in order and
+    its tracker is only touched by one inference thread at a time.
+    """
+
+    def __init__(self, maxsize=2):
+        self.maxsize = maxsize
+        self._cond = threading.Condition()
+        self._queues = {}  # camera key -> deque of (enqueued_at, item)
+        self._busy = set()
+        self.stats = {}  # camera key -> StageStats of its frames (drops here, latency from the pool)
+        self._closed = False
+
+    def put(self, camera, item):
+        with self._cond:
+            frames = self._queues.get(camera)
+            if frames is None:
+                frames = self._queues[camera] = collections.deque()
+                self.stats[camera] = StageStats()
+            if len(frames) >= self.maxsize:
+                frames.popleft()
+                self.stats[camera].record_drop()
+            frames.append((time.monotonic(), item))
+            self._cond.notify()
+
+    def _next_camera(self):
+        ready = [
+            (frames[0][0], camera) for camera, frames in self._queues.items()
+            if frames and camera not in self._busy
+        ]
+        return min(ready, key=lambda entry: entry[0])[1] if ready else None
+
+    def get(self, timeout=None):
+        """Return (camera, item, enqueued_at) or None on timeout/close. Call done(camera) afterwards."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                camera = self._next_camera()
+                if camera is not None:
+                    enqueued_at, item = self._queues[camera].popleft()
+                    self._busy.add(camera)
+                    return camera, item, enqueued_at
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def done(self, camera):
+        with self._cond:
+            self._busy.discard(camera)
+            self._cond.notify()
+
+    def discard(self, camera):
+        """Forget a camera that was stopped."""
+        with self._cond:
+            self._queues.pop(camera, None)
+            self.stats.pop(camera, None)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def depths(self):
+        with self._cond:
+            return {camera: len(frames) for camera, frames in self._queues.items()}
+
+
+class InferencePool:
+    """Threads that run `process(camera, item)` for frames handed out by a FrameScheduler."""
+
+    def __init__(self, scheduler, process, workers=2):
+        self.scheduler = scheduler
+        self.process = process
+        self.stats = StageStats()
+        self._threads = [
+            threading.Thread(target=self._run, name=f'inference-{i}', daemon=True)
+            for i in range(max(1, workers))
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            entry = self.scheduler.get(timeout=1.0)
+            if entry is None:
+                if self.scheduler.closed:
+                    break
+                continue
+            camera, item, enqueued_at = entry
+            started = time.monotonic()
+            try:
+                self.process(camera, item)
+            except Exception:
+                self.stats.record_error()
+                logger.exception("Inference failed for camera %s", camera)
+            finally:
+                self.scheduler.done(camera)
+            wait, latency = started - enqueued_at, time.monotonic() - started
+            self.stats.record(wait, latency)
+            camera_stats = self.scheduler.stats.get(camera)
+            if camera_stats is not None:
+                camera_stats.record(wait, latency)
+        close_old_connections()
+
+
+class AttendanceWriter:
+    """
+    Single thread that applies recognition events to the database.
+
+    The queue is bounded so a dead database cannot grow memory without limit;
+    events that do not fit within `put_timeout` are dropped and counted.
+    """
+
+    def __init__(self, handler, maxsize=1000, put_timeout=0.5):
+        self.handler = handler
+        self.put_timeout = put_timeout
+        self.stats = StageStats()
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name='attendance-writer', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def put(self, event):
+        try:
+            self._queue.put((time.monotonic(), event), timeout=self.put_timeout)
+        except queue.Full:
+            self.stats.record_drop()
+            logger.error("Attendance queue full, dropping event %s", event)
+
+    def close(self):
+        self._queue.put(None)
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                break
+            enqueued_at, event = entry
+            started = time.monotonic()
+            try:
+                self.handler(event)
+            except Exception:
+                self.stats.record_error()
+                logger.exception("Attendance update failed for %s", event)
+                close_old_connections()  # Drop a broken connection so the next event reconnects
+            self.stats.record(started - enqueued_at, time.monotonic() - started)
+        close_old_connections()
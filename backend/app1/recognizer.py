@@ -0,0 +1,342 @@
+"""
+Headless camera recognition service.
+
+`manage.py run_recognizer` runs one CameraWorker capture thread per
+CameraConfiguration, supervises them (restarting dead or reconfigured
+cameras, reconnecting dropped streams with backoff) and publishes its status
+through app1/control.py. Captured frames flow through the stages in app1/pipeline.py:
+a shared inference pool, then a single attendance writer. The HTTP views
+never run cameras themselves: they only flip the desired state and read the
+status through app1/control.py, which does not import this module (or cv2
+and the face models behind it).
+"""
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import control
+from .gallery import student_gallery
+from .models import Attendance, CameraConfiguration
+from .pipeline import AttendanceWriter, FrameScheduler, InferencePool
+from .tracking import FaceTracker
+from face_engine.embedding import FaceDetections, detect_faces, embed_faces
+
+logger = logging.getLogger(__name__)
+
+MAX_RECONNECT_DELAY = 30
+
+SUCCESS_SOUND_PATH = os.path.join(os.path.dirname(__file__), 'suc.wav')
+
+
+# Function to recognize faces
+def recognize_faces(detections, threshold=0.6):
+    """
+    Match every face of a FaceDetections result against the authorized students.
+    Returns one (student_id, name, distance) per face, student_id None if unknown.
+    """
+    _, names, student_ids, index = student_gallery.get()
+    if not len(detections) or not student_ids:
+        return [(None, 'Not Recognized', float('inf'))] * len(detections)
+    rows, distances = index.search(detections.embeddings, k=1)
+    results = []
+    for row, distance in zip(rows[:, 0], distances[:, 0]):
+        if row >= 0 and distance < threshold:
+            results.append((student_ids[row], names[row], float(distance)))
+        else:
+            results.append((None, 'Not Recognized', float(distance)))
+    return results
+
+
+def mark_attendance(student_id):
+    """
+    Check a student in on the first sighting of the day and out on a sighting
+    at least 60 seconds later. Returns 'checked-in', 'checked-out' or None.
+    """
+    attendance, created = Attendance.objects.get_or_create(student_id=student_id, date=timezone.now().date())
+    if created:
+        attendance.mark_checked_in()
+        return 'checked-in'
+    if attendance.check_in_time and not attendance.check_out_time:
+        if timezone.now() >= attendance.check_in_time + timedelta(seconds=60):
+            attendance.mark_checked_out()
+            return 'checked-out'
+    return None
+
+
+class SoundPlayer:
+    """Plays the success chime through pygame when an audio device is available."""
+
+    def __init__(self, enabled=True):
+        self._sound = None
+        if not enabled:
+            return
+        try:
+            import pygame
+            pygame.mixer.init()
+            self._sound = pygame.mixer.Sound(SUCCESS_SOUND_PATH)
+        except Exception as e:
+            logger.warning("Success sound disabled: %s", e)
+
+    def play(self):
+        if self._sound is not None:
+            self._sound.play()
+
+
+class FrameGate:
+    """
+    Decides which frames reach MTCNN.
+
+    due() applies the frame stride and the max-FPS cap before a frame is even
+    decoded; has_motion() compares a small blurred grey copy of the frame with
+    the previous one, so an empty scene costs a resize and a subtraction.
+    """
+
+    def __init__(self, frame_stride=1, max_fps=0, motion_threshold=0, motion_width=64):
+        self.frame_stride = max(int(frame_stride or 1), 1)
+        self.min_interval = 1.0 / max_fps if max_fps and max_fps > 0 else 0.0
+        self.motion_threshold = motion_threshold or 0
+        self.motion_width = motion_width
+        self._count = 0
+        self._last_detection = float('-inf')
+        self._previous = None
+
+    @classmethod
+    def for_camera(cls, cam_config):
+        return cls(cam_config.frame_stride, cam_config.max_fps, cam_config.motion_threshold)
+
+    def due(self, now=None):
+        self._count += 1
+        if self._count % self.frame_stride:
+            return False
+        now = time.monotonic() if now is None else now
+        return now - self._last_detection >= self.min_interval
+
+    def has_motion(self, frame):
+        if self.motion_threshold <= 0:
+            return True
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.motion_width, max(1, height * self.motion_width // width)),
+                           interpolation=cv2.INTER_AREA)
+        small = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        previous, self._previous = self._previous, small
+        if previous is None:
+            return True
+        return float(cv2.absdiff(small, previous).mean()) >= self.motion_threshold
+
+    def detected(self, now=None):
+        self._last_detection = time.monotonic() if now is None else now
+
+
+class CameraWorker(threading.Thread):
+    """
+    Capture stage of one camera: reads and gates frames and hands them to the
+    shared FrameScheduler until stopped, reconnecting on failure.
+
+    process_frame() runs on an inference thread; the scheduler guarantees one
+    frame of a camera at a time, so the tracker needs no lock.
+    """
+
+    def __init__(self, cam_config, frames, attendance):
+        super().__init__(name=f'camera-{cam_config.name}', daemon=True)
+        self.cam_config = cam_config
+        self.frames = frames
+        self.attendance = attendance
+        self.stop_event = threading.Event()
+        self.tracker = FaceTracker()
+        self.status = {
+            'camera': cam_config.name,
+            'state': 'starting',
+            'frames': 0,
+            'faces': 0,
+            'detections': 0,
+            'embedded': 0,
+            'reconnects': 0,
+            'last_error': None,
+            'last_event': None,
+        }
+
+    def stop(self):
+        self.stop_event.set()
+
+    def open_capture(self):
+        # Check if the camera source is a number (local webcam) or a string (IP camera URL)
+        source = self.cam_config.camera_source
+        cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+        if not cap.isOpened():
+            cap.release()
+            raise ConnectionError(f"Unable to access camera {self.cam_config.name}.")
+        return cap
+
+    def run(self):
+        delay = 1
+        while not self.stop_event.is_set():
+            cap = None
+            try:
+                cap = self.open_capture()
+                gate = FrameGate.for_camera(self.cam_config)
+                self.tracker = FaceTracker(**getattr(settings, 'FACE_TRACKER_OPTIONS', {}))
+                self.status['state'] = 'running'
+                delay = 1
+                while not self.stop_event.is_set():
+                    if not gate.due():
+                        # Keep draining the stream (no stale RTSP buffer) without decoding the frame
+                        if not cap.grab():
+                            raise ConnectionError(f"Failed to capture frame for camera: {self.cam_config.name}")
+                        self.status['frames'] += 1
+                        continue
+                    ret, frame = cap.read()
+                    if not ret:
+                        raise ConnectionError(f"Failed to capture frame for camera: {self.cam_config.name}")
+                    self.status['frames'] += 1
+                    # Motion gating, detection and tracking all work in region-of-interest coordinates
+                    frame = self.cam_config.crop_to_roi(frame)
+                    if gate.has_motion(frame):
+                        gate.detected()
+                        # Never blocks: a full queue drops this camera's oldest frame
+                        self.frames.put(self.cam_config.id, (self, frame))
+            except Exception as e:
+                self.status['state'] = 'reconnecting'
+                self.status['last_error'] = str(e)
+                self.status['reconnects'] += 1
+                logger.warning("Camera %s: %s (retrying in %ss)", self.cam_config.name, e, delay)
+                self.stop_event.wait(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+            finally:
+                if cap is not None:
+                    cap.release()
+        self.status['state'] = 'stopped'
+
+    def process_frame(self, frame):
+        self.status['detections'] += 1
+        now = time.monotonic()
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        boxes, probs = detect_faces(frame_rgb)
+        tracks = self.tracker.update(boxes, now)
+        if not tracks:
+            return
+        self.status['faces'] += len(tracks)
+
+        # Only new, uncertain or stale tracks go through ResNet
+        threshold = self.cam_config.threshold
+        pending = np.array([i for i, track in enumerate(tracks) if self.tracker.needs_embedding(track, threshold, now)],
+                           dtype=np.int64)
+        if not len(pending):
+            return
+        embeddings, kept = embed_faces(frame_rgb, boxes[pending])
+        pending = pending[kept]
+        self.status['embedded'] += len(pending)
+        detections = FaceDetections(boxes[pending], probs[pending], embeddings)
+
+        for i, (student_id, name, distance) in zip(pending, recognize_faces(detections, threshold)):
+            if tracks[i].identify(student_id, name, distance, now):
+                # New identity on this track; the database write happens on the attendance writer
+                self.attendance.put((self, student_id, name))
+
+
+def _camera_settings(cam_config):
+    return (
+        cam_config.name, cam_config.camera_source, cam_config.threshold,
+        cam_config.frame_stride, cam_config.max_fps, cam_config.motion_threshold,
+        cam_config.roi_left, cam_config.roi_top, cam_config.roi_right, cam_config.roi_bottom,
+    )
+
+
+class RecognizerService:
+    """Keeps one CameraWorker per CameraConfiguration alive while the desired state is 'running'."""
+
+    def __init__(self, poll_interval=1.0, play_sound=True):
+        self.poll_interval = poll_interval
+        self.sound = SoundPlayer(enabled=play_sound)
+        self.workers = {}  # CameraConfiguration.id -> CameraWorker
+        self._shutdown = threading.Event()
+        self.frames = FrameScheduler(maxsize=getattr(settings, 'RECOGNIZER_FRAME_QUEUE_SIZE', 2))
+        self.inference = InferencePool(self.frames, self._infer,
+                                       workers=getattr(settings, 'RECOGNIZER_INFERENCE_WORKERS', 2))
+        self.attendance = AttendanceWriter(self._write_attendance,
+                                           maxsize=getattr(settings, 'RECOGNIZER_ATTENDANCE_QUEUE_SIZE', 1000))
+
+    def shutdown(self):
+        self._shutdown.set()
+
+    def _infer(self, cam_id, item):
+        worker, frame = item
+        if not worker.stop_event.is_set():
+            worker.process_frame(frame)
+
+    def _write_attendance(self, event):
+        worker, student_id, name = event
+        result = mark_attendance(student_id)
+        if result:
+            worker.status['last_event'] = f"{name} {result} at {timezone.now():%H:%M:%S}"
+            logger.info("Camera %s: %s %s", worker.cam_config.name, name, result)
+            self.sound.play()
+
+    def _stop_worker(self, cam_id):
+        worker = self.workers.pop(cam_id)
+        worker.stop()
+        worker.join(timeout=5)
+        self.frames.discard(cam_id)
+
+    def sync_workers(self, running):
+        configs = {config.id: config for config in CameraConfiguration.objects.all()} if running else {}
+        for cam_id, worker in list(self.workers.items()):
+            config = configs.get(cam_id)
+            changed = config is None or _camera_settings(config) != _camera_settings(worker.cam_config)
+            if changed or not worker.is_alive():
+                self._stop_worker(cam_id)
+        for cam_id, config in configs.items():
+            if cam_id not in self.workers:
+                worker = CameraWorker(config, self.frames, self.attendance)
+                self.workers[cam_id] = worker
+                worker.start()
+
+    def pipeline_status(self):
+        """Per-stage queue depth, drops and latency."""
+        depths = self.frames.depths()
+        return {
+            'capture': {
+                worker.cam_config.name: self.frames.stats[cam_id].as_dict(depths[cam_id])
+                for cam_id, worker in self.workers.items() if cam_id in self.frames.stats
+            },
+            'inference': self.inference.stats.as_dict(sum(depths.values())),
+            'attendance': self.attendance.stats.as_dict(self.attendance.depth()),
+        }
+
+    def publish_status(self, desired, state='running'):
+        control.publish_status({
+            'pid': os.getpid(),
+            'state': state,
+            'desired': desired,
+            'heartbeat': time.time(),
+            'cameras': [dict(worker.status) for worker in self.workers.values()],
+            'pipeline': self.pipeline_status(),
+        })
+
+    def run_forever(self):
+        self.inference.start()
+        self.attendance.start()
+        try:
+            while not self._shutdown.is_set():
+                desired = control.get_desired()
+                student_gallery.refresh_if_changed()  # Students edited through the web app
+                self.sync_workers(desired == 'running')
+                self.publish_status(desired)
+                close_old_connections()
+                self._shutdown.wait(self.poll_interval)
+        finally:
+            for cam_id in list(self.workers):
+                self._stop_worker(cam_id)
+            self.frames.close()
+            self.inference.join(timeout=5)
+            # Let the writer drain what was already recognised before exiting
+            self.attendance.close()
+            self.attendance.join(timeout=10)
+            self.publish_status(control.get_desired(), state='exited')
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .gallery import student_gallery
+from .models import Student
+
+
+@receiver(post_save, sender=Student)
+def invalidate_gallery_on_save(sender, instance, update_fields=None, **kwargs):
+    # Writing the cached embedding itself must not throw the gallery away
+    if update_fields is not None and set(update_fields) <= {'face_embedding', 'image_hash'}:
+        return
+    student_gallery.invalidate()
+
+
+@receiver(post_delete, sender=Student)
+def invalidate_gallery_on_delete(sender, instance, **kwargs):
+    student_gallery.invalidate()
@@ -1,3 +1,369 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from face_engine.embedding import FaceDetections
+from . import control
+from .gallery import EMBEDDING_DIM, StudentGallery, refresh_student_embedding
+from .models import CameraConfiguration, Student
+from .pipeline import AttendanceWriter, FrameScheduler, InferencePool
+from .recognizer import FrameGate
+from .tracking import FaceTracker, box_iou
+
+
+class FaceTrackerTests(SimpleTestCase):
+    """Faces keep their track (and identity) across frames; only uncertain or stale tracks are re-embedded."""
+
+    def setUp(self):
+        self.tracker = FaceTracker(max_age=2.0, refresh_interval=5.0, retry_interval=0.5, confidence_margin=0.1)
+
+    def test_box_iou(self):
+        iou = box_iou([[0, 0, 10, 10]], [[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]])
+        np.testing.assert_allclose(iou, [[1.0, 1 / 3, 0.0]], rtol=1e-5)
+
+    def test_overlapping_boxes_keep_their_track(self):
+        first = self.tracker.update([[0, 0, 50, 50], [100, 0, 150, 50]], now=0.0)
+        # Same faces, shifted and listed in the other order
+        second = self.tracker.update([[105, 2, 155, 52], [4, 2, 54, 52]], now=0.1)
+        self.assertEqual([t.track_id for t in second], [first[1].track_id, first[0].track_id])
+        np.testing.assert_array_equal(second[1].box, [4, 2, 54, 52])
+
+    def test_fast_movement_falls_back_to_centroid_distance(self):
+        first = self.tracker.update([[0, 0, 50, 50]], now=0.0)
+        # Too little overlap for IoU matching, but the centre moved less than half the face diagonal
+        second = self.tracker.update([[25, 15, 75, 65]], now=0.1)
+        self.assertLess(box_iou([[0, 0, 50, 50]], [[25, 15, 75, 65]])[0, 0], 0.3)
+        self.assertIs(second[0], first[0])
+
+    def test_distant_box_starts_a_new_track(self):
+        first = self.tracker.update([[0, 0, 50, 50]], now=0.0)
+        second = self.tracker.update([[300, 300, 350, 350]], now=0.1)
+        self.assertNotEqual(second[0].track_id, first[0].track_id)
+        self.assertEqual(len(self.tracker.tracks), 2)
+
+    def test_tracks_expire_after_max_age(self):
+        first = self.tracker.update([[0, 0, 50, 50]], now=0.0)
+        again = self.tracker.update([[0, 0, 50, 50]], now=2.5)
+        self.assertNotEqual(again[0].track_id, first[0].track_id)
+        self.assertEqual(len(self.tracker.tracks), 1)
+
+    def test_identity_survives_across_frames(self):
+        track = self.tracker.update([[0, 0, 50, 50]], now=0.0)[0]
+        self.assertTrue(track.identify(7, 'Ada', 0.3, now=0.0))
+        self.assertFalse(track.identify(7, 'Ada', 0.3, now=1.0))  # Same student: no new attendance event
+        later = self.tracker.update([[2, 2, 52, 52]], now=1.1)[0]
+        self.assertEqual((later.student_id, later.name), (7, 'Ada'))
+
+    def test_needs_embedding(self):
+        threshold = 0.6
+        track = self.tracker.update([[0, 0, 50, 50]], now=0.0)[0]
+        self.assertTrue(self.tracker.needs_embedding(track, threshold, now=0.0))  # New track
+
+        track.identify(7, 'Ada', 0.3, now=0.0)  # Confident match: refreshed every 5 s
+        self.assertFalse(self.tracker.needs_embedding(track, threshold, now=4.9))
+        self.assertTrue(self.tracker.needs_embedding(track, threshold, now=5.0))
+
+        track.identify(7, 'Ada', 0.55, now=10.0)  # Within the margin of the threshold: retried every 0.5 s
+        self.assertFalse(self.tracker.needs_embedding(track, threshold, now=10.4))
+        self.assertTrue(self.tracker.needs_embedding(track, threshold, now=10.5))
+
+        track.identify(None, 'Not Recognized', 0.9, now=20.0)  # Unknown face: retried too
+        self.assertTrue(self.tracker.needs_embedding(track, threshold, now=20.5))
+
+
+class CameraRoiTests(SimpleTestCase):
+    """Frames are cropped to the camera's region of interest before detection."""
+
+    def setUp(self):
+        self.frame = np.arange(100 * 200 * 3, dtype=np.uint32).reshape(100, 200, 3)
+
+    def crop(self, left, top, right, bottom):
+        camera = CameraConfiguration(roi_left=left, roi_top=top, roi_right=right, roi_bottom=bottom)
+        return camera.crop_to_roi(self.frame)
+
+    def test_crop_is_a_view_of_the_region(self):
+        cropped = self.crop(0.25, 0.1, 0.75, 0.6)
+        self.assertEqual(cropped.shape, (50, 100, 3))
+        np.testing.assert_array_equal(cropped, self.frame[10:60, 50:150])
+        self.assertTrue(np.shares_memory(cropped, self.frame))
+
+    def test_out_of_range_edges_are_clamped(self):
+        np.testing.assert_array_equal(self.crop(-0.5, 0.5, 1.5, 2.0), self.frame[50:100, :])
+
+    def test_full_or_empty_region_returns_the_frame(self):
+        for roi in ((0.0, 0.0, 1.0, 1.0), (0.6, 0.0, 0.4, 1.0), (0.0, 0.5, 1.0, 0.5)):
+            self.assertIs(self.crop(*roi), self.frame)
+
+
+class FrameGateTests(SimpleTestCase):
+    """Only every n-th frame, at most max_fps, and only frames that changed reach detection."""
+
+    def frame(self, value=0, box=None):
+        frame = np.full((120, 160, 3), value, dtype=np.uint8)
+        if box is not None:
+            x1, y1, x2, y2 = box
+            frame[y1:y2, x1:x2] = 255
+        return frame
+
+    def test_frame_stride(self):
+        gate = FrameGate(frame_stride=3)
+        self.assertEqual([gate.due(now=i) for i in range(9)], [False, False, True] * 3)
+
+    def test_max_fps_counts_from_the_last_detection(self):
+        gate = FrameGate(max_fps=2)
+        self.assertTrue(gate.due(now=10.0))
+        gate.detected(now=10.0)
+        self.assertFalse(gate.due(now=10.4))
+        self.assertTrue(gate.due(now=10.5))
+        self.assertTrue(gate.due(now=10.6))  # Nothing was detected since, so frames stay due
+        gate.detected(now=10.6)
+        self.assertFalse(gate.due(now=11.0))
+
+    def test_stride_and_max_fps_combine(self):
+        gate = FrameGate(frame_stride=2, max_fps=1)
+        gate.detected(now=0.0)
+        self.assertEqual([gate.due(now=t) for t in (0.5, 0.6, 1.0, 1.1)], [False, False, False, True])
+
+    def test_motion_gate(self):
+        gate = FrameGate(motion_threshold=2)
+        self.assertTrue(gate.has_motion(self.frame()))  # First frame: nothing to compare with
+        self.assertFalse(gate.has_motion(self.frame()))
+        self.assertFalse(gate.has_motion(self.frame(1)))  # Sensor noise stays below the threshold
+        self.assertTrue(gate.has_motion(self.frame(1, box=(40, 30, 100, 100))))  # Someone walks in
+        self.assertFalse(gate.has_motion(self.frame(1, box=(40, 30, 100, 100))))
+
+    def test_zero_threshold_passes_every_frame(self):
+        gate = FrameGate(motion_threshold=0)
+        self.assertTrue(all(gate.has_motion(self.frame()) for _ in range(3)))
+
+
+class FrameSchedulerTests(SimpleTestCase):
+    """Per-camera drop-oldest queues; one frame per camera in flight, oldest frame first across cameras."""
+
+    def setUp(self):
+        self.scheduler = FrameScheduler(maxsize=2)
+
+    def test_full_camera_queue_drops_its_oldest_frame(self):
+        for frame in (1, 2, 3):
+            self.scheduler.put('door', frame)
+        self.scheduler.put('gate', 1)
+        self.assertEqual(self.scheduler.depths(), {'door': 2, 'gate': 1})
+        self.assertEqual(self.scheduler.stats['door'].dropped, 1)
+        self.assertEqual(self.scheduler.stats['gate'].dropped, 0)
+        self.assertEqual(self.scheduler.get(timeout=0)[:2], ('door', 2))
+
+    def test_oldest_frame_first_across_cameras(self):
+        self.scheduler.put('gate', 'g1')
+        self.scheduler.put('door', 'd1')
+        self.assertEqual(self.scheduler.get(timeout=0)[:2], ('gate', 'g1'))
+        self.assertEqual(self.scheduler.get(timeout=0)[:2], ('door', 'd1'))
+
+    def test_one_frame_per_camera_until_done(self):
+        self.scheduler.put('door', 'd1')
+        self.scheduler.put('door', 'd2')
+        self.scheduler.put('gate', 'g1')
+        self.assertEqual(self.scheduler.get(timeout=0)[:2], ('door', 'd1'))
+        # d2 is older than g1, but door is still being processed
+        self.assertEqual(self.scheduler.get(timeout=0)[:2], ('gate', 'g1'))
+        self.assertIsNone(self.scheduler.get(timeout=0.01))
+        self.scheduler.done('door')
+        self.assertEqual(self.scheduler.get(timeout=0)[:2], ('door', 'd2'))
+
+    def test_done_wakes_a_waiting_get(self):
+        self.scheduler.put('door', 'd1')
+        self.scheduler.put('door', 'd2')
+        self.scheduler.get(timeout=0)
+        threading.Timer(0.05, self.scheduler.done, args=('door',)).start()
+        self.assertEqual(self.scheduler.get(timeout=5)[:2], ('door', 'd2'))
+
+    def test_close_stops_the_inference_pool(self):
+        processed, started = [], threading.Event()
+
+        def process(camera, item):
+            processed.append((camera, item))
+            started.set()
+
+        pool = InferencePool(self.scheduler, process, workers=2)
+        pool.start()
+        self.scheduler.put('door', 'd1')
+        self.assertTrue(started.wait(5))
+        began = time.monotonic()
+        self.scheduler.close()
+        pool.join(5)
+        self.assertLess(time.monotonic() - began, 0.9)  # Woken by close(), not by get()'s 1 s timeout
+        self.assertFalse(any(thread.name.startswith('inference-') and thread.is_alive()
+                             for thread in threading.enumerate()))
+        self.assertEqual(processed, [('door', 'd1')])
+        self.assertEqual(pool.stats.processed, 1)
+        self.assertIsNone(self.scheduler.get(timeout=0))
+
+    def test_failing_frame_is_counted_and_releases_the_camera(self):
+        def process(camera, item):
+            if item == 'bad':
+                raise ValueError(item)
+
+        pool = InferencePool(self.scheduler, process, workers=1)
+        self.scheduler.put('door', 'bad')
+        self.scheduler.put('door', 'good')
+        with self.assertLogs('app1.pipeline', 'ERROR'):
+            pool.start()
+            deadline = time.monotonic() + 5
+            while pool.stats.processed < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.scheduler.close()
+        pool.join(5)
+        self.assertEqual((pool.stats.processed, pool.stats.errors), (2, 1))
+
+
+class AttendanceWriterTests(SimpleTestCase):
+    """Recognition events are applied on one thread; failures and overflow are counted, not fatal."""
+
+    def test_failing_event_does_not_stop_the_writer(self):
+        handled = []
+
+        def handler(event):
+            if event == 'bad':
+                raise RuntimeError('database is down')
+            handled.append(event)
+
+        writer = AttendanceWriter(handler)
+        writer.start()
+        with self.assertLogs('app1.pipeline', 'ERROR'):
+            for event in ('bad', 'good'):
+                writer.put(event)
+            writer.close()
+            writer.join(5)
+        self.assertEqual(handled, ['good'])
+        self.assertEqual((writer.stats.processed, writer.stats.errors), (2, 1))
+
+    def test_full_queue_drops_and_counts(self):
+        writer = AttendanceWriter(lambda event: None, maxsize=1, put_timeout=0.01)  # Not started: nothing drains
+        with self.assertLogs('app1.pipeline', 'ERROR'):
+            writer.put('first')
+            writer.put('second')
+        self.assertEqual((writer.depth(), writer.stats.dropped), (1, 1))
+
+
+class StudentEmbeddingCacheTests(TestCase):
+    """Student embeddings are recomputed only when the image file changes, from the largest face."""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name))
+        os.makedirs(os.path.join(self.media.name, 'students'))
+        self.write_image(b'first')
+        self.student = Student.objects.create(name='Ada', email='ada@example.com', phone_number='1',
+                                              student_class='A', image='students/ada.jpg', authorized=True)
+        # A bystander first, then the (larger) student
+        self.detections = FaceDetections(
+            np.array([[0, 0, 10, 10], [20, 20, 80, 90]], dtype=np.float32),
+            np.array([0.99, 0.98], dtype=np.float32),
+            np.stack([np.full(EMBEDDING_DIM, 0.1), np.full(EMBEDDING_DIM, 0.2)]).astype(np.float32),
+        )
+        patcher = mock.patch('app1.gallery.decode_image', return_value=np.zeros((100, 100, 3), dtype=np.uint8))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_image(self, data):
+        path = os.path.join(self.media.name, 'students', 'ada.jpg')
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def refresh(self):
+        with mock.patch('app1.gallery.detect_and_embed', return_value=self.detections) as detect:
+            refreshed = refresh_student_embedding(self.student)
+        return refreshed, detect.call_count
+
+    def test_embeds_the_largest_face(self):
+        self.assertEqual(self.refresh(), (True, 1))
+        self.assertAlmostEqual(Student.objects.get().face_embedding[0], 0.2, places=5)
+
+    def test_unchanged_file_is_not_read_again(self):
+        self.refresh()
+        with mock.patch('builtins.open', side_effect=AssertionError('image re-read')):
+            self.assertEqual(self.refresh(), (False, 0))
+
+    def test_replaced_file_is_embedded_again(self):
+        self.refresh()
+        path = self.write_image(b'second image')
+        os.utime(path, ns=(0, 0))
+        self.assertEqual(self.refresh(), (True, 1))
+
+
+class StudentGalleryVersionTests(TestCase):
+    """The recognizer process notices student changes made by other processes through version()."""
+
+    def setUp(self):
+        self.gallery = StudentGallery()
+        self.student = Student.objects.create(name='Ada', email='ada@example.com', phone_number='1',
+                                              student_class='A', image='students/ada.jpg')
+        self.assertTrue(self.gallery.refresh_if_changed())
+        self.assertFalse(self.gallery.refresh_if_changed())
+
+    def test_authorizing_a_student_changes_the_version(self):
+        self.student.authorized = True
+        self.student.save()
+        self.assertTrue(self.gallery.refresh_if_changed())
+
+    def test_added_and_deleted_students_change_the_version(self):
+        other = Student.objects.create(name='Bob', email='bob@example.com', phone_number='2',
+                                       student_class='A', image='students/bob.jpg')
+        self.assertTrue(self.gallery.refresh_if_changed())
+        other.delete()
+        self.assertTrue(self.gallery.refresh_if_changed())
+
+    def test_embedding_cache_writes_keep_the_version(self):
+        self.student.face_embedding = [0.0] * EMBEDDING_DIM
+        self.student.image_hash = 'x'
+        self.student.save(update_fields=['face_embedding', 'image_hash'])
+        self.assertFalse(self.gallery.refresh_if_changed())
+
+
+class RecognizerControlTests(TestCase):
+    """Start / stop / status of the recognizer service, kept in the database."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        CameraConfiguration.objects.create(name='Door', camera_source='0')
+        patcher = mock.patch('app1.control.spawn_service')
+        self.spawn = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_views_require_an_admin(self):
+        for url in (reverse('capture_and_recognize'), reverse('recognizer_status')):
+            self.assertEqual(self.client.get(url).status_code, 302)
+            self.assertEqual(self.client.post(url, {'action': 'start'}).status_code, 302)
+        self.spawn.assert_not_called()
+        self.client.force_login(User.objects.create_user('staff', password='x'))
+        self.assertEqual(self.client.get(reverse('recognizer_status')).status_code, 302)
+
+    def test_status_before_the_service_ever_ran(self):
+        self.client.force_login(self.admin)
+        status = self.client.get(reverse('recognizer_status')).json()
+        self.assertEqual((status['state'], status['alive'], status['desired']), ('exited', False, 'stopped'))
+        self.assertEqual(self.client.get(reverse('capture_and_recognize')).status_code, 200)
+
+    def test_start_spawns_the_service_once(self):
+        self.client.force_login(self.admin)
+        self.client.post(reverse('capture_and_recognize'), {'action': 'start'})
+        self.client.post(reverse('capture_and_recognize'), {'action': 'start'})  # Before its first heartbeat
+        self.assertEqual(self.spawn.call_count, 1)
+        self.assertEqual(control.get_status()['desired'], 'running')
+
+        control.publish_status({'state': 'running', 'heartbeat': time.time(), 'cameras': []})
+        self.assertTrue(control.get_status()['alive'])
+        self.client.post(reverse('capture_and_recognize'), {'action': 'stop'})
+        self.assertEqual(control.get_desired(), 'stopped')
+
+    def test_stale_heartbeat_is_not_alive(self):
+        control.publish_status({'state': 'running', 'heartbeat': time.time() - control.HEARTBEAT_TIMEOUT - 1})
+        self.assertFalse(control.get_status()['alive'])
@@ -0,0 +1,116 @@
+import itertools
+import time
+
+import numpy as np
+
+
+def box_iou(boxes_a, boxes_b):
+    """(len(a), len(b)) IoU matrix for (x1, y1, x2, y2) boxes."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)[:, None, :]
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-6)
+
+
+class Track:
+    """One face followed across frames, with the identity it was last recognised as."""
+
+    __slots__ = ('track_id', 'box', 'last_seen', 'student_id', 'name', 'distance', 'embedded_at')
+
+    def __init__(self, track_id, box, now):
+        self.track_id = track_id
+        self.box = box
+        self.last_seen = now
+        self.student_id = None
+        self.name = 'Not Recognized'
+        self.distance = float('inf')
+        self.embedded_at = None
+
+    def identify(self, student_id, name, distance, now):
+        """Store a recognition result; returns True if this track just got a (new) identity."""
+        newly_identified = student_id is not None and student_id != self.student_id
+        self.student_id, self.name, self.distance = student_id, name, distance
+        self.embedded_at = now
+        return newly_identified
+
+
+class FaceTracker:
+    """
+    IoU tracker with a centroid fallback for MTCNN boxes.
+
+    Each box is matched to the track it overlaps most (greedy, highest IoU
+    first); boxes left over are matched by centroid distance relative to the
+    face size, which covers fast movement at low detection rates. Tracks not
+    seen for `max_age` seconds are dropped.
+
+    needs_embedding() tells the camera worker which tracks have to go
+    through ResNet: new tracks, tracks whose match is missing or close to the
+    threshold (retried every `retry_interval` seconds) and tracks whose
+    identity is older than `refresh_interval`.
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_threshold=0.5, max_age=2.0,
+                 refresh_interval=5.0, retry_interval=0.5, confidence_margin=0.1):
+        self.iou_threshold = iou_threshold
+        self.centroid_threshold = centroid_threshold  # in units of the track's box diagonal
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.confidence_margin = confidence_margin
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def _match(self, boxes):
+        pairs = {}
+        if not self.tracks or not len(boxes):
+            return pairs
+        track_boxes = np.array([track.box for track in self.tracks], dtype=np.float32)
+        iou = box_iou(track_boxes, boxes)
+        for t, b in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+            if iou[t, b] < self.iou_threshold:
+                break
+            if t not in pairs and b not in pairs.values():
+                pairs[t] = b
+
+        centers_t = (track_boxes[:, :2] + track_boxes[:, 2:]) / 2
+        centers_b = (boxes[:, :2] + boxes[:, 2:4]) / 2
+        diagonals = np.linalg.norm(track_boxes[:, 2:] - track_boxes[:, :2], axis=1)
+        distance = np.linalg.norm(centers_t[:, None, :] - centers_b[None, :, :], axis=2) / np.maximum(diagonals, 1e-6)[:, None]
+        for t, b in zip(*np.unravel_index(np.argsort(distance, axis=None), distance.shape)):
+            if distance[t, b] > self.centroid_threshold:
+                break
+            if t not in pairs and b not in pairs.values():
+                pairs[t] = b
+        return pairs
+
+    def update(self, boxes, now=None):
+        """Assign every box to a track; returns the tracks row-aligned with `boxes`."""
+        now = time.monotonic() if now is None else now
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.tracks = [track for track in self.tracks if now - track.last_seen <= self.max_age]
+
+        assigned = [None] * len(boxes)
+        for t, b in self._match(boxes).items():
+            track = self.tracks[t]
+            track.box = boxes[b]
+            track.last_seen = now
+            assigned[b] = track
+        for b, track in enumerate(assigned):
+            if track is None:
+                track = Track(next(self._ids), boxes[b], now)
+                self.tracks.append(track)
+                assigned[b] = track
+        return assigned
+
+    def needs_embedding(self, track, threshold, now=None):
+        now = time.monotonic() if now is None else now
+        if track.embedded_at is None:
+            return True
+        age = now - track.embedded_at
+        if track.student_id is None or track.distance > threshold - self.confidence_margin:
+            return age >= self.retry_interval
+        return age >= self.refresh_interval
@@ -6,6 +6,7 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('selfie-success/', views.selfie_success, name='selfie_success'),
     path('capture-and-recognize/', views.capture_and_recognize, name='capture_and_recognize'),
+    path('capture-and-recognize/status/', views.recognizer_status, name='recognizer_status'),
     path('students/attendance/', views.student_attendance_list, name='student_attendance_list'),
     path('students/', views.student_list, name='student-list'),
     path('students/<int:pk>/', views.student_detail, name='student-detail'),
@@ -1,21 +1,11 @@
-import os
-import cv2
-import numpy as np
-import torch
-from facenet_pytorch import InceptionResnetV1, MTCNN
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from django.conf import settings
 from .models import Student, Attendance, CameraConfiguration
 from django.core.files.base import ContentFile
-from datetime import datetime, timedelta
-from django.utils import timezone
-import pygame  # Import pygame for playing sounds
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.contrib.auth.decorators import login_required
-import threading
-import time
 import base64
 from django.db import IntegrityError
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -23,61 +13,9 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import authenticate, login
 from django.contrib import messages
 from .models import Student
+from . import control
 
 
-# Initialize MTCNN and InceptionResnetV1
-mtcnn = MTCNN(keep_all=True)
-resnet = InceptionResnetV1(pretrained='vggface2').eval()
-
-# Function to detect and encode faces
-def detect_and_encode(image):
-    with torch.no_grad():
-        boxes, _ = mtcnn.detect(image)
-        if boxes is not None:
-            faces = []
-            for box in boxes:
-                face = image[int(box[1]):int(box[3]), int(box[0]):int(box[2])]
-                if face.size == 0:
-                    continue
-                face = cv2.resize(face, (160, 160))
-                face = np.transpose(face, (2, 0, 1)).astype(np.float32) / 255.0
-                face_tensor = torch.tensor(face).unsqueeze(0)
-                encoding = resnet(face_tensor).detach().numpy().flatten()
-                faces.append(encoding)
-            return faces
-    return []
-
-# Function to encode uploaded images
-def encode_uploaded_images():
-    known_face_encodings = []
-    known_face_names = []
-
-    # Fetch only authorized images
-    uploaded_images = Student.objects.filter(authorized=True)
-
-    for student in uploaded_images:
-        image_path = os.path.join(settings.MEDIA_ROOT, str(student.image))
-        known_image = cv2.imread(image_path)
-        known_image_rgb = cv2.cvtColor(known_image, cv2.COLOR_BGR2RGB)
-        encodings = detect_and_encode(known_image_rgb)
-        if encodings:
-            known_face_encodings.extend(encodings)
-            known_face_names.append(student.name)
-
-    return known_face_encodings, known_face_names
-
-# Function to recognize faces
-def recognize_faces(known_encodings, known_names, test_encodings, threshold=0.6):
-    recognized_names = []
-    for test_encoding in test_encodings:
-        distances = np.linalg.norm(known_encodings - test_encoding, axis=1)
-        min_distance_idx = np.argmin(distances)
-        if distances[min_distance_idx] < threshold:
-            recognized_names.append(known_names[min_distance_idx])
-        else:
-            recognized_names.append('Not Recognized')
-    return recognized_names
-
 # View for capturing student information and image
 def capture_student(request):
     if request.method == 'POST':
@@ -112,136 +50,34 @@ def selfie_success(request):
     return render(request, 'selfie_success.html')
 
 
-# This views for capturing studen faces and recognize
+# Custom user pass test for admin access
+def is_admin(user):
+    return user.is_superuser
+
+
+# This views for starting/stopping the camera recognition service and showing its state.
+# The cameras themselves run in `manage.py run_recognizer` (see app1/recognizer.py),
+# so no web worker is tied up while they are running.
+@login_required
+@user_passes_test(is_admin)
 def capture_and_recognize(request):
-    stop_events = []  # List to store stop events for each thread
-    camera_threads = []  # List to store threads for each camera
-    camera_windows = []  # List to store window names
-    error_messages = []  # List to capture errors from threads
-
-    def process_frame(cam_config, stop_event):
-        """Thread function to capture and process frames for each camera."""
-        cap = None
-        window_created = False  # Flag to track if the window was created
-        try:
-            # Check if the camera source is a number (local webcam) or a string (IP camera URL)
-            if cam_config.camera_source.isdigit():
-                cap = cv2.VideoCapture(int(cam_config.camera_source))  # Use integer index for webcam
-            else:
-                cap = cv2.VideoCapture(cam_config.camera_source)  # Use string for IP camera URL
-
-            if not cap.isOpened():
-                raise Exception(f"Unable to access camera {cam_config.name}.")
-
-            threshold = cam_config.threshold
-
-            # Initialize pygame mixer for sound playback
-            pygame.mixer.init()
-            success_sound = pygame.mixer.Sound('app1/suc.wav')  # load sound path
-
-            window_name = f'Face Recognition - {cam_config.name}'
-            camera_windows.append(window_name)  # Track the window name
-
-            while not stop_event.is_set():
-                ret, frame = cap.read()
-                if not ret:
-                    print(f"Failed to capture frame for camera: {cam_config.name}")
-                    break  # If frame capture fails, break from the loop
-
-                # Convert BGR to RGB
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                test_face_encodings = detect_and_encode(frame_rgb)  # Function to detect and encode face in frame
-
-                if test_face_encodings:
-                    known_face_encodings, known_face_names = encode_uploaded_images()  # Load known face encodings once
-                    if known_face_encodings:
-                        names = recognize_faces(np.array(known_face_encodings), known_face_names, test_face_encodings, threshold)
-
-                        for name, box in zip(names, mtcnn.detect(frame_rgb)[0]):
-                            if box is not None:
-                                (x1, y1, x2, y2) = map(int, box)
-                                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                                cv2.putText(frame, name, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-
-                                if name != 'Not Recognized':
-                                    students = Student.objects.filter(name=name)
-                                    if students.exists():
-                                        student = students.first()
-
-                                        # Manage attendance based on check-in and check-out logic
-                                        attendance, created = Attendance.objects.get_or_create(student=student, date=datetime.now().date())
-                                        if created:
-                                            attendance.mark_checked_in()
-                                            success_sound.play()
-                                            cv2.putText(frame, f"{name}, checked in.", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-                                        else:
-                                            if attendance.check_in_time and not attendance.check_out_time:
-                                                if timezone.now() >= attendance.check_in_time + timedelta(seconds=60):
-                                                    attendance.mark_checked_out()
-                                                    success_sound.play()
-                                                    cv2.putText(frame, f"{name}, checked out.", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-                                                else:
-                                                    cv2.putText(frame, f"{name}, checked in.", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2, cv2.LINE_AA)
-                                            elif attendance.check_in_time and attendance.check_out_time:
-                                                cv2.putText(frame, f"{name}, checked out.", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2, cv2.LINE_AA)
-
-                # Display frame in separate window for each camera
-                if not window_created:
-                    cv2.namedWindow(window_name)  # Only create window once
-                    window_created = True  # Mark window as created
-                
-                cv2.imshow(window_name, frame)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    stop_event.set()  # Signal the thread to stop when 'q' is pressed
-                    break
-
-        except Exception as e:
-            print(f"Error in thread for {cam_config.name}: {e}")
-            error_messages.append(str(e))  # Capture error message
-        finally:
-            if cap is not None:
-                cap.release()
-            if window_created:
-                cv2.destroyWindow(window_name)  # Only destroy if window was created
-
-    try:
-        # Get all camera configurations
-        cam_configs = CameraConfiguration.objects.all()
-        if not cam_configs.exists():
-            raise Exception("No camera configurations found. Please configure them in the admin panel.")
-
-        # Create threads for each camera configuration
-        for cam_config in cam_configs:
-            stop_event = threading.Event()
-            stop_events.append(stop_event)
-
-            camera_thread = threading.Thread(target=process_frame, args=(cam_config, stop_event))
-            camera_threads.append(camera_thread)
-            camera_thread.start()
-
-        # Keep the main thread running while cameras are being processed
-        while any(thread.is_alive() for thread in camera_threads):
-            time.sleep(1)  # Non-blocking wait, allowing for UI responsiveness
-
-    except Exception as e:
-        error_messages.append(str(e))  # Capture the error message
-    finally:
-        # Ensure all threads are signaled to stop
-        for stop_event in stop_events:
-            stop_event.set()
-
-        # Ensure all windows are closed in the main thread
-        for window in camera_windows:
-            if cv2.getWindowProperty(window, cv2.WND_PROP_VISIBLE) >= 1:  # Check if window exists
-                cv2.destroyWindow(window)
-
-    # Check if there are any error messages
-    if error_messages:
-        # Join all error messages into a single string
-        full_error_message = "\n".join(error_messages)
-        return render(request, 'error.html', {'error_message': full_error_message})  # Render the error page with message
-
-    return redirect('student_attendance_list')
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'start':
+            if not CameraConfiguration.objects.exists():
+                return render(request, 'error.html', {'error_message': "No camera configurations found. Please configure them in the admin panel."})
+            control.request_start()
+        elif action == 'stop':
+            control.request_stop()
+        return redirect('capture_and_recognize')
+
+    return render(request, 'capture_and_recognize.html', {'status': control.get_status()})
+
+
+@login_required
+@user_passes_test(is_admin)
+def recognizer_status(request):
+    return JsonResponse(control.get_status())
 
 #this is for showing Attendance list
 def student_attendance_list(request):
@@ -286,10 +122,6 @@ def home(request):
     return render(request, 'home.html')
 
 
-# Custom user pass test for admin access
-def is_admin(user):
-    return user.is_superuser
-
 @login_required
 @user_passes_test(is_admin)
 def student_list(request):
@@ -369,6 +201,13 @@ def camera_config_create(request):
         name = request.POST.get('name')
         camera_source = request.POST.get('camera_source')
         threshold = request.POST.get('threshold')
+        frame_stride = request.POST.get('frame_stride') or 1
+        max_fps = request.POST.get('max_fps') or 0
+        motion_threshold = request.POST.get('motion_threshold') or 0
+        roi_left = request.POST.get('roi_left') or 0
+        roi_top = request.POST.get('roi_top') or 0
+        roi_right = request.POST.get('roi_right') or 1
+        roi_bottom = request.POST.get('roi_bottom') or 1
 
         try:
             # Save the data to the database using the CameraConfiguration model
@@ -376,6 +215,13 @@ def camera_config_create(request):
                 name=name,
                 camera_source=camera_source,
                 threshold=threshold,
+                frame_stride=frame_stride,
+                max_fps=max_fps,
+                motion_threshold=motion_threshold,
+                roi_left=roi_left,
+                roi_top=roi_top,
+                roi_right=roi_right,
+                roi_bottom=roi_bottom,
             )
             # Redirect to the list of camera configurations after successful creation
             return redirect('camera_config_list')
@@ -413,6 +259,13 @@ def camera_config_update(request, pk):
         config.name = request.POST.get('name')
         config.camera_source = request.POST.get('camera_source')
         config.threshold = request.POST.get('threshold')
+        config.frame_stride = request.POST.get('frame_stride') or 1
+        config.max_fps = request.POST.get('max_fps') or 0
+        config.motion_threshold = request.POST.get('motion_threshold') or 0
+        config.roi_left = request.POST.get('roi_left') or 0
+        config.roi_top = request.POST.get('roi_top') or 0
+        config.roi_right = request.POST.get('roi_right') or 1
+        config.roi_bottom = request.POST.get('roi_bottom') or 1
         config.success_sound_path = request.POST.get('success_sound_path')
 
         # Save the changes to the database
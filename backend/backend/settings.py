@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     'bookings',
     'sales',
     'staff_management',
+    'face_engine',
     'app1'
 ]
 
@@ -146,6 +147,71 @@ else:
 }
 
 
+# FACE RECOGNITION SECTION
+# Load MTCNN/InceptionResnetV1 when the worker boots instead of on the first request
+FACE_MODELS_WARMUP = config('FACE_MODELS_WARMUP', default=False, cast=bool)
+FACE_DEVICE = config('FACE_DEVICE', default='cpu')
+# Embedding network runtime: 'eager', 'quantized' (int8 Linear layers, CPU), or a model written by
+# `manage.py export_face_model`: 'torchscript' / 'onnx' (see face_engine/backends.py).
+# FACE_EMBEDDING_MODEL_PATH defaults to face_models/inception_resnet_v1.{pt,onnx} next to manage.py
+FACE_EMBEDDING_BACKEND = config('FACE_EMBEDDING_BACKEND', default='eager')
+FACE_EMBEDDING_MODEL_PATH = config('FACE_EMBEDDING_MODEL_PATH', default='')
+# Run MTCNN on a copy whose longest side is at most this many pixels (0 = full resolution);
+# boxes are mapped back so embeddings still use full-resolution crops. Faces must stay above
+# MTCNN's 20 px minimum after scaling.
+FACE_DETECT_MAX_SIDE = config('FACE_DETECT_MAX_SIDE', default=640, cast=int)
+# Unix socket of `manage.py run_face_server`; when set, web workers and the camera recognizer
+# send images there instead of loading the models themselves (e.g. /run/pumpos/face.sock)
+FACE_INFERENCE_SOCKET = config('FACE_INFERENCE_SOCKET', default='')
+# Longest wait for an inference result, from the server or a micro-batch, before answering 503
+FACE_INFERENCE_TIMEOUT = config('FACE_INFERENCE_TIMEOUT', default=10.0, cast=float)
+# Torch / ONNX Runtime threads per process. 0 = cores // WEB_CONCURRENCY (gunicorn workers), so
+# workers x threads never oversubscribes the host; `manage.py benchmark_face_inference` finds the best split
+FACE_TORCH_THREADS = config('FACE_TORCH_THREADS', default=0, cast=int)
+FACE_TORCH_INTEROP_THREADS = config('FACE_TORCH_INTEROP_THREADS', default=1, cast=int)
+# Face requests admitted into inference at once per worker (face_engine/limits.py); others wait up
+# to FACE_INFERENCE_QUEUE_TIMEOUT seconds, then get 503 with Retry-After: FACE_INFERENCE_RETRY_AFTER
+FACE_INFERENCE_MAX_CONCURRENT = config('FACE_INFERENCE_MAX_CONCURRENT', default=4, cast=int)
+FACE_INFERENCE_QUEUE_TIMEOUT = config('FACE_INFERENCE_QUEUE_TIMEOUT', default=2.0, cast=float)
+FACE_INFERENCE_RETRY_AFTER = config('FACE_INFERENCE_RETRY_AFTER', default=1, cast=int)
+# Micro-batching (inference server, and in-process when FACE_BATCH_REQUESTS is on): keep collecting
+# concurrent requests for this long once several are waiting, up to this many per pass
+FACE_BATCH_REQUESTS = config('FACE_BATCH_REQUESTS', default=True, cast=bool)
+FACE_BATCH_WINDOW_MS = config('FACE_BATCH_WINDOW_MS', default=10, cast=float)
+FACE_BATCH_MAX_SIZE = config('FACE_BATCH_MAX_SIZE', default=8, cast=int)
+# Member matching: cosine similarity against the best of up to FACE_MAX_TEMPLATES enrolment shots.
+# 0.82 on unit vectors equals the former Euclidean threshold of 0.6 (d^2 = 2 - 2 cos).
+FACE_MATCH_MIN_SIMILARITY = config('FACE_MATCH_MIN_SIMILARITY', default=0.82, cast=float)
+FACE_MAX_TEMPLATES = config('FACE_MAX_TEMPLATES', default=5, cast=int)
+# Bulk enrolment (gymnast/enrolment.py): images per embedding batch, image decoding threads
+FACE_ENROLL_BATCH_SIZE = config('FACE_ENROLL_BATCH_SIZE', default=16, cast=int)
+FACE_ENROLL_DECODE_WORKERS = config('FACE_ENROLL_DECODE_WORKERS', default=4, cast=int)
+# Gallery search: 'exact' (default), 'ivf' or 'lsh', see face_engine/search.py
+FACE_SEARCH_BACKEND = config('FACE_SEARCH_BACKEND', default='exact')
+FACE_SEARCH_OPTIONS = {
+    # ivf: nlist (default sqrt(n)), nprobe - more probes = better recall, slower
+    'nprobe': config('FACE_SEARCH_NPROBE', default=8, cast=int),
+    # lsh: n_bits, n_tables
+}
+# Rebuild the ANN index once this share of the gallery changed since it was built
+FACE_SEARCH_REBUILD_RATIO = 0.05
+# Member gallery snapshots (gymnast/snapshot.py), memory-mapped by every worker. They hold face
+# embeddings, so FACE_GALLERY_SNAPSHOT_DIR (default: face_gallery/ next to manage.py) must not be served
+FACE_GALLERY_SNAPSHOTS = config('FACE_GALLERY_SNAPSHOTS', default=True, cast=bool)
+FACE_GALLERY_SNAPSHOT_DIR = config('FACE_GALLERY_SNAPSHOT_DIR', default='')
+FACE_GALLERY_SNAPSHOT_DELAY = 2.0  # seconds to batch embedding changes before writing a snapshot
+FACE_GALLERY_SNAPSHOT_POLL = 5.0  # seconds between checks for a newer snapshot
+# Camera face tracking (app1/tracking.py): refresh_interval, retry_interval, max_age, iou_threshold...
+FACE_TRACKER_OPTIONS = {
+    'refresh_interval': config('FACE_TRACK_REFRESH_SECONDS', default=5.0, cast=float),
+}
+# Recognizer pipeline (app1/pipeline.py): frames buffered per camera before the oldest is dropped,
+# inference threads shared by all cameras, pending attendance writes
+RECOGNIZER_FRAME_QUEUE_SIZE = config('RECOGNIZER_FRAME_QUEUE_SIZE', default=2, cast=int)
+RECOGNIZER_INFERENCE_WORKERS = config('RECOGNIZER_INFERENCE_WORKERS', default=2, cast=int)
+RECOGNIZER_ATTENDANCE_QUEUE_SIZE = config('RECOGNIZER_ATTENDANCE_QUEUE_SIZE', default=1000, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='classinstance',
+            index=models.Index(fields=['schedule'], name='classinstance_schedule_idx'),
+        ),
+    ]
@@ -27,6 +27,9 @@ class ClassInstance(models.Model):
 
     class Meta:
         ordering = ['schedule']
+        indexes = [
+            models.Index(fields=['schedule'], name='classinstance_schedule_idx'),
+        ]
 
 class Booking(models.Model):
     member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='bookings')
@@ -1,9 +1,12 @@
+from collections import Counter
+
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response  # Import Response
 from django.utils import timezone
 from django.db.models import Count
 from datetime import timedelta
+from gymnast.dates import day_bounds
 from .models import ClassInstance, Booking
 from .serializers import ClassInstanceSerializer, BookingSerializer
 
@@ -18,9 +21,8 @@ class ClassInstanceListCreateView(generics.ListCreateAPIView):
         if date_str:
             try:
                 date = timezone.datetime.strptime(date_str, '%Y-%m-%d').date()
-                start = timezone.make_aware(timezone.datetime.combine(date, timezone.datetime.min.time()))
-                end = start + timedelta(days=1)
-                queryset = queryset.filter(schedule__range=[start, end])
+                start, end = day_bounds(date)
+                queryset = queryset.filter(schedule__gte=start, schedule__lt=end)
             except ValueError:
                 # Log error or handle invalid date gracefully
                 pass
@@ -37,9 +39,8 @@ class BookingListCreateView(generics.ListCreateAPIView):
         if date_str:
             try:
                 date = timezone.datetime.strptime(date_str, '%Y-%m-%d').date()
-                start = timezone.make_aware(timezone.datetime.combine(date, timezone.datetime.min.time()))
-                end = start + timedelta(days=1)
-                queryset = queryset.filter(class_instance__schedule__range=[start, end])
+                start, end = day_bounds(date)
+                queryset = queryset.filter(class_instance__schedule__gte=start, class_instance__schedule__lt=end)
             except ValueError:
                 pass
         return queryset.order_by('-booked_at')[:5]  # Limit to 5 recent bookings
@@ -48,21 +49,21 @@ class WeeklyScheduleView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ClassInstanceSerializer
 
+    def start_of_week(self):
+        today = timezone.localdate()
+        return today - timedelta(days=today.weekday())  # Monday of the current week
+
     def get_queryset(self):
-        today = timezone.now().date()
-        start_of_week = today - timedelta(days=today.weekday())  # Monday of the current week
-        end_of_week = start_of_week + timedelta(days=7)  # Sunday of the current week
-        return ClassInstance.objects.filter(schedule__range=[start_of_week, end_of_week])
+        start, end = day_bounds(self.start_of_week(), days=7)  # Monday 00:00 up to next Monday 00:00
+        return ClassInstance.objects.filter(schedule__gte=start, schedule__lt=end)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
         days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        weekly_schedule = []
-        start_of_week = timezone.now().date() - timedelta(days=timezone.now().date().weekday())
-
-        for i, day in enumerate(days):
-            day_date = start_of_week + timedelta(days=i)
-            class_count = queryset.filter(schedule__date=day_date).count()
-            weekly_schedule.append({'day': day, 'classes': class_count})
+        # One range scan for the week, bucketed here, instead of a schedule__date count per day
+        class_counts = Counter(
+            timezone.localtime(schedule).weekday()
+            for schedule in self.get_queryset().values_list('schedule', flat=True)
+        )
+        weekly_schedule = [{'day': day, 'classes': class_counts[i]} for i, day in enumerate(days)]
 
         return Response(weekly_schedule)
\ No newline at end of file
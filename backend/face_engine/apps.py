@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class FaceEngineConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "face_engine"
+
+    def ready(self):
+        # Opt-in so that migrate/shell and other management commands stay fast.
+        # With a shared inference server the models live there, not in this process.
+        if getattr(settings, 'FACE_MODELS_WARMUP', False) and not getattr(settings, 'FACE_INFERENCE_SOCKET', ''):
+            from .registry import face_models
+            face_models.warmup()
@@ -0,0 +1,183 @@
+"""
+Interchangeable runtimes for the InceptionResnetV1 embedding network.
+
+settings.FACE_EMBEDDING_BACKEND picks one:
+
+    eager        the facenet_pytorch module as is (default)
+    quantized    eager weights with the Linear layers dynamically quantized to int8
+    torchscript  a traced module written by `manage.py export_face_model --format torchscript`
+    onnx         an ONNX graph run by ONNX Runtime (`--format onnx`)
+
+Every backend takes an (n, 3, 160, 160) float32 batch and returns (n, 512)
+float32 L2-normalized embeddings, so gallery templates stay comparable
+whatever runs them. The parity tests in face_engine/tests.py check each
+one against eager mode.
+"""
+import os
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+FACE_SIZE = 160
+BACKENDS = ('eager', 'quantized', 'torchscript', 'onnx')
+DEFAULT_MODEL_FILES = {
+    'torchscript': 'inception_resnet_v1.pt',
+    'onnx': 'inception_resnet_v1.onnx',
+}
+
+
+def default_model_path(backend):
+    """Where export_face_model writes, and the backend loads, the model for `backend`."""
+    path = getattr(settings, 'FACE_EMBEDDING_MODEL_PATH', '')
+    if path:
+        return path
+    return os.path.join(settings.BASE_DIR, 'face_models', DEFAULT_MODEL_FILES[backend])
+
+
+def load_eager_resnet(device='cpu'):
+    from facenet_pytorch import InceptionResnetV1
+
+    return InceptionResnetV1(pretrained='vggface2', device=device).eval()
+
+
+def quantize(resnet):
+    """Dynamic int8 quantization of the Linear layers (CPU only); the convolutions stay float32."""
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(resnet.cpu(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class TorchBackend:
+    """Any torch module taking a batch of faces: eager, quantized or TorchScript."""
+
+    def __init__(self, module, name, device='cpu'):
+        self.module = module
+        self.name = name
+        self.device = device
+
+    def __call__(self, batch):
+        import torch
+
+        with torch.inference_mode():
+            embeddings = self.module(torch.from_numpy(batch).to(self.device))
+        return embeddings.cpu().numpy()
+
+    def parameter_bytes(self):
+        return sum(p.numel() * p.element_size() for p in self.module.parameters())
+
+
+class OnnxBackend:
+    """An exported graph run by ONNX Runtime."""
+
+    name = 'onnx'
+
+    def __init__(self, path, device='cpu'):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImproperlyConfigured("FACE_EMBEDDING_BACKEND='onnx' needs the onnxruntime package.")
+        providers = ['CPUExecutionProvider']
+        if str(device).startswith('cuda'):
+            providers.insert(0, 'CUDAExecutionProvider')
+        from .limits import torch_thread_count
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = torch_thread_count()  # Same per-worker core budget as torch
+        options.inter_op_num_threads = getattr(settings, 'FACE_TORCH_INTEROP_THREADS', 1)
+        self.path = path
+        self.session = onnxruntime.InferenceSession(path, sess_options=options, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        return self.session.run(None, {self.input_name: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+
+    def parameter_bytes(self):
+        return os.path.getsize(self.path)
+
+
+def load_backend(name=None, device=None, path=None, resnet=None):
+    """
+    Build the embedding backend `name` (settings.FACE_EMBEDDING_BACKEND).
+
+    `resnet` is an already loaded eager module for the eager / quantized
+    backends; exported backends read `path` (settings.FACE_EMBEDDING_MODEL_PATH
+    or face_models/ next to manage.py) and never load facenet_pytorch.
+    """
+    name = name or getattr(settings, 'FACE_EMBEDDING_BACKEND', 'eager')
+    device = device or getattr(settings, 'FACE_DEVICE', 'cpu')
+    if name not in BACKENDS:
+        raise ImproperlyConfigured(f"FACE_EMBEDDING_BACKEND must be one of {BACKENDS}, got {name!r}")
+
+    if name in ('eager', 'quantized'):
+        resnet = resnet if resnet is not None else load_eager_resnet(device)
+        if name == 'eager':
+            return TorchBackend(resnet, name, device)
+        if str(device) != 'cpu':
+            raise ImproperlyConfigured("FACE_EMBEDDING_BACKEND='quantized' only runs on FACE_DEVICE='cpu'.")
+        return TorchBackend(quantize(resnet), name)
+
+    path = path or default_model_path(name)
+    if not os.path.exists(path):
+        raise ImproperlyConfigured(
+            f"No exported {name} face model at {path}; run `manage.py export_face_model --format {name}`."
+        )
+    if name == 'onnx':
+        return OnnxBackend(path, device)
+
+    import torch
+
+    return TorchBackend(torch.jit.load(path, map_location=device).eval(), name, device)
+
+
+def _example_batch(batch_size=2):
+    import torch
+
+    return torch.rand((batch_size, 3, FACE_SIZE, FACE_SIZE))
+
+
+def export_torchscript(resnet, path, quantized=False):
+    """Trace `resnet` (optionally int8-quantized first) and save it for the torchscript backend."""
+    import torch
+
+    module = quantize(resnet) if quantized else resnet.cpu().eval()
+    with torch.no_grad():  # Tensors created under inference_mode cannot be captured by the trace
+        traced = torch.jit.trace(module, _example_batch(), check_trace=False)
+    traced = torch.jit.freeze(traced.eval())
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    traced.save(path)
+    return path
+
+
+def export_onnx(resnet, path, quantized=False, opset=17):
+    """
+    Export `resnet` to ONNX with a dynamic batch axis. With quantized=True the
+    graph is also passed through ONNX Runtime's dynamic int8 quantization,
+    which, unlike torch's, covers the convolutions too.
+    """
+    import torch
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    float_path = f'{path}.float32' if quantized else path
+    torch.onnx.export(
+        resnet.cpu().eval(), _example_batch(), float_path,
+        input_names=['faces'], output_names=['embeddings'],
+        dynamic_axes={'faces': {0: 'batch'}, 'embeddings': {0: 'batch'}},
+        opset_version=opset, dynamo=False,
+    )
+    if quantized:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(float_path, path, weight_type=QuantType.QInt8)
+        os.unlink(float_path)
+    return path
+
+
+def parity(reference, candidate, batch):
+    """Smallest cosine similarity and largest absolute difference between two backends' embeddings."""
+    expected = np.asarray(reference(batch), dtype=np.float32)
+    actual = np.asarray(candidate(batch), dtype=np.float32)
+    cosine = np.sum(expected * actual, axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    )
+    return float(cosine.min()), float(np.abs(expected - actual).max())
@@ -0,0 +1,145 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+logger = logging.getLogger(__name__)
+
+
+class BatchTimeout(TimeoutError):
+    """A queued item got no result within the batcher's timeout."""
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent calls into batches for one `process_batch(items)`
+    call, which must return one result per item.
+
+    A lone request is processed straight away. Once several requests are
+    waiting, the batcher keeps collecting for up to `window` seconds or
+    `max_size` items, and requests that arrive while a batch is running
+    are picked up together by the next one.
+
+    Callers never wait longer than `timeout` seconds for a result: a stuck
+    or dead worker thread raises BatchTimeout instead of hanging every
+    request thread. A dead worker is restarted on the next submit().
+    """
+
+    def __init__(self, process_batch, window=0.01, max_size=8, name='micro-batcher', timeout=30.0):
+        self.process_batch = process_batch
+        self.window = window
+        self.max_size = max(1, max_size)
+        self.name = name
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.stats = {'batches': 0, 'items': 0, 'max_batch': 0}
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError(f'{self.name} is closed')
+                if self._thread is None or not self._thread.is_alive():
+                    if self._thread is not None:
+                        logger.error("%s: worker thread died, restarting it", self.name)
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def submit(self, item):
+        """Queue one item; the returned Future resolves to its result."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def result(self, future, timeout=None):
+        """Result of a submit() future, waiting at most `timeout` (default self.timeout) seconds."""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            raise BatchTimeout(f'{self.name}: no result within {timeout}s') from None
+
+    def __call__(self, item, timeout=None):
+        return self.result(self.submit(item), timeout)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        self._queue.put(None)
+
+    def _collect(self, first):
+        batch = [first]
+        # Whatever is already waiting joins without delay
+        while len(batch) < self.max_size:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                self._queue.put(None)
+                return batch
+            batch.append(entry)
+        if len(batch) == 1:
+            return batch  # No concurrent load: do not make a single request wait
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _process_each(self, items, futures):
+        for item, future in zip(items, futures):
+            try:
+                future.set_result(self.process_batch([item])[0])
+            except Exception as e:
+                future.set_exception(e)
+
+    def _process(self, batch):
+        items = [item for item, _ in batch]
+        futures = [future for _, future in batch]
+        try:
+            results = self.process_batch(items)
+            if len(results) != len(items):
+                raise RuntimeError(f'{self.name}: {len(results)} results for {len(items)} items')
+        except Exception as e:
+            if len(items) == 1:
+                futures[0].set_exception(e)
+                return
+            # One bad item must not fail its neighbours: retry them one by one
+            logger.warning("%s: batch of %d failed (%s), retrying items separately", self.name, len(items), e)
+            self._process_each(items, futures)
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
+        self.stats['batches'] += 1
+        self.stats['items'] += len(items)
+        self.stats['max_batch'] = max(self.stats['max_batch'], len(items))
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            try:
+                self._process(batch)
+            except Exception as e:
+                # Never leave callers waiting on a batch the worker gave up on
+                logger.exception("%s: batch failed", self.name)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
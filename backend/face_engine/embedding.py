@@ -0,0 +1,240 @@
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .backends import TorchBackend
+from .batching import BatchTimeout, MicroBatcher
+from .registry import face_models
+from .server import InferenceUnavailable, inference_client
+
+# cv2 and torch are imported inside the functions that need them: this module is reached from
+# every URLconf load, and only face requests should pay for the ML stack (face_engine/importtime.py)
+
+FACE_SIZE = 160  # InceptionResnetV1 input resolution
+EMBEDDING_DIM = 512
+
+
+def _remote():
+    """True when a shared inference server (manage.py run_face_server) owns the models."""
+    return bool(getattr(settings, 'FACE_INFERENCE_SOCKET', ''))
+
+
+def crop_faces(image, boxes, size=FACE_SIZE):
+    """
+    Crop every MTCNN box out of an RGB image into one preallocated
+    (n, 3, size, size) float32 batch scaled to [0, 1].
+
+    Boxes are clipped to the image; empty crops are skipped. Returns the batch
+    and the indices of the boxes that made it in.
+    """
+    import cv2
+
+    height, width = image.shape[:2]
+    batch = np.empty((len(boxes), 3, size, size), dtype=np.float32)
+    kept = []
+    for i, box in enumerate(boxes):
+        x1, y1, x2, y2 = (int(v) for v in box[:4])
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, width), min(y2, height)
+        if x2 <= x1 or y2 <= y1:
+            continue
+        face = cv2.resize(image[y1:y2, x1:x2, :3], (size, size))
+        batch[len(kept)] = face.transpose(2, 0, 1)
+        kept.append(i)
+    batch = batch[:len(kept)]
+    batch *= 1.0 / 255.0
+    return batch, np.array(kept, dtype=np.int64)
+
+
+def _forward(batch, resnet=None):
+    if resnet is None:
+        return face_models.embedder(batch)
+    # An explicitly passed eager module (parity checks, notebooks) bypasses the configured backend
+    return TorchBackend(resnet, 'eager', next(resnet.parameters()).device)(batch)
+
+
+def embed_faces_batch(items, resnet=None):
+    """
+    Embed the faces of several frames in a single forward pass.
+
+    `items` is a list of (image, boxes); returns one (embeddings, kept) per
+    item, as embed_faces() would.
+    """
+    crops = [crop_faces(image, boxes) for image, boxes in items]
+    total = sum(len(kept) for _, kept in crops)
+    if not total:
+        return [(np.zeros((0, EMBEDDING_DIM), dtype=np.float32), kept) for _, kept in crops]
+    embeddings = _forward(np.concatenate([batch for batch, _ in crops]), resnet)
+    results, offset = [], 0
+    for _, kept in crops:
+        results.append((embeddings[offset:offset + len(kept)], kept))
+        offset += len(kept)
+    return results
+
+
+def embed_faces(image, boxes, resnet=None):
+    """
+    Embed all faces of one frame in a single forward pass.
+
+    Returns (embeddings, kept) where embeddings is (m, 512) float32 and
+    kept[i] is the index in `boxes` that embeddings[i] belongs to.
+    """
+    if resnet is None and _remote():
+        return inference_client.call('embed', (image, boxes))
+    return embed_faces_batch([(image, boxes)], resnet)[0]
+
+
+class FaceDetections:
+    """Boxes (x1, y1, x2, y2), MTCNN probabilities and embeddings of one frame, row-aligned."""
+
+    __slots__ = ('boxes', 'probs', 'embeddings')
+
+    def __init__(self, boxes, probs, embeddings):
+        self.boxes = boxes
+        self.probs = probs
+        self.embeddings = embeddings
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.zeros((0, 4), dtype=np.float32),
+            np.zeros(0, dtype=np.float32),
+            np.zeros((0, EMBEDDING_DIM), dtype=np.float32),
+        )
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def __iter__(self):
+        return zip(self.boxes, self.probs, self.embeddings)
+
+    def largest(self):
+        """Index of the face with the largest box, e.g. the subject of an enrolment photo."""
+        areas = (self.boxes[:, 2] - self.boxes[:, 0]) * (self.boxes[:, 3] - self.boxes[:, 1])
+        return int(np.argmax(areas))
+
+
+def _empty_detection():
+    return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+
+def downscale_for_detection(image, max_side=None):
+    """
+    Shrink an image so its longest side is at most `max_side`
+    (settings.FACE_DETECT_MAX_SIDE, 0 = never). Returns (image, scale) where
+    boxes found on the result divided by `scale` are full-resolution boxes.
+    """
+    if max_side is None:
+        max_side = getattr(settings, 'FACE_DETECT_MAX_SIDE', 0)
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if not max_side or longest <= max_side:
+        return image, 1.0
+    import cv2
+
+    scale = max_side / longest
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def detect_faces_batch(images, max_side=None):
+    """
+    Run MTCNN over several RGB images; returns one (boxes, probs) per image.
+
+    MTCNN's image pyramid grows with the input area, so detection runs on a
+    copy downscaled to FACE_DETECT_MAX_SIDE and the boxes are mapped back to
+    the original resolution; the 160x160 crops for ResNet still come from
+    the full-resolution image. MTCNN only batches equally sized images, so
+    images are grouped by (downscaled) shape and each group goes through the
+    network in one call.
+    """
+    import torch
+
+    mtcnn = face_models.mtcnn
+    results = [None] * len(images)
+    scaled = [downscale_for_detection(image, max_side) for image in images]
+    groups = {}
+    for i, (image, _) in enumerate(scaled):
+        groups.setdefault(image.shape, []).append(i)
+    for indices in groups.values():
+        with torch.no_grad():
+            batch_boxes, batch_probs = mtcnn.detect(np.stack([scaled[i][0] for i in indices]))
+        for i, boxes, probs in zip(indices, batch_boxes, batch_probs):
+            if boxes is None:
+                results[i] = _empty_detection()
+            else:
+                boxes = np.asarray(boxes, dtype=np.float32)
+                if scaled[i][1] != 1.0:
+                    boxes /= scaled[i][1]
+                results[i] = (boxes, np.asarray(probs, dtype=np.float32))
+    return results
+
+
+def detect_and_embed_batch(images):
+    """detect_and_embed() for several images: one MTCNN call per image size, one ResNet pass in total."""
+    detected = detect_faces_batch(images)
+    with_faces = [i for i, (boxes, _) in enumerate(detected) if len(boxes)]
+    results = [FaceDetections.empty() for _ in images]
+    embedded = embed_faces_batch([(images[i], detected[i][0]) for i in with_faces])
+    for i, (embeddings, kept) in zip(with_faces, embedded):
+        boxes, probs = detected[i]
+        results[i] = FaceDetections(boxes[kept], probs[kept], embeddings)
+    return results
+
+
+def detect_faces(image):
+    """Run MTCNN on an RGB image; returns (boxes (n, 4), probs (n,)), empty arrays if no face."""
+    if _remote():
+        return inference_client.call('detect', image)
+    return detect_faces_batch([image])[0]
+
+
+def detect_and_embed_many(images):
+    """
+    detect_and_embed() for a list of images known up front (bulk enrolment).
+
+    Locally this is detect_and_embed_batch(); through the inference server the
+    images are submitted together so they share the server's batches.
+    """
+    if _remote():
+        return [FaceDetections(*result) for result in inference_client.call('detect_and_embed_many', images)]
+    return detect_and_embed_batch(images)
+
+
+_request_batcher = None
+_request_batcher_lock = threading.Lock()
+
+
+def request_batcher():
+    """Process-wide MicroBatcher over detect_and_embed_batch, created on first use."""
+    global _request_batcher
+    if _request_batcher is None:
+        with _request_batcher_lock:
+            if _request_batcher is None:
+                _request_batcher = MicroBatcher(
+                    detect_and_embed_batch,
+                    window=getattr(settings, 'FACE_BATCH_WINDOW_MS', 10) / 1000.0,
+                    max_size=getattr(settings, 'FACE_BATCH_MAX_SIZE', 8),
+                    name='batch-requests',
+                    timeout=getattr(settings, 'FACE_INFERENCE_TIMEOUT', 10.0),
+                )
+    return _request_batcher
+
+
+def detect_and_embed(image):
+    """
+    Run MTCNN once on an RGB image and embed every detected face.
+
+    Only faces that could be cropped are returned, so boxes[i] always belongs
+    to embeddings[i]. Concurrent calls in one process (threaded workers, several
+    kiosks at once) are coalesced into one batch when FACE_BATCH_REQUESTS is on.
+    """
+    if _remote():
+        return FaceDetections(*inference_client.call('detect_and_embed', image))
+    if getattr(settings, 'FACE_BATCH_REQUESTS', False):
+        try:
+            return request_batcher()(image)
+        except BatchTimeout as e:
+            raise InferenceUnavailable(str(e))
+    return detect_and_embed_batch([image])[0]
@@ -0,0 +1,100 @@
+import base64
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.db import models
+
+EMBEDDING_DTYPES = ('float32', 'float16')
+
+
+def embedding_to_bytes(value, dtype='float32', normalize=False, dim=None):
+    """
+    Serialize a list / array embedding to raw little-endian bytes. With `dim`
+    the value may hold several embeddings (rows); each row is normalized on its own.
+    """
+    vectors = np.asarray(value, dtype=np.float32)
+    vectors = vectors.reshape(-1, dim) if dim else vectors.reshape(1, -1)
+    if normalize:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1.0)
+    return vectors.astype(np.dtype(dtype).newbyteorder('<'), copy=False).tobytes()
+
+
+def embedding_from_bytes(raw, dtype='float32', dim=None):
+    """Read-only numpy view over stored bytes (no parse, no copy); (n, dim) when dim is given."""
+    vectors = np.frombuffer(raw, dtype=np.dtype(dtype).newbyteorder('<'))
+    return vectors.reshape(-1, dim) if dim else vectors
+
+
+class EmbeddingField(models.BinaryField):
+    """
+    A face embedding stored as raw float32 (2 KB for 512-d) or float16 (1 KB)
+    bytes instead of ~10 KB of JSON text.
+
+    Assign a list or numpy array; reads return a read-only numpy array backed
+    by the database buffer via np.frombuffer. With `dim` the field holds a set
+    of embeddings and reads return an (n, dim) array. With normalize=True every
+    vector is L2-normalized when saved. Empty / missing values are stored as NULL.
+    """
+
+    def __init__(self, *args, dtype='float32', normalize=False, dim=None, **kwargs):
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"EmbeddingField dtype must be one of {EMBEDDING_DTYPES}, got {dtype!r}")
+        self.dtype = dtype
+        self.normalize = normalize
+        self.dim = dim
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('blank', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.dtype != 'float32':
+            kwargs['dtype'] = self.dtype
+        if self.normalize:
+            kwargs['normalize'] = True
+        if self.dim:
+            kwargs['dim'] = self.dim
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return embedding_from_bytes(value, self.dtype, self.dim)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, np.ndarray):
+            return value
+        if isinstance(value, str):
+            # Fixtures / dumpdata carry the bytes base64-encoded, like BinaryField
+            value = base64.b64decode(value)
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return embedding_from_bytes(value, self.dtype, self.dim)
+        try:
+            vectors = np.asarray(value, dtype=np.float32)
+            return vectors.reshape(-1, self.dim) if self.dim else vectors.reshape(-1)
+        except (TypeError, ValueError):
+            raise ValidationError('Face embedding must be a list of numbers.', code='invalid')
+
+    def pre_save(self, model_instance, add):
+        # Leave the instance holding exactly what is stored (normalized, rounded to dtype),
+        # so post_save receivers see the same vector a later query would return
+        raw = self.get_prep_value(getattr(model_instance, self.attname))
+        value = None if raw is None else embedding_from_bytes(raw, self.dtype, self.dim)
+        setattr(model_instance, self.attname, value)
+        return value
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)
+        if len(value) == 0:
+            return None
+        if self.dim and np.size(value) % self.dim:
+            raise ValueError(f"Expected a multiple of {self.dim} values, got {np.size(value)}")
+        return embedding_to_bytes(value, self.dtype, self.normalize, self.dim)
+
+    def value_to_string(self, obj):
+        value = self.get_prep_value(self.value_from_object(obj))
+        return None if value is None else base64.b64encode(value).decode('ascii')
@@ -0,0 +1,38 @@
+import base64
+import binascii
+
+import numpy as np
+
+
+def decode_image(data):
+    """
+    Decode an encoded image (JPEG, PNG, ...) straight to an RGB uint8 array.
+
+    `data` may be bytes, bytearray or a memoryview over an upload buffer; it
+    is wrapped with np.frombuffer, so the encoded bytes are never copied.
+    """
+    import cv2
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError('Not a readable image')
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def decode_data_url(value):
+    """Decode a base64 image, with or without a 'data:image/...;base64,' prefix."""
+    if ',' in value:
+        value = value.split(',', 1)[1]
+    try:
+        return decode_image(base64.b64decode(value))
+    except (binascii.Error, ValueError):
+        raise ValueError('Invalid base64 image')
+
+
+def upload_buffer(upload):
+    """Contents of a Django UploadedFile, as a memoryview when it is held in memory."""
+    file = getattr(upload, 'file', None)
+    if hasattr(file, 'getbuffer'):
+        return file.getbuffer()  # InMemoryUploadedFile: BytesIO, no copy
+    upload.seek(0)
+    return upload.read()
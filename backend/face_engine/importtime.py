@@ -0,0 +1,75 @@
+"""
+Startup cost of the Django project, measured with `python -X importtime`.
+
+The face stack (torch, facenet_pytorch, cv2, onnxruntime) is imported on
+first use only, so migrations, management commands and the CRUD endpoints
+never pay for it. measure_startup() boots Django and loads the URLconf in a
+fresh interpreter and reports the import tree. `manage.py benchmark_startup`
+prints the report, and face_engine/tests.py fails if a heavy module shows up.
+"""
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+# Modules that must not be imported just by starting Django and loading every view
+HEAVY_MODULES = ('torch', 'torchvision', 'facenet_pytorch', 'cv2', 'ultralytics', 'onnxruntime', 'pygame')
+
+STARTUP_CODE = (
+    'import django; django.setup(); '
+    'from django.urls import get_resolver; get_resolver().url_patterns'
+)
+
+
+class ImportRecord:
+    __slots__ = ('module', 'depth', 'self_us', 'cumulative_us')
+
+    def __init__(self, module, depth, self_us, cumulative_us):
+        self.module = module
+        self.depth = depth
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+
+
+def parse_importtime(stderr):
+    """ImportRecords from `-X importtime` output ('import time: self | cumulative | package')."""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue  # Header line
+        module = name.strip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # Nested imports are indented by two spaces
+        records.append(ImportRecord(module, depth, self_us, cumulative_us))
+    return records
+
+
+def measure_startup(code=STARTUP_CODE):
+    """Run `code` in a fresh interpreter; returns (wall seconds, [ImportRecord])."""
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), env.get('PYTHONPATH')]))
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    seconds = time.perf_counter() - started
+    if result.returncode:
+        raise RuntimeError(f'Startup failed:\n{result.stderr[-2000:]}')
+    return seconds, parse_importtime(result.stderr)
+
+
+def heavy_imports(records, heavy=HEAVY_MODULES):
+    """Top-level heavy packages that were imported, with their cumulative import time."""
+    return {
+        record.module: record.cumulative_us
+        for record in records
+        if record.module in heavy
+    }
@@ -0,0 +1,115 @@
+"""
+Per-process admission control for face inference.
+
+Torch already spreads one forward pass over FACE_TORCH_THREADS cores. Letting
+every request thread of a worker start its own pass just makes them compete for
+the same cores, and they all finish late. The limiter admits at most
+FACE_INFERENCE_MAX_CONCURRENT requests into inference per worker. The rest wait
+up to FACE_INFERENCE_QUEUE_TIMEOUT seconds for a slot and then fail fast with
+InferenceBusy, which the views turn into 503 + Retry-After so kiosks back off
+instead of piling up.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .server import InferenceUnavailable
+
+
+class InferenceBusy(InferenceUnavailable):
+    """Every inference slot of this worker stayed taken for the whole queue timeout."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after_seconds():
+    return getattr(settings, 'FACE_INFERENCE_RETRY_AFTER', 1)
+
+
+def torch_thread_count():
+    """
+    Intra-op threads for this worker: settings.FACE_TORCH_THREADS, or when 0
+    the cores divided by the gunicorn workers on the host (WEB_CONCURRENCY).
+    """
+    threads = getattr(settings, 'FACE_TORCH_THREADS', 0)
+    if threads:
+        return threads
+    workers = int(os.environ.get('WEB_CONCURRENCY', '1') or 1)
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def configure_torch_threads(threads=None, interop_threads=None):
+    """Apply the thread settings to torch; call before the first forward pass."""
+    import torch
+
+    threads = threads or torch_thread_count()
+    if interop_threads is None:
+        interop_threads = getattr(settings, 'FACE_TORCH_INTEROP_THREADS', 1)
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        pass  # Torch only accepts this before its inter-op pool has started
+    return threads, torch.get_num_interop_threads()
+
+
+class InferenceLimiter:
+    """A semaphore with a bounded wait and counters for the status endpoints."""
+
+    def __init__(self, max_concurrent=4, queue_timeout=2.0, retry_after=1):
+        self.max_concurrent = max(1, max_concurrent)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self.stats = {'admitted': 0, 'rejected': 0, 'in_flight': 0, 'waiting': 0, 'max_wait': 0.0}
+
+    @contextmanager
+    def slot(self):
+        started = time.monotonic()
+        with self._lock:
+            self.stats['waiting'] += 1
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        waited = time.monotonic() - started
+        with self._lock:
+            self.stats['waiting'] -= 1
+            if not acquired:
+                self.stats['rejected'] += 1
+            else:
+                self.stats['admitted'] += 1
+                self.stats['in_flight'] += 1
+                self.stats['max_wait'] = max(self.stats['max_wait'], round(waited, 3))
+        if not acquired:
+            raise InferenceBusy(
+                f'Face recognition is busy ({self.max_concurrent} requests in progress), try again shortly',
+                self.retry_after,
+            )
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stats['in_flight'] -= 1
+            self._slots.release()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def inference_limiter():
+    """Process-wide InferenceLimiter built from settings on first use."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = InferenceLimiter(
+                    max_concurrent=getattr(settings, 'FACE_INFERENCE_MAX_CONCURRENT', 4),
+                    queue_timeout=getattr(settings, 'FACE_INFERENCE_QUEUE_TIMEOUT', 2.0),
+                    retry_after=retry_after_seconds(),
+                )
+    return _limiter
@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from face_engine.backends import FACE_SIZE
+
+
+def _worker(threads, batch_size, seconds, ready, start, results):
+    """One simulated gunicorn worker: own backend, own torch thread pool, back-to-back requests."""
+    import django
+
+    django.setup()  # Spawned child: DJANGO_SETTINGS_MODULE comes from manage.py's environment
+
+    from face_engine.backends import load_backend
+    from face_engine.limits import configure_torch_threads
+
+    configure_torch_threads(threads)
+    embedder = load_backend(device='cpu')
+    batch = np.random.default_rng(os.getpid()).random((batch_size, 3, FACE_SIZE, FACE_SIZE), dtype=np.float32)
+    embedder(batch)  # Warm-up outside the measurement
+    ready.wait()
+    start.wait()
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        embedder(batch)
+        latencies.append(time.perf_counter() - started)
+    results.put(latencies)
+
+
+class Command(BaseCommand):
+    help = ('Measures embedding throughput and latency for combinations of worker processes and '
+            'torch threads per worker, to pick WEB_CONCURRENCY and FACE_TORCH_THREADS')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, action='append', help='Worker counts to try (default: 1, 2, 4, ...)')
+        parser.add_argument('--threads', type=int, action='append', help='Threads per worker to try (default: 1, 2, 4, ...)')
+        parser.add_argument('--cores', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--oversubscribe', action='store_true',
+                            help='Also run combinations where workers x threads exceeds --cores')
+        parser.add_argument('--batch-size', type=int, default=1, help='Faces per call (1 = one check-in)')
+        parser.add_argument('--seconds', type=float, default=10.0, help='Measurement time per combination')
+
+    @staticmethod
+    def _powers_of_two(limit):
+        values, value = [], 1
+        while value <= limit:
+            values.append(value)
+            value *= 2
+        return values
+
+    def _run(self, workers, threads, options):
+        # Children get fresh interpreters, so each builds its own thread pools like a real worker
+        context = multiprocessing.get_context('spawn')
+        ready = context.Barrier(workers + 1)
+        start = context.Event()
+        results = context.Queue()
+        processes = [
+            context.Process(target=_worker, args=(threads, options['batch_size'], options['seconds'], ready, start, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        ready.wait()
+        start.set()
+        latencies = np.concatenate([results.get() for _ in processes])
+        for process in processes:
+            process.join()
+        return latencies
+
+    def handle(self, *args, **options):
+        cores = options['cores']
+        worker_counts = options['workers'] or self._powers_of_two(cores)
+        thread_counts = options['threads'] or self._powers_of_two(cores)
+
+        self.stdout.write(f"{cores} cores, batch of {options['batch_size']}, {options['seconds']}s per combination")
+        self.stdout.write(f"{'workers':>7} {'threads':>7} {'faces/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        best = None
+        for workers in worker_counts:
+            for threads in thread_counts:
+                if workers * threads > cores and not options['oversubscribe']:
+                    continue
+                latencies = self._run(workers, threads, options)
+                throughput = len(latencies) * options['batch_size'] / options['seconds']
+                p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+                self.stdout.write(f'{workers:>7} {threads:>7} {throughput:>9.1f} {p50:>8.1f} {p99:>8.1f}')
+                if best is None or throughput > best[0]:
+                    best = (throughput, workers, threads, p99)
+        if best:
+            self.stdout.write(self.style.SUCCESS(
+                f'Highest throughput: WEB_CONCURRENCY={best[1]} FACE_TORCH_THREADS={best[2]} '
+                f'({best[0]:.1f} faces/s, p99 {best[3]:.1f} ms)'
+            ))
@@ -0,0 +1,75 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from face_engine.search import SEARCH_BACKENDS, ExactIndex, create_index
+
+
+class Command(BaseCommand):
+    help = 'Measures recall@1 and latency of the face search backends against exact search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=50000, help='Gallery size (synthetic data)')
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--dim', type=int, default=512)
+        parser.add_argument('--noise', type=float, default=0.5,
+                            help='Std-dev of the probe perturbation relative to a unit embedding')
+        parser.add_argument('--members', action='store_true',
+                            help='Use the stored Member embeddings instead of synthetic data')
+        parser.add_argument('--backend', action='append', choices=sorted(SEARCH_BACKENDS),
+                            help='Backend(s) to measure (default: all)')
+        parser.add_argument('--nprobe', type=int, action='append', help='IVF nprobe values to sweep')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _gallery(self, options, rng):
+        if options['members']:
+            from gymnast.gallery import face_gallery
+            face_gallery.load()
+            matrix, _ = face_gallery.templates()
+            return matrix
+        gallery = rng.standard_normal((options['size'], options['dim'])).astype(np.float32)
+        return gallery / np.linalg.norm(gallery, axis=1, keepdims=True)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        gallery = self._gallery(options, rng)
+        if not len(gallery):
+            self.stdout.write(self.style.ERROR('Gallery is empty'))
+            return
+
+        # Probes are noisy re-captures of enrolled faces
+        targets = rng.choice(len(gallery), options['queries'])
+        noise = rng.standard_normal((len(targets), gallery.shape[1])).astype(np.float32)
+        probes = gallery[targets] + noise * (options['noise'] / np.sqrt(gallery.shape[1]))
+        probes /= np.linalg.norm(probes, axis=1, keepdims=True)
+
+        reference, _ = ExactIndex().build(gallery).search(probes, k=1)
+        self.stdout.write(f"Gallery {gallery.shape[0]}x{gallery.shape[1]}, {len(probes)} probes")
+
+        runs = []
+        for backend in options['backend'] or sorted(SEARCH_BACKENDS):
+            if backend == 'ivf':
+                for nprobe in options['nprobe'] or [1, 4, 8, 16, 32]:
+                    runs.append((f'ivf nprobe={nprobe}', create_index('ivf', nprobe=nprobe)))
+            else:
+                runs.append((backend, create_index(backend)))
+
+        for label, index in runs:
+            started = time.perf_counter()
+            index.build(gallery)
+            build_seconds = time.perf_counter() - started
+
+            latencies = []
+            found = np.empty(len(probes), dtype=np.int64)
+            for i, probe in enumerate(probes):
+                started = time.perf_counter()
+                rows, _ = index.search(probe, k=1)
+                latencies.append(time.perf_counter() - started)
+                found[i] = rows[0, 0]
+            latencies = np.array(latencies) * 1000
+            recall = float(np.mean(found == reference[:, 0]))
+            self.stdout.write(
+                f"{label:<16} recall@1={recall:.3f}  build={build_seconds:.2f}s  "
+                f"p50={np.percentile(latencies, 50):.3f}ms  p95={np.percentile(latencies, 95):.3f}ms"
+            )
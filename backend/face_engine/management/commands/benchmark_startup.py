@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from face_engine.importtime import STARTUP_CODE, heavy_imports, measure_startup
+
+
+class Command(BaseCommand):
+    help = ('Measures Django startup (setup + URLconf) with `python -X importtime` and fails if the '
+            'face stack (torch, cv2, ...) is imported eagerly')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Slowest top-level imports to list')
+        parser.add_argument('--runs', type=int, default=3, help='Startups to measure; the fastest is reported')
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Fail when the fastest startup takes longer than this')
+        parser.add_argument('--code', default=STARTUP_CODE, help='Python code to time instead of the default startup')
+
+    def handle(self, *args, **options):
+        runs = [measure_startup(options['code']) for _ in range(max(1, options['runs']))]
+        seconds, records = min(runs, key=lambda run: run[0])
+        total_us = sum(record.cumulative_us for record in records if record.depth == 0)
+
+        self.stdout.write(f'Startup: {seconds * 1000:.0f} ms wall, {total_us / 1000:.0f} ms in imports '
+                          f'({len(records)} modules)')
+        self.stdout.write(f"{'cumulative ms':>14} {'self ms':>8}  module")
+        top_level = sorted((r for r in records if r.depth == 0), key=lambda r: r.cumulative_us, reverse=True)
+        for record in top_level[:options['top']]:
+            self.stdout.write(f'{record.cumulative_us / 1000:>14.1f} {record.self_us / 1000:>8.1f}  {record.module}')
+
+        heavy = heavy_imports(records)
+        if heavy:
+            listed = ', '.join(f'{module} ({us / 1000:.0f} ms)' for module, us in heavy.items())
+            raise CommandError(f'Heavy modules imported at startup: {listed}')
+        if options['budget_ms'] is not None and seconds * 1000 > options['budget_ms']:
+            raise CommandError(f"Startup took {seconds * 1000:.0f} ms, budget is {options['budget_ms']:.0f} ms")
+        self.stdout.write(self.style.SUCCESS('No ML modules imported at startup'))
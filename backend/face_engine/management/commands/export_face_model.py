@@ -0,0 +1,60 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from face_engine.backends import (
+    DEFAULT_MODEL_FILES, FACE_SIZE, TorchBackend, default_model_path, export_onnx, export_torchscript,
+    load_backend, load_eager_resnet, parity,
+)
+
+
+class Command(BaseCommand):
+    help = 'Exports InceptionResnetV1 for the torchscript / onnx embedding backends and checks it against eager mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(DEFAULT_MODEL_FILES), default='onnx')
+        parser.add_argument('--output', default=None,
+                            help='Model file (default: settings.FACE_EMBEDDING_MODEL_PATH or face_models/)')
+        parser.add_argument('--quantize', action='store_true', help='Export int8 dynamically quantized weights')
+        parser.add_argument('--batch-size', type=int, default=8, help='Batch used for the parity / speed check')
+        parser.add_argument('--runs', type=int, default=10)
+
+    def _time(self, backend, batch, runs):
+        backend(batch)  # First call pays for lazy initialisation
+        started = time.perf_counter()
+        for _ in range(runs):
+            backend(batch)
+        return (time.perf_counter() - started) / runs
+
+    def handle(self, *args, **options):
+        fmt = options['format']
+        path = options['output'] or default_model_path(fmt)
+        resnet = load_eager_resnet('cpu')
+
+        export = export_onnx if fmt == 'onnx' else export_torchscript
+        try:
+            export(resnet, path, quantized=options['quantize'])
+        except ImportError as e:
+            raise CommandError(f'Exporting to {fmt} needs {e.name}.')
+        self.stdout.write(f'Wrote {path}')
+
+        # Same weights, same random faces: the exported model must reproduce eager embeddings
+        eager = TorchBackend(resnet, 'eager')
+        exported = load_backend(fmt, device='cpu', path=path)
+        batch = np.random.default_rng(0).random((options['batch_size'], 3, FACE_SIZE, FACE_SIZE), dtype=np.float32)
+        min_cosine, max_diff = parity(eager, exported, batch)
+        eager_seconds = self._time(eager, batch, options['runs'])
+        exported_seconds = self._time(exported, batch, options['runs'])
+
+        self.stdout.write(f'min cosine similarity to eager: {min_cosine:.6f}   max abs diff: {max_diff:.2e}')
+        self.stdout.write(
+            f"{'eager':<12} {eager_seconds * 1000:8.1f} ms/batch\n"
+            f"{fmt:<12} {exported_seconds * 1000:8.1f} ms/batch   x{eager_seconds / exported_seconds:.2f}"
+        )
+        # Matching accepts >= 0.82 cosine; anything below 0.99 here would move members across that line
+        if min_cosine < 0.99:
+            raise CommandError('Exported model diverges from eager mode; do not deploy it.')
+        self.stdout.write(self.style.SUCCESS(
+            f"Set FACE_EMBEDDING_BACKEND='{fmt}' (and FACE_EMBEDDING_MODEL_PATH if not the default) to use it."
+        ))
@@ -0,0 +1,37 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from face_engine.registry import face_models
+from face_engine.server import InferenceServer
+
+
+class Command(BaseCommand):
+    help = 'Runs the shared face inference server that owns the MTCNN / InceptionResnetV1 models'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=None,
+                            help='Unix socket path (default: settings.FACE_INFERENCE_SOCKET)')
+        parser.add_argument('--window-ms', type=float, default=None,
+                            help='How long to keep collecting requests once several are waiting')
+        parser.add_argument('--max-batch', type=int, default=None, help='Largest batch per forward pass')
+
+    def handle(self, *args, **options):
+        address = options['socket'] or getattr(settings, 'FACE_INFERENCE_SOCKET', '')
+        if not address:
+            raise CommandError('Set FACE_INFERENCE_SOCKET or pass --socket.')
+
+        window = options['window_ms'] / 1000.0 if options['window_ms'] is not None else None
+        server = InferenceServer(address, window=window, max_size=options['max_batch'])
+        stats = face_models.warmup()
+        self.stdout.write(f"Models loaded in {stats['load_seconds']}s on {stats['device']}")
+
+        # Turn SIGTERM into KeyboardInterrupt so the blocking accept() returns
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self.stdout.write(self.style.SUCCESS(f'Face inference server listening on {address}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.close()
+        self.stdout.write(self.style.SUCCESS('Face inference server stopped'))
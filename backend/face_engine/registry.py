@@ -0,0 +1,102 @@
+import logging
+import os
+import resource
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _rss_bytes():
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ModelRegistry:
+    """
+    Lazily built, process-wide MTCNN detector + embedding backend.
+
+    DRF instantiates a view per request, so models must not live on the view.
+    Every face endpoint and the camera pipeline call face_models.get() instead,
+    which loads the weights once per worker (thread-safe) and records how long
+    that took and how much memory it cost in `stats`. The embedding network runs
+    on settings.FACE_EMBEDDING_BACKEND (see face_engine/backends.py).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._mtcnn = None
+        self._embedder = None
+        self.stats = {}
+
+    @property
+    def loaded(self):
+        return self._embedder is not None
+
+    def _load(self):
+        from facenet_pytorch import MTCNN
+
+        from .backends import load_backend
+        from .limits import configure_torch_threads
+
+        device = getattr(settings, 'FACE_DEVICE', 'cpu')
+        threads, interop_threads = configure_torch_threads()
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+
+        mtcnn = MTCNN(keep_all=True, device=device)
+        embedder = load_backend(device=device)
+
+        load_seconds = time.perf_counter() - started
+        param_bytes = embedder.parameter_bytes() + sum(
+            p.numel() * p.element_size() for p in mtcnn.parameters()
+        )
+        self.stats = {
+            'device': str(device),
+            'backend': embedder.name,
+            'threads': threads,
+            'interop_threads': interop_threads,
+            'load_seconds': round(load_seconds, 3),
+            'param_bytes': param_bytes,
+            'rss_delta_bytes': _rss_bytes() - rss_before,
+            'pid': os.getpid(),
+        }
+        logger.info(
+            "Loaded face models (%s) on %s in %.2fs (params %.1f MB, RSS +%.1f MB)",
+            embedder.name, device, load_seconds, param_bytes / 2**20, self.stats['rss_delta_bytes'] / 2**20,
+        )
+        self._mtcnn, self._embedder = mtcnn, embedder
+
+    def get(self):
+        """Return (mtcnn, embedder), loading them on first use."""
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    self._load()
+        return self._mtcnn, self._embedder
+
+    @property
+    def mtcnn(self):
+        return self.get()[0]
+
+    @property
+    def embedder(self):
+        return self.get()[1]
+
+    def warmup(self):
+        """Load the weights and run one dummy forward pass so the first request is not slow."""
+        _, embedder = self.get()
+        started = time.perf_counter()
+        embedder(np.zeros((1, 3, 160, 160), dtype=np.float32))
+        self.stats['warmup_seconds'] = round(time.perf_counter() - started, 3)
+        return self.stats
+
+
+face_models = ModelRegistry()
@@ -0,0 +1,243 @@
+"""
+Nearest-neighbour search over face embeddings.
+
+Every backend exposes the same two calls:
+
+    index = create_index().build(matrix)           # (n, d) float32
+    rows, distances = index.search(queries, k=1)   # (q, k) each
+
+`rows` index into the matrix that was passed to build(); -1 / inf mark
+"no candidate found". ExactIndex is the default and the reference the
+approximate backends are measured against (manage.py benchmark_face_search).
+"""
+import numpy as np
+from django.conf import settings
+
+
+def _as_matrix(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    return np.ascontiguousarray(matrix)
+
+
+def _squared_distances(queries, vectors, vector_norms=None):
+    """(q, n) squared Euclidean distances via one matrix product."""
+    if vector_norms is None:
+        vector_norms = np.einsum('ij,ij->i', vectors, vectors)
+    query_norms = np.einsum('ij,ij->i', queries, queries)
+    distances = query_norms[:, None] - 2.0 * (queries @ vectors.T) + vector_norms[None, :]
+    return np.maximum(distances, 0.0, out=distances)
+
+
+def _top_k(distances, k):
+    """Row-wise k smallest (indices, distances), sorted ascending."""
+    k = min(k, distances.shape[1])
+    if k < distances.shape[1]:
+        part = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+    part_distances = np.take_along_axis(distances, part, axis=1)
+    order = np.argsort(part_distances, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_distances, order, axis=1)
+
+
+def _empty_result(n_queries, k):
+    return np.full((n_queries, k), -1, dtype=np.int64), np.full((n_queries, k), np.inf, dtype=np.float32)
+
+
+class ExactIndex:
+    """Brute-force search over every vector."""
+
+    name = 'exact'
+
+    def __init__(self, **options):
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def build(self, matrix):
+        self._vectors = _as_matrix(matrix)
+        self._norms = np.einsum('ij,ij->i', self._vectors, self._vectors)
+        return self
+
+    def search(self, queries, k=1):
+        queries = _as_matrix(queries)
+        if not len(self._vectors):
+            return _empty_result(len(queries), k)
+        rows, distances = _top_k(_squared_distances(queries, self._vectors, self._norms), k)
+        return _pad(rows, np.sqrt(distances), k)
+
+
+class IVFIndex:
+    """
+    Inverted-file index with a k-means coarse quantizer.
+
+    Vectors are grouped into `nlist` cells; a query is compared only with the
+    vectors of its `nprobe` closest cells. Raising nprobe trades latency for
+    recall (nprobe == nlist is exact search).
+    """
+
+    name = 'ivf'
+
+    def __init__(self, nlist=None, nprobe=8, iterations=10, train_size=256, seed=0, **options):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.train_size = train_size  # training points per cell
+        self.seed = seed
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def _train(self, matrix, nlist):
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(matrix), nlist * self.train_size)
+        sample = matrix[rng.choice(len(matrix), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignment = np.argmin(_squared_distances(sample, centroids), axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return centroids
+
+    def build(self, matrix):
+        matrix = _as_matrix(matrix)
+        n = len(matrix)
+        if n == 0:
+            self._vectors = matrix
+            return self
+        nlist = min(self.nlist or max(1, int(np.sqrt(n))), n)
+        self._centroids = self._train(matrix, nlist)
+        assignment = np.argmin(_squared_distances(matrix, self._centroids), axis=1)
+
+        # Store the vectors grouped by cell so each probe is one contiguous slice
+        self._rows = np.argsort(assignment, kind='stable')
+        self._vectors = np.ascontiguousarray(matrix[self._rows])
+        self._norms = np.einsum('ij,ij->i', self._vectors, self._vectors)
+        self._offsets = np.searchsorted(assignment[self._rows], np.arange(nlist + 1))
+        return self
+
+    def search(self, queries, k=1):
+        queries = _as_matrix(queries)
+        if not len(self._vectors):
+            return _empty_result(len(queries), k)
+        nprobe = min(self.nprobe, len(self._centroids))
+        cells, _ = _top_k(_squared_distances(queries, self._centroids), nprobe)
+
+        rows, distances = _empty_result(len(queries), k)
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([
+                np.arange(self._offsets[c], self._offsets[c + 1]) for c in cells[i]
+            ])
+            if not len(candidates):
+                continue
+            local, local_distances = _top_k(
+                _squared_distances(query[None, :], self._vectors[candidates], self._norms[candidates]), k
+            )
+            found = local.shape[1]
+            rows[i, :found] = self._rows[candidates[local[0]]]
+            distances[i, :found] = np.sqrt(local_distances[0])
+        return rows, distances
+
+
+class LSHIndex:
+    """
+    Random-hyperplane LSH for L2-normalized embeddings.
+
+    Each of `n_tables` tables hashes a vector to `n_bits` sign bits; candidates
+    are the union of the query's buckets, re-ranked exactly. More tables or
+    fewer bits raise recall at the cost of larger candidate sets.
+    """
+
+    name = 'lsh'
+
+    def __init__(self, n_bits=10, n_tables=16, seed=0, **options):
+        self.n_bits = n_bits
+        self.n_tables = n_tables
+        self.seed = seed
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def _codes(self, matrix):
+        # (tables, n) integer bucket codes
+        bits = (np.einsum('tbd,nd->tnb', self._planes, matrix) > 0).astype(np.int64)
+        return bits @ self._weights
+
+    def build(self, matrix):
+        matrix = _as_matrix(matrix)
+        self._vectors = matrix
+        if not len(matrix):
+            return self
+        rng = np.random.default_rng(self.seed)
+        self._planes = rng.standard_normal((self.n_tables, self.n_bits, matrix.shape[1])).astype(np.float32)
+        self._weights = 1 << np.arange(self.n_bits, dtype=np.int64)
+        self._norms = np.einsum('ij,ij->i', matrix, matrix)
+
+        # Per table: rows sorted by code, plus the sorted codes for binary search
+        codes = self._codes(matrix)
+        self._table_rows = np.argsort(codes, axis=1, kind='stable')
+        self._table_codes = np.take_along_axis(codes, self._table_rows, axis=1)
+        return self
+
+    def search(self, queries, k=1):
+        queries = _as_matrix(queries)
+        if not len(self._vectors):
+            return _empty_result(len(queries), k)
+        query_codes = self._codes(queries)
+
+        rows, distances = _empty_result(len(queries), k)
+        for i in range(len(queries)):
+            buckets = []
+            for t in range(self.n_tables):
+                code = query_codes[t, i]
+                lo = np.searchsorted(self._table_codes[t], code, side='left')
+                hi = np.searchsorted(self._table_codes[t], code, side='right')
+                buckets.append(self._table_rows[t, lo:hi])
+            candidates = np.unique(np.concatenate(buckets))
+            if not len(candidates):
+                continue
+            local, local_distances = _top_k(
+                _squared_distances(queries[i:i + 1], self._vectors[candidates], self._norms[candidates]), k
+            )
+            found = local.shape[1]
+            rows[i, :found] = candidates[local[0]]
+            distances[i, :found] = np.sqrt(local_distances[0])
+        return rows, distances
+
+
+def _pad(rows, distances, k):
+    """Pad results to k columns when fewer than k vectors are indexed."""
+    if rows.shape[1] == k:
+        return rows, distances.astype(np.float32)
+    padded_rows, padded_distances = _empty_result(len(rows), k)
+    padded_rows[:, :rows.shape[1]] = rows
+    padded_distances[:, :rows.shape[1]] = distances
+    return padded_rows, padded_distances
+
+
+SEARCH_BACKENDS = {
+    ExactIndex.name: ExactIndex,
+    IVFIndex.name: IVFIndex,
+    LSHIndex.name: LSHIndex,
+}
+
+
+def create_index(backend=None, **options):
+    """Instantiate the configured backend (settings.FACE_SEARCH_BACKEND / FACE_SEARCH_OPTIONS)."""
+    backend = backend or getattr(settings, 'FACE_SEARCH_BACKEND', 'exact')
+    try:
+        index_class = SEARCH_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown face search backend '{backend}', expected one of {sorted(SEARCH_BACKENDS)}")
+    if backend == getattr(settings, 'FACE_SEARCH_BACKEND', 'exact'):
+        options = {**getattr(settings, 'FACE_SEARCH_OPTIONS', {}), **options}
+    return index_class(**options)
@@ -0,0 +1,182 @@
+"""
+Shared face inference server.
+
+`manage.py run_face_server` loads MTCNN + InceptionResnetV1 once and serves
+every web worker and the camera recognizer over a local Unix socket. Requests
+of the same kind from all clients are coalesced by a MicroBatcher, so
+concurrent check-ins share one forward pass.
+
+Set FACE_INFERENCE_SOCKET to route face_engine.embedding through the server;
+the web workers then never import torch.
+"""
+import hashlib
+import logging
+import os
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from django.conf import settings
+
+from .batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceUnavailable(RuntimeError):
+    """The inference server could not be reached or did not answer in time."""
+
+
+def _authkey():
+    # Both ends share SECRET_KEY; the socket only accepts clients of this deployment
+    return hashlib.sha256(f'face_engine:{settings.SECRET_KEY}'.encode()).digest()
+
+
+def _batch_options():
+    return {
+        'window': getattr(settings, 'FACE_BATCH_WINDOW_MS', 10) / 1000.0,
+        'max_size': getattr(settings, 'FACE_BATCH_MAX_SIZE', 8),
+        'timeout': getattr(settings, 'FACE_INFERENCE_TIMEOUT', 10.0),
+    }
+
+
+class InferenceServer:
+    """Accepts client connections and feeds their requests to one batcher per operation."""
+
+    def __init__(self, address=None, window=None, max_size=None):
+        from .embedding import detect_and_embed_batch, detect_faces_batch, embed_faces_batch
+
+        self.address = address or settings.FACE_INFERENCE_SOCKET
+        options = _batch_options()
+        if window is not None:
+            options['window'] = window
+        if max_size is not None:
+            options['max_size'] = max_size
+        self.batchers = {
+            'detect': MicroBatcher(detect_faces_batch, name='batch-detect', **options),
+            'embed': MicroBatcher(embed_faces_batch, name='batch-embed', **options),
+            'detect_and_embed': MicroBatcher(
+                lambda images: [(d.boxes, d.probs, d.embeddings) for d in detect_and_embed_batch(images)],
+                name='batch-detect-embed', **options,
+            ),
+        }
+        self._listener = None
+        self._closed = threading.Event()
+
+    def stats(self):
+        from .registry import face_models
+
+        return {
+            'models': face_models.stats,
+            'batchers': {op: dict(batcher.stats) for op, batcher in self.batchers.items()},
+        }
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)  # Stale socket of a previous run
+        self._listener = Listener(self.address, family='AF_UNIX', authkey=_authkey())
+        os.chmod(self.address, 0o600)
+        logger.info("Face inference server listening on %s", self.address)
+        try:
+            while not self._closed.is_set():
+                try:
+                    conn = self._listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    if self._closed.is_set():
+                        break
+                    logger.warning("Rejected inference client: %s", e)
+                    continue
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        self._closed.set()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        for batcher in self.batchers.values():
+            batcher.close()
+
+    def _serve_client(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                # Looked up apart from the call: a KeyError raised inside a batch is not an unknown operation
+                batcher = self.batchers.get('detect_and_embed' if op == 'detect_and_embed_many' else op)
+                try:
+                    if op == 'stats':
+                        reply = ('ok', self.stats())
+                    elif batcher is None:
+                        reply = ('error', f'Unknown operation {op!r}')
+                    elif op == 'detect_and_embed_many':
+                        futures = [batcher.submit(image) for image in payload]
+                        reply = ('ok', [batcher.result(future) for future in futures])
+                    else:
+                        reply = ('ok', batcher(payload))
+                except Exception as e:
+                    reply = ('error', str(e))
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+
+class InferenceClient:
+    """
+    Per-thread connection to the inference server.
+
+    Each thread keeps its own connection, so concurrent requests of one
+    worker are sent in parallel and can land in the same server batch.
+    """
+
+    def __init__(self, address=None, timeout=None):
+        self._address = address
+        self._timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def address(self):
+        return self._address or getattr(settings, 'FACE_INFERENCE_SOCKET', '')
+
+    @property
+    def timeout(self):
+        return self._timeout or getattr(settings, 'FACE_INFERENCE_TIMEOUT', 10.0)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = Client(self.address, family='AF_UNIX', authkey=_authkey())
+            self._local.conn = conn
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def call(self, op, payload=None):
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send((op, payload))
+                if not conn.poll(self.timeout):
+                    # The late answer would be read by the next call; start over on a fresh connection
+                    self._drop()
+                    raise InferenceUnavailable(f'Inference server did not answer within {self.timeout}s')
+                status, result = conn.recv()
+                break
+            except (OSError, EOFError) as e:
+                self._drop()
+                if attempt:
+                    raise InferenceUnavailable(f'Inference server unavailable at {self.address}: {e}')
+        if status != 'ok':
+            raise RuntimeError(result)
+        return result
+
+
+inference_client = InferenceClient()
@@ -0,0 +1,416 @@
+import base64
+import importlib.util
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+from multiprocessing import AuthenticationError
+
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, override_settings
+
+from .backends import FACE_SIZE, TorchBackend, export_onnx, export_torchscript, load_backend, parity
+from .batching import BatchTimeout, MicroBatcher
+from .embedding import FaceDetections, detect_faces_batch, downscale_for_detection
+from .fields import EmbeddingField
+from .importtime import heavy_imports, measure_startup
+from .limits import InferenceBusy, InferenceLimiter
+from .search import ExactIndex, IVFIndex, LSHIndex, create_index
+from .server import InferenceClient, InferenceServer, InferenceUnavailable
+
+HAS_FACENET = all(importlib.util.find_spec(m) for m in ('torch', 'facenet_pytorch'))
+HAS_TORCH = importlib.util.find_spec('torch') is not None
+HAS_ONNXRUNTIME = importlib.util.find_spec('onnxruntime') is not None
+
+
+@unittest.skipUnless(HAS_FACENET, 'torch / facenet_pytorch not installed')
+class EmbeddingBackendParityTests(SimpleTestCase):
+    """Every embedding backend must reproduce eager-mode embeddings for the same weights."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import torch
+        from facenet_pytorch import InceptionResnetV1
+
+        torch.manual_seed(0)
+        # Random weights: parity is about the conversion, and the vggface2 download is not needed
+        cls.resnet = InceptionResnetV1(pretrained=None).eval()
+        cls.eager = TorchBackend(cls.resnet, 'eager')
+        cls.batch = np.random.default_rng(0).random((4, 3, FACE_SIZE, FACE_SIZE), dtype=np.float32)
+        cls.tmp = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def assertParity(self, backend, min_cosine, max_diff=None):
+        cosine, diff = parity(self.eager, backend, self.batch)
+        self.assertGreaterEqual(cosine, min_cosine)
+        if max_diff is not None:
+            self.assertLessEqual(diff, max_diff)
+
+    def test_outputs_are_unit_embeddings(self):
+        embeddings = self.eager(self.batch)
+        self.assertEqual(embeddings.shape, (4, 512))
+        np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-5)
+
+    def test_torchscript(self):
+        path = export_torchscript(self.resnet, os.path.join(self.tmp.name, 'resnet.pt'))
+        self.assertParity(load_backend('torchscript', device='cpu', path=path), 0.99999, 1e-4)
+
+    def test_quantized(self):
+        self.assertParity(load_backend('quantized', device='cpu', resnet=self.resnet), 0.99)
+
+    def test_quantized_torchscript(self):
+        path = export_torchscript(self.resnet, os.path.join(self.tmp.name, 'resnet-int8.pt'), quantized=True)
+        self.assertParity(load_backend('torchscript', device='cpu', path=path), 0.99)
+
+    @unittest.skipUnless(HAS_ONNXRUNTIME, 'onnxruntime not installed')
+    def test_onnx(self):
+        path = export_onnx(self.resnet, os.path.join(self.tmp.name, 'resnet.onnx'))
+        backend = load_backend('onnx', device='cpu', path=path)
+        self.assertParity(backend, 0.99999, 1e-4)
+        # Dynamic batch axis: a different batch size than the export example
+        self.assertEqual(backend(self.batch[:1]).shape, (1, 512))
+
+    @unittest.skipUnless(HAS_ONNXRUNTIME, 'onnxruntime not installed')
+    def test_onnx_quantized(self):
+        path = export_onnx(self.resnet, os.path.join(self.tmp.name, 'resnet-int8.onnx'), quantized=True)
+        self.assertParity(load_backend('onnx', device='cpu', path=path), 0.99)
+
+
+class DetectionDownscaleTests(SimpleTestCase):
+    """MTCNN sees frames shrunk to FACE_DETECT_MAX_SIDE; its boxes come back at full resolution."""
+
+    def test_small_images_are_left_alone(self):
+        image = np.zeros((360, 640, 3), dtype=np.uint8)
+        for max_side in (0, 640, 1000):
+            scaled, scale = downscale_for_detection(image, max_side)
+            self.assertIs(scaled, image)
+            self.assertEqual(scale, 1.0)
+
+    def test_longest_side_is_capped(self):
+        for shape, expected in (((720, 1280, 3), (360, 640, 3)), ((1920, 1080, 3), (640, 360, 3))):
+            scaled, scale = downscale_for_detection(np.zeros(shape, dtype=np.uint8), 640)
+            self.assertEqual(scaled.shape, expected)
+            self.assertAlmostEqual(scale, 640 / max(shape))
+
+    @unittest.skipUnless(HAS_TORCH, 'torch not installed')
+    def test_boxes_are_mapped_back_to_full_resolution(self):
+        def detect(batch):
+            # A face in every frame of the 640x360 group, none in the small one
+            if batch.shape[1:3] == (360, 640):
+                return [np.array([[10, 20, 110, 220]])] * len(batch), [np.array([0.99])] * len(batch)
+            return [None] * len(batch), [None] * len(batch)
+
+        images = [np.zeros(shape, dtype=np.uint8) for shape in ((720, 1280, 3), (360, 640, 3), (100, 200, 3))]
+        with mock.patch('face_engine.embedding.face_models') as models:
+            models.mtcnn.detect.side_effect = detect
+            results = detect_faces_batch(images, max_side=640)
+        self.assertEqual(models.mtcnn.detect.call_count, 2)  # The downscaled 720p frame shares a batch with the 360p one
+        np.testing.assert_allclose(results[0][0], [[20, 40, 220, 440]])
+        np.testing.assert_allclose(results[1][0], [[10, 20, 110, 220]])
+        self.assertEqual(results[2][0].shape, (0, 4))
+
+
+def fake_detect(images):
+    # One face covering each image; an empty image stands in for a bug inside the batch
+    if any(image.size == 0 for image in images):
+        raise KeyError('boxes')
+    return [(np.array([[0, 0, image.shape[1], image.shape[0]]], dtype=np.float32), np.array([0.9], dtype=np.float32))
+            for image in images]
+
+
+def fake_embed(items):
+    return [(np.full((len(boxes), 512), image.mean(), dtype=np.float32), np.arange(len(boxes)))
+            for image, boxes in items]
+
+
+def fake_detect_and_embed(images):
+    return [FaceDetections(boxes, probs, fake_embed([(image, boxes)])[0][0])
+            for image, (boxes, probs) in zip(images, fake_detect(images))]
+
+
+class InferenceServerTests(SimpleTestCase):
+    """Clients reach the batched models through the Unix socket of `manage.py run_face_server`."""
+
+    def setUp(self):
+        self.enterContext(mock.patch('face_engine.embedding.detect_faces_batch', fake_detect))
+        self.enterContext(mock.patch('face_engine.embedding.embed_faces_batch', fake_embed))
+        self.enterContext(mock.patch('face_engine.embedding.detect_and_embed_batch', fake_detect_and_embed))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.address = os.path.join(tmp.name, 'inference.sock')
+        self.server = InferenceServer(self.address, window=0.001)
+        self.addCleanup(self.server.close)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        deadline = time.monotonic() + 5
+        while not os.path.exists(self.address) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.client = InferenceClient(self.address, timeout=5)
+        self.image = np.full((20, 30, 3), 7, dtype=np.uint8)
+
+    def test_operations_round_trip(self):
+        boxes, probs = self.client.call('detect', self.image)
+        np.testing.assert_array_equal(boxes, [[0, 0, 30, 20]])
+        embeddings, kept = self.client.call('embed', (self.image, boxes))
+        self.assertEqual((embeddings.shape, kept.tolist()), ((1, 512), [0]))
+        self.assertEqual(embeddings[0, 0], 7)
+        many = self.client.call('detect_and_embed_many', [self.image, self.image * 2])
+        self.assertEqual([embeddings[0, 0] for _, _, embeddings in many], [7, 14])
+        self.assertEqual(self.client.call('stats')['batchers']['detect_and_embed']['items'], 2)
+
+    def test_errors_are_reported_to_the_client(self):
+        with self.assertRaisesMessage(RuntimeError, "Unknown operation 'segment'"):
+            self.client.call('segment', self.image)
+        with self.assertRaises(RuntimeError) as cm:
+            self.client.call('detect', np.zeros((0, 0, 3), dtype=np.uint8))
+        self.assertNotIn('Unknown operation', str(cm.exception))
+        self.client.call('detect', self.image)  # The connection is still usable
+
+    def test_wrong_authkey_is_rejected(self):
+        with self.assertLogs('face_engine.server', 'WARNING'):
+            with override_settings(SECRET_KEY='another deployment'):
+                with self.assertRaises(AuthenticationError):
+                    InferenceClient(self.address).call('detect', self.image)
+            self.client.call('detect', self.image)  # The server keeps accepting this deployment's clients
+
+    def test_stopped_server_is_unavailable(self):
+        self.server.close()
+        with self.assertRaises(InferenceUnavailable):
+            self.client.call('detect', self.image)
+
+
+class InferenceLimiterTests(SimpleTestCase):
+    """At most max_concurrent requests run inference; the rest wait queue_timeout, then get InferenceBusy."""
+
+    def test_rejects_once_every_slot_stays_taken(self):
+        limiter = InferenceLimiter(max_concurrent=2, queue_timeout=0.05, retry_after=7)
+        with limiter.slot(), limiter.slot():
+            self.assertEqual(limiter.stats['in_flight'], 2)
+            started = time.monotonic()
+            with self.assertRaises(InferenceBusy) as cm:
+                with limiter.slot():
+                    self.fail('admitted past max_concurrent')
+            self.assertGreaterEqual(time.monotonic() - started, 0.04)
+        self.assertEqual(cm.exception.retry_after, 7)
+        stats = limiter.stats
+        self.assertEqual((stats['admitted'], stats['rejected'], stats['in_flight'], stats['waiting']), (2, 1, 0, 0))
+        with limiter.slot():  # The slots were given back
+            pass
+
+    def test_slot_is_released_when_inference_fails(self):
+        limiter = InferenceLimiter(max_concurrent=1, queue_timeout=0)
+        with self.assertRaises(ValueError):
+            with limiter.slot():
+                raise ValueError('inference failed')
+        with limiter.slot():
+            self.assertEqual(limiter.stats['in_flight'], 1)
+
+    def test_waiting_request_gets_a_freed_slot(self):
+        limiter = InferenceLimiter(max_concurrent=1, queue_timeout=5)
+        entered, release = threading.Event(), threading.Event()
+
+        def hold():
+            with limiter.slot():
+                entered.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        entered.wait(5)
+        threading.Timer(0.05, release.set).start()
+        with limiter.slot():
+            pass
+        holder.join(5)
+        self.assertEqual((limiter.stats['admitted'], limiter.stats['rejected']), (2, 0))
+        self.assertGreater(limiter.stats['max_wait'], 0)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    """Coalescing of concurrent calls, per-item error isolation and bounded waits."""
+
+    def setUp(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def process(self, items):
+        self.batches.append(list(items))
+        self.started.set()
+        self.release.wait(5)
+        if 'bad' in items:
+            raise ValueError('bad item')
+        return [item.upper() for item in items]
+
+    def batcher(self, **options):
+        batcher = MicroBatcher(self.process, **options)
+        self.addCleanup(batcher.close)
+        self.addCleanup(self.release.set)
+        return batcher
+
+    def hold_first_batch(self, batcher):
+        """Submit one item and keep its batch running until self.release is set."""
+        self.release.clear()
+        future = batcher.submit('first')
+        self.assertTrue(self.started.wait(5))
+        return future
+
+    def test_lone_item_does_not_wait_for_the_window(self):
+        batcher = self.batcher(window=5.0)
+        started = time.monotonic()
+        self.assertEqual(batcher('a'), 'A')
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertEqual(self.batches, [['a']])
+
+    def test_waiting_items_are_coalesced(self):
+        batcher = self.batcher(window=0.05, max_size=4)
+        first = self.hold_first_batch(batcher)
+        futures = [batcher.submit(item) for item in 'bcdef']
+        self.release.set()
+        self.assertEqual([batcher.result(f) for f in [first, *futures]], ['FIRST', 'B', 'C', 'D', 'E', 'F'])
+        self.assertEqual(self.batches, [['first'], ['b', 'c', 'd', 'e'], ['f']])
+        self.assertEqual(batcher.stats['max_batch'], 4)
+
+    def test_bad_item_does_not_fail_its_batch(self):
+        batcher = self.batcher()
+        self.hold_first_batch(batcher)
+        good, bad, other = (batcher.submit(item) for item in ('a', 'bad', 'c'))
+        self.release.set()
+        self.assertEqual((batcher.result(good), batcher.result(other)), ('A', 'C'))
+        with self.assertRaises(ValueError):
+            batcher.result(bad)
+
+    def test_wrong_result_count_fails_instead_of_hanging(self):
+        batcher = MicroBatcher(lambda items: [], timeout=5)
+        self.addCleanup(batcher.close)
+        with self.assertRaises(RuntimeError):
+            batcher('a')
+
+    def test_wait_is_bounded(self):
+        batcher = self.batcher(timeout=0.05)
+        self.hold_first_batch(batcher)
+        with self.assertRaises(BatchTimeout):
+            batcher('late')
+
+    def test_closed_batcher_rejects_items(self):
+        batcher = self.batcher()
+        batcher.close()
+        with self.assertRaises(RuntimeError):
+            batcher.submit('a')
+
+
+class EmbeddingFieldTests(SimpleTestCase):
+    """Embeddings are stored as raw little-endian floats and read back as (normalized) numpy arrays."""
+
+    def round_trip(self, field, value):
+        raw = field.get_prep_value(value)
+        return raw, field.from_db_value(raw, None, None)
+
+    def test_float32_round_trip(self):
+        vector = np.random.default_rng(0).standard_normal(512).astype(np.float32)
+        raw, value = self.round_trip(EmbeddingField(), vector.tolist())
+        self.assertEqual(len(raw), 512 * 4)
+        np.testing.assert_array_equal(value, vector)
+        self.assertFalse(value.flags.writeable)
+
+    def test_float16_halves_the_size(self):
+        raw, value = self.round_trip(EmbeddingField(dtype='float16'), np.full(512, 0.5))
+        self.assertEqual(len(raw), 512 * 2)
+        np.testing.assert_array_equal(value, np.full(512, 0.5, dtype=np.float16))
+
+    def test_templates_are_normalized_row_by_row(self):
+        field = EmbeddingField(dim=4, normalize=True)
+        _, value = self.round_trip(field, [[3, 0, 0, 4], [0, 2, 0, 0], [0, 0, 0, 0]])
+        self.assertEqual(value.shape, (3, 4))
+        np.testing.assert_allclose(value, [[0.6, 0, 0, 0.8], [0, 1, 0, 0], [0, 0, 0, 0]], rtol=1e-6)
+
+    def test_wrong_size_is_rejected(self):
+        with self.assertRaises(ValueError):
+            EmbeddingField(dim=4).get_prep_value([1, 2, 3, 4, 5])
+
+    def test_empty_values_are_null(self):
+        field = EmbeddingField()
+        self.assertIsNone(field.get_prep_value([]))
+        self.assertIsNone(field.get_prep_value(None))
+        self.assertIsNone(field.from_db_value(None, None, None))
+
+    def test_to_python(self):
+        field = EmbeddingField(dim=2)
+        raw = field.get_prep_value([[1, 2], [3, 4]])
+        for value in (raw, base64.b64encode(raw).decode('ascii'), [1, 2, 3, 4]):
+            np.testing.assert_array_equal(field.to_python(value), [[1, 2], [3, 4]])
+        with self.assertRaises(ValidationError):
+            field.to_python(['a', 'b'])
+
+    def test_unknown_dtype(self):
+        with self.assertRaises(ValueError):
+            EmbeddingField(dtype='float64')
+
+
+def unit_rows(matrix):
+    return (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+
+
+class SearchIndexTests(SimpleTestCase):
+    """Approximate backends must find (nearly) the same nearest neighbours as ExactIndex."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(0)
+        cls.gallery = unit_rows(rng.standard_normal((2000, 512)))
+        # Fresh shots of the first 200 people: cosine ~0.8 to their template, like a real match
+        cls.queries = unit_rows(cls.gallery[:200] + 0.03 * rng.standard_normal((200, 512)))
+        cls.exact_rows, cls.exact_distances = ExactIndex().build(cls.gallery).search(cls.queries, k=3)
+
+    def recall(self, index):
+        rows, distances = index.build(self.gallery).search(self.queries, k=1)
+        found = rows[:, 0] == self.exact_rows[:, 0]
+        # Where the neighbour agrees, so must the distance
+        np.testing.assert_allclose(distances[found, 0], self.exact_distances[found, 0], rtol=1e-4)
+        return found.mean()
+
+    def test_exact_finds_the_true_neighbours(self):
+        np.testing.assert_array_equal(self.exact_rows[:, 0], np.arange(200))
+        self.assertTrue(np.all(np.diff(self.exact_distances, axis=1) >= 0))
+
+    def test_ivf_recall(self):
+        self.assertGreaterEqual(self.recall(IVFIndex(nprobe=8)), 0.95)
+
+    def test_ivf_probing_every_cell_is_exact(self):
+        self.assertEqual(self.recall(IVFIndex(nlist=16, nprobe=16)), 1.0)
+
+    def test_lsh_recall(self):
+        self.assertGreaterEqual(self.recall(LSHIndex()), 0.8)
+
+    def test_results_are_padded_past_the_gallery_size(self):
+        for index in (ExactIndex(), IVFIndex(), LSHIndex()):
+            rows, distances = index.build(self.gallery[:2]).search(self.gallery[:1], k=4)
+            self.assertEqual(rows.shape, (1, 4))
+            self.assertEqual(rows[0, 0], 0)
+            self.assertTrue(np.all(rows[0, 2:] == -1) and np.all(np.isinf(distances[0, 2:])), index.name)
+
+    def test_empty_index(self):
+        rows, distances = create_index('ivf').build(np.zeros((0, 512), dtype=np.float32)).search(self.queries[:2])
+        self.assertTrue(np.all(rows == -1) and np.all(np.isinf(distances)))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_index('hnsw')
+
+
+class StartupImportTests(SimpleTestCase):
+    """Booting Django and loading every view must not drag in the ML stack."""
+
+    def test_startup_does_not_import_ml_stack(self):
+        _, records = measure_startup()
+        self.assertTrue(records)
+        self.assertEqual(heavy_imports(records), {})
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GymnastConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "gymnast"
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the face gallery receivers)
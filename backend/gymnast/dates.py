@@ -0,0 +1,18 @@
+import datetime
+
+from django.utils import timezone
+
+
+def day_bounds(day, days=1):
+    """
+    [start, end) datetimes covering `days` calendar days from `day` in the
+    current time zone.
+
+    Filter with `timestamp__gte=start, timestamp__lt=end` rather than
+    `timestamp__date=day`: the lookup wraps the column in a date conversion,
+    so no index on it can be used, while the range is a plain index range scan.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min), tz)
+    end = timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=days), datetime.time.min), tz)
+    return start, end
@@ -0,0 +1,194 @@
+"""
+Bulk face enrolment shared by BulkFaceEnrolmentView and `manage.py enroll_faces`.
+
+Images are named after the member they belong to: `<member_id>.jpg`,
+`<member_id>_<anything>.jpg` or `<member_id>/<anything>.jpg`. They are
+decoded on a thread pool (cv2.imdecode releases the GIL), embedded in
+batches, and every member is written once with bulk_update at the end.
+"""
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from face_engine.embedding import detect_and_embed_many
+from face_engine.images import decode_image, upload_buffer
+from . import snapshot
+from .gallery import append_template, face_gallery
+from .models import Member
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+
+
+class EnrolmentError(ValueError):
+    pass
+
+
+def member_id_from_name(name):
+    """Member id encoded in an upload / archive path, see the module docstring."""
+    parts = name.replace('\\', '/').strip('/').split('/')
+    if len(parts) > 1 and parts[-2].isdigit():
+        return int(parts[-2])
+    stem = os.path.splitext(parts[-1])[0]
+    head = stem.replace('-', '_').split('_', 1)[0]
+    if not head.isdigit():
+        raise EnrolmentError('File name does not start with a member id')
+    return int(head)
+
+
+def files_from_directory(root):
+    """(name, read) pairs for every image below `root`."""
+    for directory, _, filenames in sorted(os.walk(root)):
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(directory, filename)
+                yield os.path.relpath(path, root), (lambda path=path: open(path, 'rb').read())
+
+
+def files_from_zip(archive):
+    """(name, read) pairs for every image in a zip archive (path or file object)."""
+    # Not closed here: the entries are read by the decode pool after this generator is exhausted
+    bundle = zipfile.ZipFile(archive)
+
+    def reader(info):
+        def read():
+            if info.file_size > MAX_IMAGE_BYTES:  # Checked before inflating anything
+                raise EnrolmentError('Image too large')
+            return bundle.read(info)
+        return read
+
+    for info in bundle.infolist():
+        if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+            yield info.filename, reader(info)
+
+
+def files_from_uploads(uploads):
+    """(name, read) pairs for Django UploadedFiles."""
+    for upload in uploads:
+        yield upload.name, (lambda upload=upload: upload_buffer(upload))
+
+
+class EnrolmentReport:
+    """Counts, per-image failures and throughput of one bulk enrolment."""
+
+    def __init__(self):
+        self.images = 0
+        self.enrolled = 0
+        self.members = 0
+        self.failures = []  # {'file', 'member_id', 'error'}
+        self.seconds = 0.0
+
+    def fail(self, name, member_id, error):
+        self.failures.append({'file': name, 'member_id': member_id, 'error': str(error)})
+
+    @property
+    def images_per_second(self):
+        return self.images / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'images': self.images,
+            'enrolled': self.enrolled,
+            'members': self.members,
+            'failed': len(self.failures),
+            'failures': self.failures,
+            'seconds': round(self.seconds, 3),
+            'images_per_second': round(self.images_per_second, 2),
+        }
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _load(entry):
+    name, read = entry
+    member_id = None
+    try:
+        member_id = member_id_from_name(name)
+        data = read()
+        if len(data) > MAX_IMAGE_BYTES:
+            raise EnrolmentError('Image too large')
+        return name, member_id, decode_image(data), None
+    except Exception as e:
+        return name, member_id, None, e
+
+
+def enroll_files(files, replace=False, batch_size=None, workers=None, publish_now=False):
+    """
+    Enrol an iterable of (name, read) pairs; returns an EnrolmentReport.
+
+    With replace=True each member's existing templates are dropped before
+    the new shots are added; otherwise the shots are appended (newest
+    FACE_MAX_TEMPLATES kept). Short-lived processes pass publish_now=True:
+    the snapshot is then written before returning instead of on a
+    background timer that would die with the process.
+    """
+    batch_size = batch_size or getattr(settings, 'FACE_ENROLL_BATCH_SIZE', 16)
+    workers = workers or getattr(settings, 'FACE_ENROLL_DECODE_WORKERS', 4)
+    report = EnrolmentReport()
+    started = time.perf_counter()
+    shots = {}  # member_id -> [embedding, ...] in upload order
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for chunk in _chunks(files, batch_size):
+            loaded = []
+            for name, member_id, image, error in pool.map(_load, chunk):
+                report.images += 1
+                if error is not None:
+                    report.fail(name, member_id, error)
+                else:
+                    loaded.append((name, member_id, image))
+            if not loaded:
+                continue
+            try:
+                detections = detect_and_embed_many([image for _, _, image in loaded])
+            except Exception as e:
+                for name, member_id, _ in loaded:
+                    report.fail(name, member_id, e)
+                continue
+            for (name, member_id, _), faces in zip(loaded, detections):
+                if not len(faces):
+                    report.fail(name, member_id, 'No face detected')
+                    continue
+                # Keep the largest face in the shot
+                shots.setdefault(member_id, []).append((name, faces.embeddings[faces.largest()]))
+
+    members = Member.objects.only('id', 'face_embedding').in_bulk(list(shots))
+    updated = []
+    for member_id, member_shots in shots.items():
+        member = members.get(member_id)
+        if member is None:
+            for name, _ in member_shots:
+                report.fail(name, member_id, 'Member not found')
+            continue
+        templates = None if replace else member.face_embedding
+        for _, embedding in member_shots:
+            templates = append_template(templates, embedding)
+        member.face_embedding = templates
+        updated.append(member)
+        report.enrolled += len(member_shots)
+
+    if updated:
+        # bulk_update skips the post_save signals: update the local gallery and publish a snapshot here
+        Member.objects.bulk_update(updated, ['face_embedding'], batch_size=500)
+        for member in Member.objects.filter(id__in=[m.id for m in updated]).values_list('id', 'face_embedding'):
+            face_gallery.upsert(*member)
+        if getattr(settings, 'FACE_GALLERY_SNAPSHOTS', True):
+            if publish_now:
+                snapshot.write_snapshot()
+            else:
+                snapshot.schedule_snapshot()
+    report.members = len(updated)
+    report.seconds = time.perf_counter() - started
+    return report
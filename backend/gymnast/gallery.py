@@ -0,0 +1,292 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from face_engine.search import create_index
+from . import snapshot
+
+EMBEDDING_DIM = 512  # InceptionResnetV1 (vggface2) output size
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def append_template(templates, embedding, max_templates=None):
+    """
+    Add one enrolment shot to a member's template set, keeping the newest
+    `max_templates` (settings.FACE_MAX_TEMPLATES) rows.
+    """
+    if max_templates is None:
+        max_templates = getattr(settings, 'FACE_MAX_TEMPLATES', 5)
+    embedding = np.asarray(embedding, dtype=np.float32).reshape(1, EMBEDDING_DIM)
+    if templates is None or not len(templates):
+        return embedding
+    templates = np.asarray(templates, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    return np.concatenate([templates, embedding])[-max_templates:]
+
+
+class FaceGallery:
+    """
+    Process-wide index of member face templates.
+
+    Every member has one or more L2-normalized templates (one per enrolment
+    shot). They live in one contiguous float32 matrix with a parallel array of
+    member ids, so matching a batch of faces is one matrix product giving
+    cosine similarities, reduced to the best template per member with
+    np.maximum.reduceat over member-sorted columns.
+
+    The matrix is loaded on first use and then kept in sync
+    by the Member post_save/post_delete signals (see gymnast/signals.py).
+    Signals only reach the process that did the write. Other workers follow
+    through the on-disk snapshot (gymnast/snapshot.py): when FACE_GALLERY_SNAPSHOTS
+    is on, load() maps the newest snapshot read-only and match() picks up newer
+    versions every FACE_GALLERY_SNAPSHOT_POLL seconds. The mapped pages are
+    shared between workers until a local change copies the matrix. After bulk
+    queryset updates run `manage.py snapshot_face_gallery`.
+
+    With an approximate FACE_SEARCH_BACKEND the ANN index is built from a
+    snapshot of the matrix. Members changed since that snapshot are searched
+    exactly on the side, and the index is rebuilt once they exceed
+    FACE_SEARCH_REBUILD_RATIO of the gallery.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM, initial_capacity=256):
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._initial_capacity = initial_capacity
+        self._version = None  # snapshot version the matrix was loaded from
+        self._polled_at = 0.0
+        self._reset(initial_capacity)
+
+    def _reset(self, capacity):
+        self._matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)  # member id of every template row
+        self._rows = {}  # member_id -> template row indices in _matrix
+        self._size = 0  # template rows in use
+        self._segments = None  # cached member-sorted layout for match_many()
+        self._index = None  # ANN index over a snapshot of the matrix
+        self._index_ids = None
+        self._stale_ids = set()  # members changed since the snapshot
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def template_count(self):
+        return self._size
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def templates(self):
+        """Copy of the (template_count, dim) template matrix and the member id of every row."""
+        self.ensure_loaded()
+        with self._lock:
+            return self._matrix[:self._size].copy(), self._ids[:self._size].copy()
+
+    def _as_templates(self, embedding):
+        templates = np.asarray(embedding, dtype=np.float32)
+        if templates.size == 0 or templates.size % self.dim:
+            raise ValueError(f"Expected one or more {self.dim}-d embeddings, got {templates.size} values")
+        return _normalize(templates.reshape(-1, self.dim))
+
+    def _snapshots_enabled(self):
+        return getattr(settings, 'FACE_GALLERY_SNAPSHOTS', True)
+
+    def load(self):
+        """
+        (Re)load the gallery from the newest snapshot. Without one, or when it
+        is stale, load from the database and publish a fresh snapshot for the
+        other workers.
+        """
+        if self._snapshots_enabled():
+            loaded = snapshot.load_snapshot()
+            if loaded is not None and snapshot.matches_database(loaded[2]):
+                self._load_snapshot(*loaded)
+                return
+        self.load_from_database()
+        if self._snapshots_enabled():
+            snapshot.schedule_snapshot()  # Cold start or stale snapshot
+
+    def _load_snapshot(self, version, embeddings, ids):
+        with self._lock:
+            self._reset(0)
+            self._matrix = embeddings  # read-only memmap, copied on the first local change
+            self._ids = ids
+            self._size = len(ids)
+            for row, member_id in enumerate(ids.tolist()):
+                self._rows.setdefault(member_id, []).append(row)
+            self._version = version
+            self._polled_at = time.monotonic()
+            self._loaded = True
+
+    def load_from_database(self):
+        """Rebuild the matrix from every member that has stored templates."""
+        from .models import Member
+
+        # EmbeddingField hands back np.frombuffer views, so no per-row parsing
+        rows = Member.objects.exclude(face_embedding__isnull=True).values_list('id', 'face_embedding')
+        with self._lock:
+            self._reset(self._initial_capacity)
+            self._version = None
+            for member_id, embedding in rows.iterator():
+                try:
+                    self._upsert(member_id, embedding)
+                except ValueError:
+                    continue  # Skip malformed rows rather than failing the whole gallery
+            self._loaded = True
+
+    reload = load
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+
+    def _poll_snapshot(self):
+        """Switch to a newer snapshot if one was published since the last poll."""
+        now = time.monotonic()
+        if not self._snapshots_enabled() or now - self._polled_at < getattr(settings, 'FACE_GALLERY_SNAPSHOT_POLL', 5.0):
+            return
+        self._polled_at = now
+        version = snapshot.current_version()
+        if version is not None and (self._version is None or version > self._version):
+            loaded = snapshot.load_snapshot(version)
+            # Loaded from the database because the snapshot was stale: wait for one that matches it
+            if loaded is not None and (self._version is not None or snapshot.matches_database(loaded[2])):
+                self._load_snapshot(*loaded)
+
+    def _make_writable(self):
+        if not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix)
+            self._ids = np.array(self._ids)
+
+    def _grow(self, needed):
+        capacity = max(self._matrix.shape[0] * 2, self._initial_capacity, needed)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        ids = np.zeros(capacity, dtype=np.int64)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids = matrix, ids
+
+    def _upsert(self, member_id, embedding):
+        templates = self._as_templates(embedding)
+        self._make_writable()
+        self._remove(member_id)
+        end = self._size + len(templates)
+        if end > self._matrix.shape[0]:
+            self._grow(end)
+        self._matrix[self._size:end] = templates
+        self._ids[self._size:end] = member_id
+        self._rows[member_id] = list(range(self._size, end))
+        self._size = end
+        self._segments = None
+        if self._index is not None:
+            self._stale_ids.add(member_id)
+
+    def upsert(self, member_id, embedding):
+        """Insert or replace the template set (one or more embeddings) of one member."""
+        with self._lock:
+            if not self._loaded:
+                return  # The first load() will pick this row up from the database
+            self._upsert(member_id, embedding)
+
+    def _remove(self, member_id):
+        rows = self._rows.pop(member_id, None)
+        if rows is None:
+            return
+        self._make_writable()
+        if self._index is not None:
+            self._stale_ids.add(member_id)
+        # Highest rows first, so the row moved into a freed slot never belongs to this member
+        for row in sorted(rows, reverse=True):
+            last = self._size - 1
+            if row != last:
+                moved_id = int(self._ids[last])
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved_id
+                moved_rows = self._rows[moved_id]
+                moved_rows[moved_rows.index(last)] = row
+            self._size = last
+        self._segments = None
+
+    def remove(self, member_id):
+        """Drop a member; rows from the end of the matrix are moved into the freed slots."""
+        with self._lock:
+            self._remove(member_id)
+
+    def _member_segments(self):
+        """Column order grouping the template rows by member, segment starts and member ids."""
+        if self._segments is None:
+            ids = self._ids[:self._size]
+            order = np.argsort(ids, kind='stable')
+            sorted_ids = ids[order]
+            starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+            self._segments = (order, starts, sorted_ids[starts])
+        return self._segments
+
+    def _search_index(self, probes):
+        """Approximate search on the snapshot index plus exact search on stale members."""
+        rebuild_ratio = getattr(settings, 'FACE_SEARCH_REBUILD_RATIO', 0.05)
+        if self._index is None or len(self._stale_ids) > rebuild_ratio * len(self._rows):
+            self._index = create_index().build(self._matrix[:self._size].copy())
+            self._index_ids = self._ids[:self._size].copy()
+            self._stale_ids = set()
+
+        stale_rows = [row for m in self._stale_ids for row in self._rows.get(m, ())]
+        stale_similarities = probes @ self._matrix[stale_rows].T if stale_rows else None
+        # A few extra neighbours in case the closest ones were changed since the snapshot
+        rows, distances = self._index.search(probes, k=4)
+        results = []
+        for i in range(len(probes)):
+            best_id, best_similarity = None, float('-inf')
+            for row, distance in zip(rows[i], distances[i]):
+                if row < 0:
+                    break
+                member_id = int(self._index_ids[row])
+                if member_id not in self._stale_ids:
+                    # Unit vectors: |a - b|^2 = 2 - 2 cos(a, b)
+                    best_id, best_similarity = member_id, 1.0 - float(distance) ** 2 / 2.0
+                    break
+            if stale_similarities is not None:
+                idx = int(np.argmax(stale_similarities[i]))
+                if stale_similarities[i, idx] > best_similarity:
+                    best_id, best_similarity = int(self._ids[stale_rows[idx]]), float(stale_similarities[i, idx])
+            results.append((best_id, best_similarity))
+        return results
+
+    def match_many(self, probes):
+        """
+        Best member for every probe embedding: a list of (member_id, cosine
+        similarity), (None, -inf) when the gallery is empty.
+        """
+        self.ensure_loaded()
+        probes = self._as_templates(probes)
+        with self._lock:
+            self._poll_snapshot()
+            if self._size == 0:
+                return [(None, float('-inf'))] * len(probes)
+            if getattr(settings, 'FACE_SEARCH_BACKEND', 'exact') != 'exact':
+                return self._search_index(probes)
+            order, starts, member_ids = self._member_segments()
+            similarities = probes @ self._matrix[:self._size].T  # (probes, templates)
+            per_member = np.maximum.reduceat(similarities[:, order], starts, axis=1)  # (probes, members)
+            best = np.argmax(per_member, axis=1)
+            return [
+                (int(member_ids[j]), float(per_member[i, j]))
+                for i, j in enumerate(best)
+            ]
+
+    def match(self, probe):
+        """Return (member_id, cosine similarity) of the best matching member for one embedding."""
+        return self.match_many(probe)[0]
+
+
+face_gallery = FaceGallery()
@@ -0,0 +1,187 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Avg, Count, FloatField, Max
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from bookings.models import ClassInstance
+from gymnast.dates import day_bounds
+from gymnast.models import Activity, Member
+from sales.models import Invoice
+
+PREFIX = 'bench-'
+ACTIVITY_TYPES = ['check-in'] * 6 + ['class'] * 3 + ['personal-training']
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = ('Seeds synthetic members, activities, classes and invoices (1M activities by default) and prints '
+            'the EXPLAIN plan and timing of the dashboard hot queries, the old __date form next to the '
+            'sargable range. To compare plans, run it once with the hot-query indexes migrated back out '
+            '(`migrate gymnast 0007`, `migrate bookings 0001`, `migrate sales 0001`, `migrate app1 0013`; '
+            'the member feed index of gymnast 0007 stays) and once with them migrated in again. '
+            'Point --database at a scratch database; seeding the default one needs --force.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--activities', type=int, default=1_000_000, help='Activities to seed')
+        parser.add_argument('--members', type=int, default=2000, help='Members to spread them over')
+        parser.add_argument('--classes', type=int, default=20_000, help='Class instances to seed')
+        parser.add_argument('--invoices', type=int, default=100_000, help='Invoices to seed')
+        parser.add_argument('--days', type=int, default=365, help='History the rows are spread over')
+        parser.add_argument('--runs', type=int, default=5, help='Timed runs per query; the fastest is reported')
+        parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE (PostgreSQL)')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the seeded rows and exit')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to seed and query')
+        parser.add_argument('--force', action='store_true', help='Allow seeding the default database')
+
+    def handle(self, *args, **options):
+        self.db = options['database']
+        self.connection = connections[self.db]
+        if options['cleanup']:
+            ClassInstance.objects.using(self.db).filter(name__startswith=PREFIX).delete()
+            # Cascades to members, activities, invoices
+            deleted, _ = User.objects.using(self.db).filter(username__startswith=PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} benchmark rows'))
+            return
+        if self.db == DEFAULT_DB_ALIAS and not options['force']:
+            raise CommandError('This seeds a lot of rows (1M activities by default) into the database it runs '
+                               'against; point --database at a scratch database or pass --force')
+
+        self.seed(options)
+        self.stdout.write(f'Database: {self.connection.vendor} ({self.db}), '
+                          f'{Activity.objects.using(self.db).count()} activities, '
+                          f'{Invoice.objects.using(self.db).count()} invoices, '
+                          f'{ClassInstance.objects.using(self.db).count()} class instances')
+        for label, legacy, current in self.cases():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{label}'))
+            if legacy is not None:
+                self.report('before', legacy, options)
+            self.report('after' if legacy is not None else 'query', current, options)
+
+    def seed(self, options):
+        rng = random.Random(42)
+        now = timezone.now()
+        seconds = options['days'] * 86400
+
+        def moment():
+            return now - datetime.timedelta(seconds=rng.randrange(seconds))
+
+        bench_members = Member.objects.using(self.db).filter(user__username__startswith=PREFIX)
+        members = list(bench_members.values_list('id', flat=True))
+        if len(members) < options['members']:
+            with transaction.atomic(using=self.db):
+                users = User.objects.using(self.db).bulk_create([
+                    User(username=f'{PREFIX}{i}', email=f'{PREFIX}{i}@example.com')
+                    for i in range(len(members), options['members'])
+                ], batch_size=BATCH_SIZE)
+                users = User.objects.using(self.db).filter(username__in=[user.username for user in users])
+                Member.objects.using(self.db).bulk_create([
+                    Member(user=user, join_date=now.date()) for user in users
+                ], batch_size=BATCH_SIZE)
+            members = list(bench_members.values_list('id', flat=True))
+
+        self.fill(
+            Activity.objects.using(self.db).filter(member_id__in=members), options['activities'],
+            lambda: Activity(member_id=rng.choice(members), type=rng.choice(ACTIVITY_TYPES), title='Benchmark',
+                             timestamp=moment(), location='Main', duration=str(rng.randrange(30, 120))),
+        )
+        self.fill(
+            ClassInstance.objects.using(self.db).filter(name__startswith=PREFIX), options['classes'],
+            lambda: ClassInstance(name=f'{PREFIX}class', schedule=moment(), instructor='Sam', room='A', capacity=20),
+        )
+        self.fill(
+            Invoice.objects.using(self.db).filter(invoice_id__startswith=PREFIX), options['invoices'],
+            lambda: Invoice(invoice_id=f'{PREFIX}{rng.getrandbits(48):x}', member_id=rng.choice(members),
+                            amount=rng.randrange(20, 200), status=rng.choice(['paid', 'paid', 'pending', 'overdue']),
+                            issue_date=moment().date()),
+        )
+        if self.connection.vendor in ('postgresql', 'sqlite'):
+            with self.connection.cursor() as cursor:
+                cursor.execute('ANALYZE')  # Fresh planner statistics for the seeded tables
+
+    def fill(self, existing, target, build):
+        missing = target - existing.count()
+        if missing <= 0:
+            return
+        model = existing.model
+        started = time.perf_counter()
+        for offset in range(0, missing, BATCH_SIZE):
+            with transaction.atomic(using=self.db):
+                model.objects.using(self.db).bulk_create([build() for _ in range(min(BATCH_SIZE, missing - offset))])
+        self.stdout.write(f'Seeded {missing} {model.__name__} rows in {time.perf_counter() - started:.1f}s')
+
+    def cases(self):
+        """(label, queryset before this change or None, queryset the views run now)."""
+        day = timezone.localdate()
+        start, end = day_bounds(day)
+        history_start, history_end = day_bounds(day - datetime.timedelta(days=7), days=8)
+        monday = day - datetime.timedelta(days=day.weekday())
+        week_start, week_end = day_bounds(monday, days=7)
+        member = Member.objects.using(self.db).filter(
+            user__username__startswith=PREFIX,
+        ).values_list('id', flat=True).first()
+        summary = {
+            'total_visits': Count('id'),
+            'peak_hour': Max('timestamp'),
+            'avg_duration': Avg(Cast('duration', FloatField())),
+        }
+        return [
+            (
+                "Today's check-ins (AttendanceSummaryView)",
+                Activity.objects.filter(timestamp__date=day, type='check-in').values('id'),
+                Activity.objects.filter(timestamp__gte=start, timestamp__lt=end, type='check-in').values('id'),
+            ),
+            (
+                'Attendance history, 8 days (AttendanceSummaryView)',
+                Activity.objects.filter(
+                    timestamp__date__range=[day - datetime.timedelta(days=7), day], type='check-in',
+                ).values('timestamp__date').annotate(**summary).order_by('-timestamp__date'),
+                Activity.objects.filter(
+                    timestamp__gte=history_start, timestamp__lt=history_end, type='check-in',
+                ).values('timestamp__date').annotate(**summary).order_by('-timestamp__date'),
+            ),
+            (
+                'Live check-ins (AttendanceSummaryView)',
+                Activity.objects.filter(timestamp__date=day, type__in=['check-in', 'check-out']).order_by('-timestamp')[:5],
+                Activity.objects.filter(
+                    timestamp__gte=start, timestamp__lt=end, type__in=['check-in', 'check-out'],
+                ).order_by('-timestamp')[:5],
+            ),
+            (
+                "Member's latest activity (FaceRecognitionView spam check)",
+                None,
+                Activity.objects.filter(member=member).order_by('-timestamp')[:1],
+            ),
+            (
+                'Classes this week (WeeklyScheduleView)',
+                ClassInstance.objects.filter(schedule__date__range=[monday, monday + datetime.timedelta(days=6)]).values('schedule'),
+                ClassInstance.objects.filter(schedule__gte=week_start, schedule__lt=week_end).values('schedule'),
+            ),
+            (
+                'Pending invoices, newest first (InvoiceListCreateView)',
+                None,
+                Invoice.objects.filter(status='pending').order_by('-issue_date')[:10],
+            ),
+            (
+                'Invoices of the last 30 days (FinancialSummaryView)',
+                None,
+                Invoice.objects.filter(issue_date__gte=day - datetime.timedelta(days=30)).values('status', 'amount'),
+            ),
+        ]
+
+    def report(self, label, queryset, options):
+        queryset = queryset.using(self.db)
+        timings = []
+        for _ in range(max(1, options['runs'])):
+            started = time.perf_counter()
+            list(queryset.all())  # A fresh clone each run: no result cache
+            timings.append(time.perf_counter() - started)
+        self.stdout.write(f'  {label}: {min(timings) * 1000:.1f} ms')
+        explain = {'analyze': True} if options['analyze'] and self.connection.vendor == 'postgresql' else {}
+        for line in queryset.explain(**explain).splitlines():
+            self.stdout.write(f'    {line}')
@@ -0,0 +1,37 @@
+import os
+import zipfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gymnast.enrolment import enroll_files, files_from_directory, files_from_zip
+
+
+class Command(BaseCommand):
+    help = 'Enrols member face images from a directory or zip (files named <member_id>[_n].jpg or <member_id>/x.jpg)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Directory or .zip archive of face images')
+        parser.add_argument('--replace', action='store_true',
+                            help="Replace the members' existing templates instead of adding to them")
+        parser.add_argument('--batch-size', type=int, default=None, help='Images per embedding batch')
+        parser.add_argument('--workers', type=int, default=None, help='Image decoding threads')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if os.path.isdir(path):
+            files = files_from_directory(path)
+        elif zipfile.is_zipfile(path):
+            files = files_from_zip(path)
+        else:
+            raise CommandError(f'{path} is neither a directory nor a zip archive')
+
+        # The web workers only see bulk_update()d templates through the snapshot: write it before exiting
+        report = enroll_files(files, replace=options['replace'], batch_size=options['batch_size'],
+                              workers=options['workers'], publish_now=True)
+
+        for failure in report.failures:
+            self.stderr.write(f"{failure['file']}: {failure['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Enrolled {report.enrolled}/{report.images} images for {report.members} members '
+            f'in {report.seconds:.1f}s ({report.images_per_second:.1f} images/s), {len(report.failures)} failed'
+        ))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gymnast.snapshot import current_version, load_snapshot, snapshot_dir, write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Writes a new memory-mappable snapshot of the member face gallery under FACE_GALLERY_SNAPSHOT_DIR'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--show', action='store_true', help='Only print the current snapshot version')
+
+    def handle(self, *args, **options):
+        if options['show']:
+            loaded = load_snapshot()
+            if loaded is None:
+                self.stdout.write(self.style.WARNING(f'No snapshot in {snapshot_dir()}'))
+            else:
+                version, embeddings, ids = loaded
+                self.stdout.write(f'Snapshot {version}: {len(embeddings)} templates of {len(set(ids.tolist()))}'
+                                  f' members in {snapshot_dir()}')
+            return
+
+        started = time.perf_counter()
+        previous = current_version()
+        version, count = write_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f'Snapshot {version} written with {count} templates in {time.perf_counter() - started:.2f}s'
+            f' (previous: {previous or "none"})'
+        ))
@@ -0,0 +1,60 @@
+import numpy as np
+from django.db import migrations
+
+import face_engine.fields
+
+EMBEDDING_DIM = 512
+
+
+def json_to_binary(apps, schema_editor):
+    Member = apps.get_model('gymnast', 'Member')
+    batch = []
+    for member in Member.objects.only('id', 'face_embedding').iterator(chunk_size=500):
+        embedding = member.face_embedding
+        if not embedding or len(embedding) != EMBEDDING_DIM:
+            continue  # Missing or malformed embeddings become NULL
+        member.face_embedding_bin = np.asarray(embedding, dtype=np.float32)
+        batch.append(member)
+        if len(batch) >= 500:
+            Member.objects.bulk_update(batch, ['face_embedding_bin'])
+            batch = []
+    Member.objects.bulk_update(batch, ['face_embedding_bin'])
+
+
+def binary_to_json(apps, schema_editor):
+    Member = apps.get_model('gymnast', 'Member')
+    batch = []
+    for member in Member.objects.exclude(face_embedding_bin__isnull=True).only('id', 'face_embedding_bin').iterator(chunk_size=500):
+        # After 0006 a member can hold several templates; the JSON field holds one, keep the first
+        templates = np.asarray(member.face_embedding_bin).reshape(-1, EMBEDDING_DIM)
+        member.face_embedding = templates[0].astype(float).tolist()
+        batch.append(member)
+        if len(batch) >= 500:
+            Member.objects.bulk_update(batch, ['face_embedding'])
+            batch = []
+    Member.objects.bulk_update(batch, ['face_embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymnast', '0004_activity_confidence_member_face_embedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='face_embedding_bin',
+            field=face_engine.fields.EmbeddingField(blank=True, null=True, normalize=True),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        migrations.RemoveField(
+            model_name='member',
+            name='face_embedding',
+        ),
+        migrations.RenameField(
+            model_name='member',
+            old_name='face_embedding_bin',
+            new_name='face_embedding',
+        ),
+    ]
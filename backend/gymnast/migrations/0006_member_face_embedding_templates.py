@@ -0,0 +1,18 @@
+from django.db import migrations
+
+import face_engine.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymnast', '0005_member_face_embedding_binary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='member',
+            name='face_embedding',
+            field=face_engine.fields.EmbeddingField(blank=True, dim=512, null=True, normalize=True),
+        ),
+    ]
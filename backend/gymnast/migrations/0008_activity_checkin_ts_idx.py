@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymnast', '0007_activity_message_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(condition=models.Q(type='check-in'), fields=['timestamp'], name='activity_checkin_ts_idx'),
+        ),
+    ]
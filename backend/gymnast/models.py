@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from face_engine.fields import EmbeddingField
+
 class GymSettings(models.Model):
     gym_name = models.CharField(max_length=255, default="FitLife Wellness Center")
     email = models.EmailField(default="info@fitlifegym.com")
@@ -53,7 +55,7 @@ class Member(models.Model):
     phone = models.CharField(max_length=20, blank=True, null=True)
     membership_plan = models.ForeignKey(MembershipPlan, on_delete=models.SET_NULL, null=True)
     classes = models.ManyToManyField(Class, blank=True)
-    face_embedding = models.JSONField(default=list, blank=True)
+    face_embedding = EmbeddingField(normalize=True, dim=512)  # (n, 512) float32 templates, one per enrolment shot
     join_date = models.DateField()
     last_visit = models.DateField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=[
@@ -88,6 +90,16 @@ class Activity(models.Model):
     confidence = models.FloatField(default=0.0)
     duration = models.CharField(max_length=20)  # e.g., "2h 15m"
 
+    class Meta:
+        # Keyset pagination of the activity feed (gymnast/pagination.py), overall and per member;
+        # the member one also serves the latest-check-in lookup of FaceRecognitionView
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='activity_timestamp_id_idx'),
+            models.Index(fields=['member', 'timestamp', 'id'], name='activity_member_ts_id_idx'),
+            # Check-ins per day (AttendanceSummaryView): only check-in rows, so the index stays small
+            models.Index(fields=['timestamp'], condition=models.Q(type='check-in'), name='activity_checkin_ts_idx'),
+        ]
+
     def __str__(self):
         return f"{self.member} - {self.title} ({self.timestamp})"
 
@@ -123,5 +135,12 @@ class Message(models.Model):
     content = models.TextField()
     sent_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Keyset pagination of the message feed (gymnast/pagination.py), overall and per member
+        indexes = [
+            models.Index(fields=['sent_at', 'id'], name='message_sent_at_id_idx'),
+            models.Index(fields=['member', 'sent_at', 'id'], name='message_member_sent_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.member} - {self.message_type} ({self.sent_at})"
\ No newline at end of file
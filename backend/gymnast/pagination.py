@@ -0,0 +1,113 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination for append-only feeds, newest first.
+
+    Rows are ordered by (`ordering` field, id) descending and a cursor holds
+    the key of the row it continues from, so every page is an index range
+    scan on (field, id). There is no OFFSET and no COUNT(*): page 1000 costs
+    the same as page 1.
+
+    `next` pages towards older rows. `previous` returns rows newer than the
+    first row of the page. A dashboard can keep polling that link: while
+    nothing new has arrived it returns an empty page with the same link.
+    """
+    ordering = ('-timestamp', '-id')
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    @property
+    def field(self):
+        return self.ordering[0].lstrip('-')
+
+    def cursor_link(self, value, pk, newer):
+        payload = {'v': value.isoformat() if hasattr(value, 'isoformat') else value, 'id': pk, 'newer': newer}
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        """(value, id, newer) of the ?cursor= parameter, or None on the first page."""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+            value = model._meta.get_field(self.field).to_python(payload['v'])
+            return value, int(payload['id']), bool(payload.get('newer'))
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset.model)
+        field = self.field
+
+        if cursor is not None and cursor[2]:
+            # Newer than the cursor: walk up from it, then flip back to newest first
+            value, pk, _ = cursor
+            # (field, id) > (value, pk), spelled so the leading condition is an index range bound
+            queryset = queryset.filter(**{f'{field}__gte': value}).filter(Q(**{f'{field}__gt': value}) | Q(pk__gt=pk))
+            rows = list(queryset.order_by(field, 'pk')[:page_size])[::-1]
+            oldest = (getattr(rows[-1], field), rows[-1].pk) if rows else (value, pk)
+            has_older = True  # At least the cursor row itself
+        else:
+            if cursor is not None:
+                value, pk, _ = cursor
+                queryset = queryset.filter(**{f'{field}__lte': value}).filter(Q(**{f'{field}__lt': value}) | Q(pk__lt=pk))
+            rows = list(queryset.order_by(f'-{field}', '-pk')[:page_size + 1])
+            has_older = len(rows) > page_size
+            rows = rows[:page_size]
+            oldest = (getattr(rows[-1], field), rows[-1].pk) if rows else None
+
+        self.next_link = self.cursor_link(*oldest, newer=False) if has_older and oldest else None
+        if rows:
+            self.previous_link = self.cursor_link(getattr(rows[0], field), rows[0].pk, newer=True)
+        elif cursor is not None and cursor[2]:
+            self.previous_link = self.base_url  # Nothing new yet: poll the same link again
+        else:
+            self.previous_link = None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.next_link, 'previous': self.previous_link, 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ActivityPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
+
+
+class MessagePagination(KeysetPagination):
+    ordering = ('-sent_at', '-id')
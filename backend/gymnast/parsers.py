@@ -0,0 +1,16 @@
+from rest_framework.parsers import BaseParser
+
+
+class RawImageParser(BaseParser):
+    """
+    Accepts an image posted as the raw request body (Content-Type image/jpeg,
+    image/png, ...). request.data is then the body bytes.
+    """
+    media_type = 'image/*'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream.read() if stream is not None else b''
+
+
+class OctetStreamImageParser(RawImageParser):
+    media_type = 'application/octet-stream'
@@ -1,4 +1,4 @@
-from rest_framework import serializers
+from rest_framework import permissions, serializers
 from django.contrib.auth.models import User
 from .models import GymSettings, MembershipPlan, Member, Class, Activity, Booking, Achievement, Message
 
@@ -58,7 +58,39 @@ class MessageSerializer(serializers.ModelSerializer):
         model = Message
         fields = ['id', 'member', 'message_type', 'subject', 'content', 'sent_at']
 
-class MemberSerializer(serializers.ModelSerializer):
+def query_list(request, name):
+    """Comma separated values of a query parameter (?expand=a,b or ?expand=a&expand=b) as a set."""
+    if request is None:
+        return set()
+    return {
+        value.strip()
+        for param in request.query_params.getlist(name)
+        for value in param.split(',') if value.strip()
+    }
+
+
+class SparseFieldsetMixin:
+    """
+    Sparse fieldsets for read requests: ?fields=id,name returns only those
+    fields, and the Meta.expandable_fields (nested collections) are left out
+    unless listed in ?expand= (or ?fields=) or in default_expand.
+    """
+    default_expand = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return  # Writes validate and echo the full representation
+        requested = query_list(request, 'fields')
+        expand = set(self.default_expand) | query_list(request, 'expand') | requested
+        expandable = getattr(self.Meta, 'expandable_fields', ())
+        for name in list(self.fields):
+            if (name in expandable and name not in expand) or (requested and name not in requested):
+                self.fields.pop(name)
+
+
+class MemberSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     name = serializers.SerializerMethodField(read_only=True)
     email = serializers.EmailField(source='user.email', required=True)
     first_name = serializers.CharField(source='user.first_name', required=False)
@@ -66,10 +98,11 @@ class MemberSerializer(serializers.ModelSerializer):
     membership = serializers.CharField(source='membership_plan.name', allow_null=True, read_only=True)
     membership_plan = serializers.PrimaryKeyRelatedField(queryset=MembershipPlan.objects.all(), allow_null=True)
     classes = serializers.PrimaryKeyRelatedField(many=True, queryset=Class.objects.all(), required=False)
-    activities = ActivitySerializer(many=True, read_only=True)
-    bookings = BookingSerializer(many=True, read_only=True)
-    achievements = AchievementSerializer(many=True, read_only=True)
-    messages = MessageSerializer(many=True, read_only=True)
+    # Newest entries prefetched by gymnast.views.member_queryset(); left out for members loaded without it
+    activities = ActivitySerializer(many=True, read_only=True, source='recent_activities')
+    bookings = BookingSerializer(many=True, read_only=True, source='recent_bookings')
+    achievements = AchievementSerializer(many=True, read_only=True, source='recent_achievements')
+    messages = MessageSerializer(many=True, read_only=True, source='recent_messages')
 
     class Meta:
         model = Member
@@ -78,6 +111,10 @@ class MemberSerializer(serializers.ModelSerializer):
             'classes', 'join_date', 'last_visit', 'status', 'address', 'emergency_contact',
             'emergency_phone', 'date_of_birth', 'gender', 'activities', 'bookings', 'achievements', 'messages'
         ]
+        expandable_fields = ['classes', 'activities', 'bookings', 'achievements', 'messages']
+
+    # Single members (detail view, write responses) embed every relation unless ?fields= says otherwise
+    default_expand = Meta.expandable_fields
 
     def get_name(self, obj):
         return f"{obj.user.first_name} {obj.user.last_name}".strip()
@@ -106,4 +143,15 @@ class MemberSerializer(serializers.ModelSerializer):
         instance.user.first_name = user_data['first_name']
         instance.user.last_name = user_data['last_name']
         instance.user.save()
-        return super().update(instance, validated_data)
\ No newline at end of file
+        return super().update(instance, validated_data)
+
+
+class MemberListSerializer(MemberSerializer):
+    """
+    Row of the members table: the member's own columns only. Relations are
+    opt-in with ?expand=classes,activities,bookings,achievements,messages and
+    each nested history is capped at MEMBER_NESTED_LIMIT newest entries; the
+    full history is paged through /api/activities/?member_id=<id> (and the
+    bookings, achievements and messages equivalents).
+    """
+    default_expand = ()
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import snapshot
+from .gallery import face_gallery
+from .models import Member
+
+
+def _publish_snapshot():
+    # Other workers only see this change through a new on-disk snapshot
+    if getattr(settings, 'FACE_GALLERY_SNAPSHOTS', True):
+        transaction.on_commit(snapshot.schedule_snapshot)
+
+
+@receiver(post_save, sender=Member)
+def sync_gallery_on_save(sender, instance, update_fields=None, **kwargs):
+    # Saves that don't touch the embedding (e.g. last_visit) leave the gallery alone
+    if update_fields is not None and 'face_embedding' not in update_fields:
+        return
+    if instance.face_embedding is not None and len(instance.face_embedding):
+        try:
+            face_gallery.upsert(instance.id, instance.face_embedding)
+        except ValueError:
+            face_gallery.remove(instance.id)
+    else:
+        face_gallery.remove(instance.id)
+    if instance.face_embedding is not None:
+        _publish_snapshot()
+
+
+@receiver(post_delete, sender=Member)
+def sync_gallery_on_delete(sender, instance, **kwargs):
+    face_gallery.remove(instance.id)
+    if instance.face_embedding is not None:
+        _publish_snapshot()
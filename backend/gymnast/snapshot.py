@@ -0,0 +1,178 @@
+"""
+Versioned on-disk snapshots of the member face gallery.
+
+A snapshot is a pair of .npy files under FACE_GALLERY_SNAPSHOT_DIR (default:
+face_gallery/ next to manage.py). The embeddings are biometric data, so the
+directory must not be served: it may not lie inside MEDIA_ROOT or STATIC_ROOT.
+
+    embeddings-<version>.npy   (n, 512) float32, one row per face template
+    ids-<version>.npy          (n,) int64, member id of each row
+    CURRENT                    the newest complete version
+
+Workers np.load() the embeddings with mmap_mode='r', so every process on the
+host shares the same page-cache pages instead of building its own copy from
+the database. Versions only ever increase; FaceGallery polls CURRENT and maps
+a newer snapshot when one appears. A snapshot whose members disagree with the
+database (see matches_database) is ignored in favour of the database. Snapshots are written by
+`manage.py snapshot_face_gallery`, by the first worker that finds none, and,
+debounced, after every embedding change (see schedule_snapshot).
+"""
+import fcntl
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from django.db.models import Count, Max
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 512
+KEEP_VERSIONS = 3  # Older snapshots may still be mapped by a worker that has not polled yet
+
+
+def snapshot_dir():
+    directory = os.path.abspath(
+        getattr(settings, 'FACE_GALLERY_SNAPSHOT_DIR', '') or os.path.join(settings.BASE_DIR, 'face_gallery')
+    )
+    for served in (settings.MEDIA_ROOT, settings.STATIC_ROOT):
+        if served and os.path.commonpath([directory, os.path.abspath(served)]) == os.path.abspath(served):
+            raise ImproperlyConfigured(f'FACE_GALLERY_SNAPSHOT_DIR ({directory}) must not be inside {served}')
+    return directory
+
+
+def _paths(version):
+    directory = snapshot_dir()
+    return (
+        os.path.join(directory, f'embeddings-{version}.npy'),
+        os.path.join(directory, f'ids-{version}.npy'),
+    )
+
+
+def current_version():
+    """Version named in CURRENT, or None when no snapshot was written yet."""
+    try:
+        with open(os.path.join(snapshot_dir(), 'CURRENT')) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _save(path, array):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def _prune(keep=KEEP_VERSIONS):
+    versions = sorted({
+        int(name.split('-', 1)[1][:-4])
+        for name in os.listdir(snapshot_dir())
+        if name.endswith('.npy') and '-' in name and name.split('-', 1)[1][:-4].isdigit()
+    })
+    for version in versions[:-keep]:
+        for path in _paths(version):
+            try:
+                os.unlink(path)  # Processes that still map the file keep their pages
+            except OSError:
+                pass
+
+
+def write_snapshot():
+    """Dump every stored member template to a new snapshot; returns (version, template count)."""
+    from .models import Member
+
+    os.makedirs(snapshot_dir(), exist_ok=True)
+    with open(os.path.join(snapshot_dir(), '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # One writer at a time across processes
+        ids, vectors = [], []
+        for member_id, embedding in (
+            Member.objects.exclude(face_embedding__isnull=True)
+            .order_by('id').values_list('id', 'face_embedding').iterator()
+        ):
+            if np.size(embedding) and np.size(embedding) % EMBEDDING_DIM == 0:
+                templates = np.reshape(embedding, (-1, EMBEDDING_DIM))
+                ids.extend([member_id] * len(templates))
+                vectors.append(templates)
+        matrix = (np.concatenate(vectors).astype(np.float32, copy=False) if vectors
+                  else np.zeros((0, EMBEDDING_DIM), np.float32))
+
+        # Wall-clock based but strictly increasing, even if the clock steps back
+        version = max(time.time_ns() // 1000, (current_version() or 0) + 1)
+        embeddings_path, ids_path = _paths(version)
+        _save(embeddings_path, matrix)
+        _save(ids_path, np.asarray(ids, dtype=np.int64))
+        tmp = os.path.join(snapshot_dir(), 'CURRENT.tmp')
+        with open(tmp, 'w') as f:
+            f.write(str(version))
+        os.replace(tmp, os.path.join(snapshot_dir(), 'CURRENT'))
+        _prune()
+    logger.info("Wrote face gallery snapshot %s (%d templates)", version, len(ids))
+    return version, len(ids)
+
+
+def load_snapshot(version=None):
+    """Return (version, embeddings memmap, ids) of the given or current snapshot, or None."""
+    version = version or current_version()
+    if version is None:
+        return None
+    embeddings_path, ids_path = _paths(version)
+    try:
+        embeddings = np.load(embeddings_path, mmap_mode='r')
+        ids = np.load(ids_path)
+    except (OSError, ValueError):
+        logger.warning("Face gallery snapshot %s is unreadable", version)
+        return None
+    return version, embeddings, ids
+
+
+def database_stamp():
+    """(members with templates, highest such member id): one cheap aggregate over the Member table."""
+    from .models import Member
+
+    stamp = Member.objects.exclude(face_embedding__isnull=True).aggregate(count=Count('id'), last=Max('id'))
+    return stamp['count'], stamp['last']
+
+
+def matches_database(ids):
+    """
+    Whether a snapshot's member ids agree with database_stamp(). A snapshot
+    left behind by a process that exited before its scheduled write (a shell
+    session, a management command) misses members added or removed since.
+    """
+    ids = np.asarray(ids)
+    return (len(np.unique(ids)), int(ids.max()) if len(ids) else None) == database_stamp()
+
+
+_timer = None
+_timer_lock = threading.Lock()
+
+
+def _run_scheduled():
+    global _timer
+    with _timer_lock:
+        _timer = None
+    try:
+        write_snapshot()
+    except Exception:
+        logger.exception("Face gallery snapshot failed")
+    finally:
+        close_old_connections()
+
+
+def schedule_snapshot(delay=None):
+    """Write a snapshot in the background; calls within `delay` seconds are merged into one."""
+    global _timer
+    if delay is None:
+        delay = getattr(settings, 'FACE_GALLERY_SNAPSHOT_DELAY', 2.0)
+    with _timer_lock:
+        if _timer is not None:
+            return
+        _timer = threading.Timer(delay, _run_scheduled)
+        _timer.daemon = True
+        _timer.start()
@@ -1,3 +1,561 @@
-from django.test import TestCase
+import base64
+import datetime
+import io
+import os
+import tempfile
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from face_engine.embedding import FaceDetections
+from face_engine.limits import InferenceLimiter
+
+from . import snapshot
+from .enrolment import EnrolmentError, enroll_files, files_from_zip, member_id_from_name
+from .gallery import EMBEDDING_DIM, FaceGallery
+from .models import Achievement, Activity, Booking, Class, Member, MembershipPlan, Message
+from .views import MEMBER_NESTED_LIMIT
+
+
+def unit_vectors(count, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, EMBEDDING_DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@override_settings(FACE_GALLERY_SNAPSHOTS=False, FACE_SEARCH_BACKEND='exact')
+class FaceGalleryTests(TestCase):
+    """In-memory member gallery: upsert / remove bookkeeping and best-template matching."""
+
+    def setUp(self):
+        self.gallery = FaceGallery(initial_capacity=2)
+        self.gallery.load_from_database()  # No members yet: an empty, loaded gallery
+        self.vectors = unit_vectors(6)
+
+    def test_empty_gallery_matches_nobody(self):
+        self.assertEqual(self.gallery.match(self.vectors[0]), (None, float('-inf')))
+
+    def test_upsert_grows_and_matches(self):
+        for member_id in range(1, 6):
+            self.gallery.upsert(member_id, self.vectors[member_id])
+        self.assertEqual((len(self.gallery), self.gallery.template_count), (5, 5))
+        member_id, similarity = self.gallery.match(self.vectors[3] * 7)  # Probes are normalized too
+        self.assertEqual(member_id, 3)
+        self.assertAlmostEqual(similarity, 1.0, places=5)
+
+    def test_upsert_replaces_templates(self):
+        self.gallery.upsert(1, self.vectors[:2])
+        self.gallery.upsert(1, self.vectors[2])
+        self.assertEqual(self.gallery.template_count, 1)
+        self.assertLess(self.gallery.match(self.vectors[0])[1], 0.5)
+        self.assertEqual(self.gallery.match(self.vectors[2])[0], 1)
+
+    def test_remove_moves_rows_of_other_members(self):
+        self.gallery.upsert(1, self.vectors[:2])
+        self.gallery.upsert(2, self.vectors[2])
+        self.gallery.upsert(3, self.vectors[3:5])
+        self.gallery.remove(1)
+        self.gallery.remove(1)  # Unknown members are ignored
+        self.assertEqual((len(self.gallery), self.gallery.template_count), (2, 3))
+        self.assertEqual([m for m, _ in self.gallery.match_many(self.vectors[2:5])], [2, 3, 3])
+        self.assertLess(self.gallery.match(self.vectors[0])[1], 0.5)
+
+    def test_match_many_uses_the_best_template_per_member(self):
+        self.gallery.upsert(1, self.vectors[:3])
+        self.gallery.upsert(2, self.vectors[3])
+        probes = np.stack([self.vectors[2], self.vectors[3], self.vectors[0] + 0.1 * self.vectors[4]])
+        results = self.gallery.match_many(probes)
+        self.assertEqual([member_id for member_id, _ in results], [1, 2, 1])
+        self.assertAlmostEqual(results[0][1], 1.0, places=5)
+
+    def test_templates_is_a_copy(self):
+        self.gallery.upsert(1, self.vectors[:2])
+        matrix, ids = self.gallery.templates()
+        self.assertEqual((matrix.shape, ids.tolist()), ((2, EMBEDDING_DIM), [1, 1]))
+        matrix[:] = 0
+        self.assertEqual(self.gallery.match(self.vectors[0])[0], 1)
+
+    def test_malformed_embedding_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.gallery.upsert(1, np.ones(EMBEDDING_DIM + 1))
+        self.assertEqual(len(self.gallery), 0)
+
+
+class GallerySnapshotTests(TestCase):
+    """Snapshots live outside the served directories, and a cold start publishes the first one."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.snapshots = os.path.join(self.tmp.name, 'face_gallery')
+        self.enterContext(override_settings(FACE_GALLERY_SNAPSHOT_DIR=self.snapshots, FACE_GALLERY_SNAPSHOTS=True,
+                                            FACE_SEARCH_BACKEND='exact'))
+        user = User.objects.create_user(username='member', email='member@example.com')
+        self.vectors = unit_vectors(2)
+        Member.objects.create(user=user, join_date=datetime.date(2024, 1, 1), face_embedding=self.vectors)
+
+    def test_snapshot_dir_must_not_be_served(self):
+        for served in ('MEDIA_ROOT', 'STATIC_ROOT'):
+            with override_settings(**{served: self.tmp.name}):
+                with self.assertRaises(ImproperlyConfigured):
+                    snapshot.snapshot_dir()
+
+    def test_default_dir_is_outside_media(self):
+        with override_settings(FACE_GALLERY_SNAPSHOT_DIR=''):
+            self.assertEqual(os.path.basename(snapshot.snapshot_dir()), 'face_gallery')
+
+    def test_write_and_load(self):
+        version, count = snapshot.write_snapshot()
+        self.assertEqual((snapshot.current_version(), count), (version, 2))
+        gallery = FaceGallery()
+        gallery.load()
+        self.assertEqual(gallery.template_count, 2)
+        self.assertEqual(gallery.match(self.vectors[1])[0], Member.objects.get().id)
+
+    def test_cold_start_publishes_a_snapshot(self):
+        with mock.patch.object(snapshot, 'schedule_snapshot') as schedule:
+            FaceGallery().load()
+            self.assertEqual(schedule.call_count, 1)
+            snapshot.write_snapshot()
+            FaceGallery().load()  # Maps the snapshot, nothing to publish
+            self.assertEqual(schedule.call_count, 1)
+
+    def test_stale_snapshot_falls_back_to_the_database(self):
+        snapshot.write_snapshot()
+        # Saved by a process that exited before its debounced snapshot was written
+        user = User.objects.create_user(username='late', email='late@example.com')
+        late = Member.objects.create(user=user, join_date=datetime.date(2024, 1, 1),
+                                     face_embedding=unit_vectors(1, seed=1))
+        self.assertFalse(snapshot.matches_database(snapshot.load_snapshot()[2]))
+        gallery = FaceGallery()
+        with mock.patch.object(snapshot, 'schedule_snapshot') as schedule:
+            gallery.load()
+        schedule.assert_called_once()
+        self.assertEqual(gallery.template_count, 3)
+        self.assertEqual(gallery.match(unit_vectors(1, seed=1)[0])[0], late.id)
+
+        mapped = self.enterContext(mock.patch.object(gallery, '_load_snapshot', wraps=gallery._load_snapshot))
+        with override_settings(FACE_GALLERY_SNAPSHOT_POLL=0):
+            gallery.match(self.vectors[0])  # Polls: the stale snapshot is still current and is not mapped
+            mapped.assert_not_called()
+            version, _ = snapshot.write_snapshot()
+            gallery.match(self.vectors[0])
+        self.assertEqual(mapped.call_args[0][0], version)
+        self.assertEqual(gallery.template_count, 3)
+
+
+class MemberEmbeddingStorageTests(TestCase):
+    """Member.face_embedding holds a set of normalized 512-d templates as binary float32."""
+
+    def test_round_trip(self):
+        user = User.objects.create_user(username='member', email='member@example.com')
+        templates = unit_vectors(2) * 3
+        member = Member.objects.create(user=user, join_date=datetime.date(2024, 1, 1), face_embedding=templates)
+        # The saved instance already holds what the database returns
+        self.assertEqual(member.face_embedding.shape, (2, EMBEDDING_DIM))
+        stored = Member.objects.get(pk=member.pk).face_embedding
+        np.testing.assert_allclose(stored, templates / 3, rtol=1e-5)
+        np.testing.assert_allclose(np.linalg.norm(stored, axis=1), 1.0, rtol=1e-5)
+
+        member.face_embedding = []
+        member.save()
+        self.assertIsNone(Member.objects.get(pk=member.pk).face_embedding)
+
+
+@override_settings(FACE_GALLERY_SNAPSHOTS=False)
+class BulkEnrolmentTests(TestCase):
+    """Images named after their member are embedded in batches and appended to the member's templates."""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='x')
+        self.members = [
+            Member.objects.create(user=User.objects.create_user(username=f'member{i}'),
+                                  join_date=datetime.date(2024, 1, 1))
+            for i in range(2)
+        ]
+        self.vectors = unit_vectors(4)
+        patcher = mock.patch('gymnast.enrolment.decode_image', side_effect=self.decode)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('gymnast.enrolment.detect_and_embed_many', side_effect=self.detect)
+        self.detect_many = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def decode(data):
+        if data == b'broken':
+            raise ValueError('Could not decode image')
+        return data  # The "image" is the shot number, see detect()
+
+    def detect(self, images):
+        # b'0'..b'3' is one face with that vector, b'none' no face at all
+        return [
+            FaceDetections.empty() if image == b'none' else FaceDetections(
+                np.array([[0, 0, 10, 10]], dtype=np.float32), np.array([0.99], dtype=np.float32),
+                self.vectors[[int(image)]],
+            )
+            for image in images
+        ]
+
+    def zip_of(self, files):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as bundle:
+            for name, data in files.items():
+                bundle.writestr(name, data)
+        buffer.seek(0)
+        return buffer
+
+    def test_member_id_from_name(self):
+        self.assertEqual(member_id_from_name('12.jpg'), 12)
+        self.assertEqual(member_id_from_name('12_front.jpg'), 12)
+        self.assertEqual(member_id_from_name('12-left.png'), 12)
+        self.assertEqual(member_id_from_name('photos/12/front.jpg'), 12)
+        self.assertEqual(member_id_from_name('photos\\12\\front.jpg'), 12)
+        with self.assertRaises(EnrolmentError):
+            member_id_from_name('front.jpg')
+
+    def test_files_from_zip_skips_directories_and_other_files(self):
+        archive = self.zip_of({'12.jpg': b'a', '12/side.JPG': b'b', 'notes.txt': b'c'})
+        files = dict(files_from_zip(archive))
+        self.assertEqual(sorted(files), ['12.jpg', '12/side.JPG'])
+        self.assertEqual(files['12/side.JPG'](), b'b')
+
+    def test_report(self):
+        first, second = self.members
+        files = [
+            (f'{first.id}_front.jpg', lambda: b'0'),
+            (f'{first.id}/side.jpg', lambda: b'1'),
+            (f'{second.id}.jpg', lambda: b'2'),
+            (f'{second.id}_blurry.jpg', lambda: b'none'),
+            ('9999.jpg', lambda: b'3'),
+            ('front.jpg', lambda: b'3'),
+            (f'{first.id}_broken.jpg', lambda: b'broken'),
+        ]
+        report = enroll_files(files, batch_size=2, workers=2).as_dict()
+        self.assertEqual((report['images'], report['enrolled'], report['members'], report['failed']), (7, 3, 2, 4))
+        self.assertEqual(
+            sorted((failure['file'], failure['member_id']) for failure in report['failures']),
+            sorted([(f'{second.id}_blurry.jpg', second.id), ('9999.jpg', 9999), ('front.jpg', None),
+                    (f'{first.id}_broken.jpg', first.id)]),
+        )
+        self.assertEqual(self.detect_many.call_count, 3)  # 4 batches of up to 2; the last one failed to decode
+        np.testing.assert_allclose(Member.objects.get(pk=first.pk).face_embedding, self.vectors[:2], rtol=1e-5)
+
+        # Appended by default, dropped first with replace=True
+        enroll_files([(f'{first.id}.jpg', lambda: b'2')])
+        self.assertEqual(len(Member.objects.get(pk=first.pk).face_embedding), 3)
+        enroll_files([(f'{first.id}.jpg', lambda: b'3')], replace=True)
+        np.testing.assert_allclose(Member.objects.get(pk=first.pk).face_embedding, self.vectors[[3]], rtol=1e-5)
+
+    def test_command_publishes_the_snapshot_before_exiting(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        faces = os.path.join(tmp.name, 'faces')
+        os.makedirs(os.path.join(faces, str(self.members[1].id)))
+        for name, data in ((f'{self.members[0].id}.jpg', b'0'), (f'{self.members[1].id}/side.jpg', b'1')):
+            with open(os.path.join(faces, name), 'wb') as f:
+                f.write(data)
+        self.enterContext(override_settings(FACE_GALLERY_SNAPSHOTS=True,
+                                            FACE_GALLERY_SNAPSHOT_DIR=os.path.join(tmp.name, 'gallery')))
+        schedule = self.enterContext(mock.patch.object(snapshot, 'schedule_snapshot'))
+        before, _ = snapshot.write_snapshot()
+        call_command('enroll_faces', faces, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertGreater(snapshot.current_version(), before)
+        schedule.assert_not_called()  # Written synchronously, not on a timer that dies with the process
+        _, embeddings, ids = snapshot.load_snapshot()
+        self.assertEqual(sorted(ids.tolist()), sorted(member.id for member in self.members))
+        self.assertEqual(embeddings.shape, (2, EMBEDDING_DIM))
+
+    def test_view_enrols_uploads(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        member = self.members[0]
+        response = client.post('/api/bulk-enroll-faces/', {
+            'images': [SimpleUploadedFile(f'{member.id}_a.jpg', b'0'), SimpleUploadedFile(f'{member.id}_b.jpg', b'1')],
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['enrolled'], 2)
+
+        archive = SimpleUploadedFile('faces.zip', b'not a zip')
+        response = client.post('/api/bulk-enroll-faces/', {'archive': archive}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_view_waits_for_an_inference_slot(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        limiter = InferenceLimiter(max_concurrent=1, queue_timeout=0, retry_after=3)
+        with mock.patch('gymnast.views.inference_limiter', return_value=limiter), limiter.slot():
+            response = client.post('/api/bulk-enroll-faces/', {
+                'images': [SimpleUploadedFile(f'{self.members[0].id}.jpg', b'0')],
+            }, format='multipart')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+        self.detect_many.assert_not_called()
+
+
+@override_settings(FACE_GALLERY_SNAPSHOTS=False)
+class FaceImageUploadTests(TestCase):
+    """
+    Face endpoints take a raw image body, a multipart file or a base64 /
+    data-URL field, and answer 503 + Retry-After while inference is saturated.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='x'))
+        self.member = Member.objects.create(user=User.objects.create_user(username='member'),
+                                            join_date=datetime.date(2024, 1, 1))
+        bgr = np.zeros((20, 30, 3), dtype=np.uint8)
+        bgr[..., 2] = 255  # Red
+        self.png = cv2.imencode('.png', bgr)[1].tobytes()
+        self.images = []
+        patcher = mock.patch('gymnast.views.detect_and_embed', side_effect=self.detect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def detect(self, image):
+        self.images.append(image)
+        return FaceDetections(np.array([[0, 0, 10, 10]], dtype=np.float32), np.array([0.99], dtype=np.float32),
+                              unit_vectors(1))
+
+    def assertDecodedRgb(self, response):
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['templates'], 1)
+        image, = self.images
+        self.assertEqual(image.shape, (20, 30, 3))
+        self.assertTrue((image[..., 0] == 255).all() and (image[..., 1:] == 0).all())
+
+    def test_raw_body(self):
+        for content_type in ('image/png', 'application/octet-stream'):
+            self.images.clear()
+            response = self.client.post(f'/api/save-face-embedding/?member_id={self.member.id}&replace=1',
+                                        self.png, content_type=content_type)
+            self.assertDecodedRgb(response)
+
+    def test_multipart_file(self):
+        response = self.client.post('/api/save-face-embedding/', {
+            'member_id': self.member.id, 'image': SimpleUploadedFile('face.png', self.png, 'image/png'),
+        }, format='multipart')
+        self.assertDecodedRgb(response)
+
+    def test_base64_field(self):
+        data_url = 'data:image/png;base64,' + base64.b64encode(self.png).decode()
+        response = self.client.post('/api/save-face-embedding/', {'member_id': self.member.id, 'image': data_url},
+                                    format='json')
+        self.assertDecodedRgb(response)
+
+    def test_unreadable_images(self):
+        for body in ({'member_id': self.member.id, 'image': 'not base64!'},
+                     {'member_id': self.member.id, 'image': base64.b64encode(b'not an image').decode()}):
+            response = self.client.post('/api/save-face-embedding/', body, format='json')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post(f'/api/save-face-embedding/?member_id={self.member.id}', b'',
+                                    content_type='image/jpeg')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.images, [])
+
+    def test_busy_inference_answers_503_with_retry_after(self):
+        limiter = InferenceLimiter(max_concurrent=1, queue_timeout=0, retry_after=3)
+        with mock.patch('gymnast.views.inference_limiter', return_value=limiter), limiter.slot():
+            for url in (f'/api/save-face-embedding/?member_id={self.member.id}', '/api/face-recognition/'):
+                response = self.client.post(url, self.png, content_type='image/png')
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response['Retry-After'], '3')
+        self.assertEqual(self.images, [])
+        self.assertEqual(limiter.stats['rejected'], 2)
+
+
+class MemberListTests(TestCase):
+    """/api/members/ must cost the same number of queries whatever the page holds."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='x')
+        cls.plan = MembershipPlan.objects.create(name='Gold', description='', price=10, features=[])
+        cls.gym_class = Class.objects.create(
+            name='Spin', instructor='Sam', schedule=timezone.now(), duration_minutes=45, capacity=10,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def add_members(self, count, history=3):
+        for _ in range(count):
+            n = Member.objects.count()
+            user = User.objects.create_user(username=f'member{n}', email=f'member{n}@example.com')
+            member = Member.objects.create(user=user, membership_plan=self.plan, join_date=datetime.date(2024, 1, 1))
+            member.classes.add(self.gym_class)
+            for i in range(history):
+                Activity.objects.create(member=member, type='check-in', title='Check-in', location='Main',
+                                        timestamp=timezone.now() - datetime.timedelta(hours=i), duration='0m')
+                Booking.objects.create(member=member, class_instance=self.gym_class)
+                Achievement.objects.create(member=member, title='Streak', description='', earned_date=datetime.date.today())
+                Message.objects.create(member=member, message_type='email', content='Hi')
+
+    def list_queries(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/members/{query}')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_query_count_is_constant_per_page(self):
+        expand = '?expand=classes,activities,bookings,achievements,messages'
+        self.add_members(2)
+        few, _ = self.list_queries()
+        few_expanded, _ = self.list_queries(expand)
+        self.add_members(23)
+        full_page, body = self.list_queries()
+        full_page_expanded, _ = self.list_queries(expand)
+        self.assertEqual(len(body['results']), 25)
+        # count, members (+user, plan)
+        self.assertEqual((few, full_page), (2, 2))
+        # ... plus classes, activities, bookings (+class), achievements, messages
+        self.assertEqual((few_expanded, full_page_expanded), (7, 7))
+
+    def test_list_rows_are_compact_by_default(self):
+        self.add_members(1)
+        _, body = self.list_queries()
+        member = body['results'][0]
+        self.assertEqual(member['membership'], 'Gold')
+        self.assertIn('emergency_phone', member)
+        for key in ('classes', 'activities', 'bookings', 'achievements', 'messages'):
+            self.assertNotIn(key, member)
+
+    def test_sparse_fieldsets(self):
+        self.add_members(1)
+        _, body = self.list_queries('?fields=id,name,activities')
+        self.assertEqual(set(body['results'][0]), {'id', 'name', 'activities'})
+        _, body = self.list_queries('?expand=bookings')
+        self.assertIn('bookings', body['results'][0])
+        self.assertNotIn('activities', body['results'][0])
+
+    def test_expanded_relations_are_capped_newest_first(self):
+        self.add_members(1, history=MEMBER_NESTED_LIMIT + 5)
+        _, body = self.list_queries('?expand=classes,activities,bookings,achievements,messages')
+        member = body['results'][0]
+        self.assertEqual(member['classes'], [self.gym_class.id])
+        for key in ('activities', 'bookings', 'achievements', 'messages'):
+            self.assertEqual(len(member[key]), MEMBER_NESTED_LIMIT)
+        timestamps = [activity['timestamp'] for activity in member['activities']]
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+    def test_detail_embeds_relations(self):
+        self.add_members(1)
+        member = self.client.get(f'/api/members/{Member.objects.get().id}/').json()
+        self.assertEqual(len(member['activities']), 3)
+        self.assertEqual(member['classes'], [self.gym_class.id])
+
+
+class ActivityFeedPaginationTests(TestCase):
+    """Keyset pagination of /api/activities/: stable pages, no OFFSET / COUNT, pollable for new rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='x')
+        user = User.objects.create_user(username='member', email='member@example.com')
+        cls.member = Member.objects.create(user=user, join_date=datetime.date(2024, 1, 1))
+        cls.base = timezone.now()
+        # Pairs of rows share a timestamp, so the id tie-breaker matters
+        for i in range(12):
+            cls.add_activity(cls.base - datetime.timedelta(minutes=i // 2))
+
+    @classmethod
+    def add_activity(cls, timestamp):
+        return Activity.objects.create(member=cls.member, type='check-in', title='Check-in',
+                                       location='Main', timestamp=timestamp, duration='0m')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('COUNT(' in q['sql'] or 'OFFSET' in q['sql'] for q in queries))
+        return response.json()
+
+    def test_pages_walk_the_whole_feed_newest_first(self):
+        expected = list(Activity.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        seen, url = [], '/api/activities/?page_size=5'
+        while url:
+            body = self.get(url)
+            seen.extend(row['id'] for row in body['results'])
+            url = body['next']
+        self.assertEqual(seen, expected)
+
+    def test_previous_link_polls_for_new_rows(self):
+        first = self.get('/api/activities/?page_size=5')
+        poll = self.get(first['previous'])
+        self.assertEqual(poll['results'], [])
+        self.assertEqual(poll['previous'], first['previous'])
+
+        newer = [self.add_activity(self.base + datetime.timedelta(seconds=s)).id for s in (1, 2)]
+        poll = self.get(poll['previous'])
+        self.assertEqual([row['id'] for row in poll['results']], newer[::-1])
+        self.assertEqual(self.get(poll['previous'])['results'], [])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/activities/?cursor=not-a-cursor').status_code, 404)
+
+
+class AttendanceSummaryTests(TestCase):
+    """The summary filters on [day start, next day start) ranges, so day boundaries must still hold."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='x')
+        user = User.objects.create_user(username='member', email='member@example.com')
+        cls.member = Member.objects.create(user=user, join_date=datetime.date(2024, 1, 1))
+        cls.day = datetime.date(2025, 3, 10)
+        midnight = timezone.make_aware(datetime.datetime(2025, 3, 10))
+        for offset in (datetime.timedelta(0), datetime.timedelta(hours=9), datetime.timedelta(hours=23, minutes=59),
+                       -datetime.timedelta(seconds=1), datetime.timedelta(days=1)):
+            Activity.objects.create(member=cls.member, type='check-in', title='Check-in', location='Main',
+                                    timestamp=midnight + offset, duration='60')
+        Activity.objects.create(member=cls.member, type='class', title='Spin', location='Main',
+                                timestamp=midnight + datetime.timedelta(hours=10), duration='45')
+
+    def test_counts_only_the_selected_day(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/attendance-summary/', {'date': self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['kpi']['todaysCheckins'], 3)
+        self.assertEqual(body['kpi']['peakHour'], '11:59 PM')
+        self.assertEqual([(d['date'], d['totalVisits']) for d in body['attendanceHistory']],
+                         [('2025-03-10', 3), ('2025-03-09', 1)])
+        self.assertEqual(len(body['liveCheckins']), 3)
+        # live check-ins, history, currently in gym; the kpis reuse the history rows
+        self.assertEqual(len(queries), 3)
+
+
+class BenchmarkHotQueriesTests(TestCase):
+    """The benchmark seeds only with an explicit --force or a non-default --database, and cleans up after itself."""
+
+    def test_refuses_the_default_database(self):
+        with self.assertRaisesMessage(CommandError, '--force'):
+            call_command('benchmark_hot_queries', activities=10, stdout=io.StringIO())
+        self.assertFalse(Activity.objects.exists())
+
+    def test_seeds_reports_and_cleans_up(self):
+        out = io.StringIO()
+        call_command('benchmark_hot_queries', force=True, members=3, activities=30, classes=5, invoices=10,
+                     runs=1, stdout=out)
+        self.assertEqual(Activity.objects.count(), 30)
+        self.assertIn("Today's check-ins", out.getvalue())
+        call_command('benchmark_hot_queries', cleanup=True, stdout=out)
+        self.assertFalse(Member.objects.exists() or Activity.objects.exists())
@@ -14,7 +14,8 @@ from .views import (
     MessageListCreateView,
     AttendanceSummaryView,
     FaceRecognitionView,
-    SaveFaceEmbeddingView
+    SaveFaceEmbeddingView,
+    BulkFaceEnrolmentView,
 )
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
@@ -36,4 +37,5 @@ urlpatterns = [
     path('attendance-summary/', AttendanceSummaryView.as_view(), name='attendance_summary'),
     path('face-recognition/', FaceRecognitionView.as_view(), name='face_recognition'),
     path('save-face-embedding/', SaveFaceEmbeddingView.as_view(), name='save_face_embedding'),
+    path('bulk-enroll-faces/', BulkFaceEnrolmentView.as_view(), name='bulk_enroll_faces'),
 ]
\ No newline at end of file
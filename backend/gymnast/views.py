@@ -2,31 +2,33 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from rest_framework import generics, status
 from rest_framework.response import Response
-from django.db.models import Count
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from django.db.models import Count, Prefetch
 from .models import GymSettings, MembershipPlan, Member, Class, Activity, Booking, Achievement, Message
+from .dates import day_bounds
+from .pagination import ActivityPagination, MessagePagination
+from .parsers import OctetStreamImageParser, RawImageParser
+from .enrolment import enroll_files, files_from_uploads, files_from_zip
+from .gallery import append_template, face_gallery
 from .serializers import (
-    GymSettingsSerializer, MembershipPlanSerializer, MemberSerializer,
+    GymSettingsSerializer, MembershipPlanSerializer, MemberSerializer, MemberListSerializer,
     ClassSerializer,
     ActivitySerializer, BookingSerializer, AchievementSerializer, MessageSerializer
 )
-from facenet_pytorch import MTCNN, InceptionResnetV1
 from django.db.models.functions import Cast
 from django.db.models import FloatField
 from django.db.models import Count, Avg, Max, Min
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 from django.utils.dateparse import parse_date
 import datetime
-import cv2
-import numpy as np
-import random
-import base64
-import json
-from io import BytesIO
-from PIL import Image
-import torch
-from ultralytics import YOLO
+import zipfile
 from django.contrib.auth import get_user_model
+from face_engine.embedding import detect_and_embed
+from face_engine.images import decode_data_url, decode_image, upload_buffer
+from face_engine.limits import inference_limiter, retry_after_seconds
+from face_engine.server import InferenceUnavailable
 
 class ProfileView(APIView):
     permission_classes = [IsAuthenticated]
@@ -62,61 +64,157 @@ class ClassListCreateView(generics.ListCreateAPIView):
     queryset = Class.objects.all()
     serializer_class = ClassSerializer
 
+# Newest entries of each nested history embedded per member
+MEMBER_NESTED_LIMIT = 20
+
+
+def member_queryset(fields=None):
+    """
+    Members with everything a member serializer renders loaded up front: a
+    fixed number of queries per page (one per relation) instead of several per
+    member. `fields` are the serializer's output fields; relations it leaves
+    out are not fetched (None = all). Nested histories are newest first and
+    capped at MEMBER_NESTED_LIMIT; sliced prefetches need to_attr, which is
+    what the serializer's recent_* sources read.
+    """
+    nested = {
+        'classes': 'classes',
+        'activities': Prefetch('activity_set', to_attr='recent_activities',
+                               queryset=Activity.objects.order_by('-timestamp', '-id')[:MEMBER_NESTED_LIMIT]),
+        'bookings': Prefetch('booking_set', to_attr='recent_bookings',
+                             queryset=Booking.objects.select_related('class_instance')
+                             .order_by('-booked_at', '-id')[:MEMBER_NESTED_LIMIT]),
+        'achievements': Prefetch('achievement_set', to_attr='recent_achievements',
+                                 queryset=Achievement.objects.order_by('-earned_date', '-id')[:MEMBER_NESTED_LIMIT]),
+        'messages': Prefetch('message_set', to_attr='recent_messages',
+                             queryset=Message.objects.order_by('-sent_at', '-id')[:MEMBER_NESTED_LIMIT]),
+    }
+    return Member.objects.select_related('user', 'membership_plan').prefetch_related(
+        *(lookup for field, lookup in nested.items() if fields is None or field in fields)
+    ).order_by('id')
+
 class MemberListCreateView(generics.ListCreateAPIView):
+    """Compact rows by default; ?expand= / ?fields= pick relations and columns (see SparseFieldsetMixin)."""
     permission_classes = [IsAuthenticated]
-    queryset = Member.objects.all()
-    serializer_class = MemberSerializer
+
+    def get_serializer_class(self):
+        return MemberListSerializer if self.request.method == 'GET' else MemberSerializer
+
+    def get_queryset(self):
+        return member_queryset(self.get_serializer().fields)
 
 class MemberDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
-    queryset = Member.objects.all()
     serializer_class = MemberSerializer
 
+    def get_queryset(self):
+        return member_queryset(self.get_serializer().fields)
+
+# Face endpoints accept a raw image body (image/jpeg, image/png, application/octet-stream),
+# a multipart 'image' file, or the original base64 / data-URL 'image' field
+FACE_IMAGE_PARSERS = [JSONParser, FormParser, MultiPartParser, RawImageParser, OctetStreamImageParser]
+
+
+def request_image(request):
+    """Decode the image of a face request to RGB; None when the request carries no image."""
+    if isinstance(request.data, (bytes, bytearray)):
+        return decode_image(memoryview(request.data)) if request.data else None
+    upload = request.FILES.get('image')
+    if upload is not None:
+        return decode_image(upload_buffer(upload))
+    image_data = request.data.get('image')
+    if image_data:
+        return decode_data_url(image_data)
+    return None
+
+
+def limited_detect_and_embed(img_rgb):
+    """detect_and_embed() behind this worker's inference limiter, see face_engine/limits.py."""
+    with inference_limiter().slot():
+        return detect_and_embed(img_rgb)
+
+
+def inference_unavailable_response(error):
+    """503 asking the client to retry once the limiter or the inference server has room again."""
+    retry_after = getattr(error, 'retry_after', retry_after_seconds())
+    return Response({'error': str(error)}, status=503, headers={'Retry-After': str(retry_after)})
+
+
 class SaveFaceEmbeddingView(APIView):
     permission_classes = [IsAuthenticated]
-
-    def __init__(self):
-        super().__init__()
-        self.mtcnn = MTCNN(image_size=160, margin=0)  # Face detection
-        self.resnet = InceptionResnetV1(pretrained='vggface2').eval()  # Embedding model
+    parser_classes = FACE_IMAGE_PARSERS
 
     def post(self, request):
         try:
-            member_id = request.data.get('member_id')
-            image_data = request.data.get('image', '')
-
-            if not member_id or not image_data:
+            # Raw image bodies carry the member id in the query string
+            raw = isinstance(request.data, (bytes, bytearray))
+            member_id = request.query_params.get('member_id') if raw else request.data.get('member_id')
+            try:
+                img_rgb = request_image(request)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=400)
+
+            if not member_id or img_rgb is None:
                 return Response({'error': 'Member ID and image required'}, status=400)
 
-            # Decode base64 image
-            image_bytes = base64.b64decode(image_data.split(',')[1])
-            image = Image.open(BytesIO(image_bytes))
-            img_rgb = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-
-            # Detect face with MTCNN
-            face = self.mtcnn.detect(img_rgb)
-            if face is None:
+            # Detect face with MTCNN and extract embeddings with InceptionResNetV1
+            detections = limited_detect_and_embed(img_rgb)
+            if not len(detections):
                 return Response({'error': 'No face detected in image'}, status=400)
 
-            # Extract embedding with InceptionResNetV1
-            embedding = self.resnet(face[0])  # Returns tensor; convert to list
-            embedding_list = embedding.detach().numpy().flatten().tolist()
+            # Keep the largest face in the shot
+            embedding = detections.embeddings[detections.largest()]
 
-            # Save to Member model
+            # Add the shot to the member's template set; 'replace' starts a fresh enrolment
             member = Member.objects.get(id=member_id)
-            member.face_embedding = embedding_list
-            member.save()
+            replace_value = request.query_params.get('replace') if raw else request.data.get('replace')
+            replace = str(replace_value or '').lower() in ('1', 'true', 'yes')
+            member.face_embedding = append_template(None if replace else member.face_embedding, embedding)
+            member.save(update_fields=['face_embedding'])
 
             serializer = MemberSerializer(member)
             return Response({
                 'message': 'Face embedding saved successfully',
+                'templates': len(member.face_embedding),
                 'member': serializer.data
             })
         except Member.DoesNotExist:
             return Response({'error': 'Member not found'}, status=404)
+        except InferenceUnavailable as e:
+            return inference_unavailable_response(e)
         except Exception as e:
             return Response({'error': f'Failed to extract embedding: {str(e)}'}, status=500)
 
+class BulkFaceEnrolmentView(APIView):
+    """
+    Enrol many face images in one call: either a zip ('archive') or several
+    files ('images'), each named after its member, see gymnast/enrolment.py.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        archive = request.FILES.get('archive')
+        uploads = request.FILES.getlist('images')
+        if archive:
+            files = files_from_zip(archive)  # A generator: a bad archive only raises once enroll_files reads it
+        elif uploads:
+            files = files_from_uploads(uploads)
+        else:
+            return Response({'error': "Upload a zip as 'archive' or image files as 'images'"}, status=400)
+        try:
+            # One inference slot for the whole upload, like every other embedding view
+            with inference_limiter().slot():
+                report = enroll_files(files, replace=self._replace(request))
+        except InferenceUnavailable as e:
+            return inference_unavailable_response(e)
+        except zipfile.BadZipFile:
+            return Response({'error': 'Archive is not a valid zip file'}, status=400)
+        return Response(report.as_dict())
+
+    @staticmethod
+    def _replace(request):
+        return str(request.data.get('replace', '')).lower() in ('1', 'true', 'yes')
+
 class MembershipStatsView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
 
@@ -138,12 +236,14 @@ class MembershipStatsView(generics.ListAPIView):
 class ActivityListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ActivitySerializer
+    pagination_class = ActivityPagination
 
     def get_queryset(self):
+        activities = Activity.objects.select_related('member__user')  # member_name
         member_id = self.request.query_params.get('member_id')
         if member_id:
-            return Activity.objects.filter(member_id=member_id)
-        return Activity.objects.all()
+            return activities.filter(member_id=member_id)
+        return activities
 
 class BookingListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
@@ -168,6 +268,7 @@ class AchievementListCreateView(generics.ListCreateAPIView):
 class MessageListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = MessageSerializer
+    pagination_class = MessagePagination
 
     def get_queryset(self):
         print(f"-----------------------{self.request}")
@@ -189,34 +290,34 @@ class AttendanceSummaryView(APIView):
         except ValueError:
             return Response({"error": "Invalid date format"}, status=400)
 
+        # Explicit datetime ranges instead of timestamp__date, so the timestamp indexes are usable
+        day_start, day_end = day_bounds(selected_date)
+        today = Activity.objects.filter(timestamp__gte=day_start, timestamp__lt=day_end)
+
         # Live Check-ins (most recent activities)
-        live_checkins = Activity.objects.filter(
-            timestamp__date=selected_date,
+        live_checkins = today.filter(
             type__in=['check-in', 'check-out']
-        ).order_by('-timestamp')[:5]  # Limit to 5 for display
+        ).select_related('member__user').order_by('-timestamp')[:5]  # Limit to 5 for display
 
         # Attendance History (daily summaries for the past 7 days)
         end_date = selected_date
         start_date = end_date - timedelta(days=7)
-        history = Activity.objects.filter(
-            timestamp__date__range=[start_date, end_date],
+        history_start, history_end = day_bounds(start_date, days=8)
+        history = list(Activity.objects.filter(
+            timestamp__gte=history_start,
+            timestamp__lt=history_end,
             type='check-in'
         ).values('timestamp__date').annotate(
             total_visits=Count('id'),
             peak_hour=Max('timestamp'),
             avg_duration=Avg(Cast('duration', FloatField()))
-        ).order_by('-timestamp__date')
+        ).order_by('-timestamp__date'))
+        selected_day = next((item for item in history if item['timestamp__date'] == selected_date), None)
 
         # Currently In Gym (members with check-in but no check-out today)
-        checkins = Activity.objects.filter(
-            timestamp__date=selected_date,
-            type='check-in'
-        ).select_related('member')
-        checkouts = Activity.objects.filter(
-            timestamp__date=selected_date,
-            type='check-out'
-        ).values('member_id')
-        currently_in_gym = checkins.exclude(member_id__in=checkouts).order_by('-timestamp')[:4]
+        checkins = today.filter(type='check-in').select_related('member__user')
+        checkouts = today.filter(type='check-out').values('member_id')
+        currently_in_gym = list(checkins.exclude(member_id__in=checkouts).order_by('-timestamp')[:4])
 
         # Format data
         live_checkins_data = ActivitySerializer(live_checkins, many=True).data
@@ -244,10 +345,10 @@ class AttendanceSummaryView(APIView):
             'attendanceHistory': history_data,
             'currentlyInGym': currently_in_gym_data,
             'kpi': {
-                'todaysCheckins': Activity.objects.filter(timestamp__date=selected_date, type='check-in').count(),
+                'todaysCheckins': selected_day['total_visits'] if selected_day else 0,
                 'currentlyInGym': len(currently_in_gym),
-                'peakHour': history.filter(timestamp__date=selected_date).first()['peak_hour'].strftime('%I:%M %p') if history.filter(timestamp__date=selected_date).exists() else 'N/A',
-                'avgDuration': history.filter(timestamp__date=selected_date).first()['avg_duration'] if history.filter(timestamp__date=selected_date).exists() else '0m'
+                'peakHour': selected_day['peak_hour'].strftime('%I:%M %p') if selected_day else 'N/A',
+                'avgDuration': selected_day['avg_duration'] if selected_day else '0m'
             }
         })
 
@@ -262,134 +363,83 @@ def calculate_duration(checkin_time):
 User = get_user_model()
 class FaceRecognitionView(APIView):
     permission_classes = [AllowAny]
+    parser_classes = FACE_IMAGE_PARSERS
+
+    def check_in(self, matched_member_id, similarity):
+        """Record a check-in Activity for one matched face (member id, cosine similarity)."""
+        if matched_member_id is None or similarity < settings.FACE_MATCH_MIN_SIMILARITY:
+            return {'message': 'Face not recognized', 'attendance_updated': False}
 
-    def __init__(self):
-        super().__init__()
-        # Initialize MTCNN (Face Detection) and Resnet (Embedding) just like app1
-        self.mtcnn = MTCNN(keep_all=True, device='cpu') 
-        self.resnet = InceptionResnetV1(pretrained='vggface2').eval()
-        self.threshold = 0.6  # Match the threshold from app1
-
-    def get_known_faces(self):
-        """
-        Loads embeddings directly from the Gymnast Member database.
-        Efficiently converts stored JSON lists back to numpy arrays.
-        """
-        known_encodings = []
-        known_ids = []
-        
-        # specific to Gymnast: We use the stored face_embedding field
-        members = Member.objects.exclude(face_embedding__isnull=True).exclude(face_embedding=[])
-        
-        for member in members:
-            if member.face_embedding:
-                # Convert the stored JSON list back to a numpy array
-                encoding = np.array(member.face_embedding, dtype=np.float32)
-                known_encodings.append(encoding)
-                known_ids.append(member.id)
-                
-        return known_encodings, known_ids
+        member = Member.objects.select_related('user').get(id=matched_member_id)
+
+        # Logic: Create a Check-in Activity
+        # Optional: Check if they already checked in recently to prevent spamming
+        last_activity = Activity.objects.filter(member=member).order_by('-timestamp').first()
+
+        # Simple spam prevention (e.g., 1 minute)
+        if last_activity and (timezone.now() - last_activity.timestamp).total_seconds() < 60:
+            return {
+                'message': f'Already updated for {member.user.first_name}',
+                'attendance_updated': False,
+                'member_name': f"{member.user.first_name} {member.user.last_name}"
+            }
+
+        # Create the Activity Entry
+        activity = Activity.objects.create(
+            member=member,
+            type='check-in',
+            title=f"Face Recognition Check-in",
+            timestamp=timezone.now(),
+            location="Main Entrance", # Default location
+            confidence=similarity,  # Cosine similarity to the best template
+            duration="0m"
+        )
+
+        # Update member last visit
+        member.last_visit = timezone.now().date()
+        member.save(update_fields=['last_visit'])
+
+        serializer = ActivitySerializer(activity)
+        return {
+            'message': f'Welcome back, {member.user.first_name}!',
+            'attendance_updated': True,
+            'data': serializer.data,
+            'member_name': f"{member.user.first_name} {member.user.last_name}"
+        }
 
     def post(self, request):
         try:
-            # 1. Image Handling (Base64 or File)
-            image_file = request.FILES.get('image')
-            image_data = request.data.get('image')
-            img_rgb = None
-
-            if image_file:
-                image = Image.open(image_file)
-                img_rgb = np.array(image)
-            elif image_data:
-                if ',' in image_data:
-                    image_data = image_data.split(',')[1]
-                image_bytes = base64.b64decode(image_data)
-                image = Image.open(BytesIO(image_bytes))
-                img_rgb = np.array(image)
-            else:
+            # 1. Image Handling (raw body, multipart file or base64), decoded straight to RGB
+            try:
+                img_rgb = request_image(request)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=400)
+            if img_rgb is None:
                 return Response({'error': 'No image provided'}, status=400)
 
-            # Ensure image is RGB (OpenCV usually reads BGR, PIL reads RGB)
-            # If using cv2.imdecode above it might be BGR, so be careful. 
-            # Since we used PIL.Image.open above, it is likely RGB.
+            # 2. Detect and Encode Faces (Logic from app1 adapted)
+            # Detect faces; every face in the frame is embedded in one ResNet forward pass
+            detections = limited_detect_and_embed(img_rgb)
 
-            # 2. Detect and Encode Face (Logic from app1 adapted)
-            # Detect faces
-            boxes, _ = self.mtcnn.detect(img_rgb)
-            
-            if boxes is None:
+            if not len(detections):
                 return Response({'message': 'No faces detected', 'attendance_updated': False})
 
-            # Process the largest face found
-            box = boxes[0]
-            face_img = img_rgb[int(box[1]):int(box[3]), int(box[0]):int(box[2])]
-            
-            if face_img.size == 0:
-                return Response({'message': 'Face too small or invalid', 'attendance_updated': False})
-
-            # Resize and normalize for Resnet (standard 160x160)
-            face_img = cv2.resize(face_img, (160, 160))
-            face_img = np.transpose(face_img, (2, 0, 1)).astype(np.float32) / 255.0
-            face_tensor = torch.tensor(face_img).unsqueeze(0)
-
-            # Generate embedding
-            with torch.no_grad():
-                current_encoding = self.resnet(face_tensor).detach().numpy().flatten()
-
-            # 3. Compare with Known Members
-            known_encodings, known_ids = self.get_known_faces()
-            
-            if not known_encodings:
+            # 3. Compare with Known Members (preloaded gallery matrix, see gymnast/gallery.py)
+            face_gallery.ensure_loaded()
+            if not len(face_gallery):
                 return Response({'error': 'No members with face data found'}, status=404)
 
-            # Vectorized distance calculation (Euclidean distance)
-            # Calculate distance between current face and ALL known faces at once
-            distances = np.linalg.norm(known_encodings - current_encoding, axis=1)
-            min_distance_idx = np.argmin(distances)
-            min_distance = distances[min_distance_idx]
-
-            # 4. Update Database (Gymnast Activity Model)
-            if min_distance < self.threshold:
-                matched_member_id = known_ids[min_distance_idx]
-                member = Member.objects.get(id=matched_member_id)
-
-                # Logic: Create a Check-in Activity
-                # Optional: Check if they already checked in recently to prevent spamming
-                last_activity = Activity.objects.filter(member=member).order_by('-timestamp').first()
-                
-                # Simple spam prevention (e.g., 1 minute)
-                if last_activity and (timezone.now() - last_activity.timestamp).total_seconds() < 60:
-                     return Response({
-                        'message': f'Already updated for {member.user.first_name}',
-                        'attendance_updated': False,
-                        'member_name': f"{member.user.first_name} {member.user.last_name}"
-                    })
-
-                # Create the Activity Entry
-                activity = Activity.objects.create(
-                    member=member,
-                    type='check-in', 
-                    title=f"Face Recognition Check-in",
-                    timestamp=timezone.now(),
-                    location="Main Entrance", # Default location
-                    confidence=float(1 - min_distance), # Rough confidence score
-                    duration="0m"
-                )
-                
-                # Update member last visit
-                member.last_visit = timezone.now().date()
-                member.save()
-
-                serializer = ActivitySerializer(activity)
-                return Response({
-                    'message': f'Welcome back, {member.user.first_name}!',
-                    'attendance_updated': True,
-                    'data': serializer.data,
-                    'member_name': f"{member.user.first_name} {member.user.last_name}"
-                })
-            else:
-                return Response({'message': 'Face not recognized', 'attendance_updated': False})
+            # 4. Update Database (Gymnast Activity Model); all faces are matched in one matrix product
+            faces = [self.check_in(*match) for match in face_gallery.match_many(detections.embeddings)]
+
+            # Top-level keys describe the first check-in (or first face) so single-face clients keep working
+            checked_in = [face for face in faces if face['attendance_updated']]
+            result = dict(checked_in[0] if checked_in else faces[0])
+            result['faces'] = faces
+            return Response(result)
 
+        except InferenceUnavailable as e:
+            return inference_unavailable_response(e)
         except Exception as e:
             print(f"Error processing face: {e}")
             return Response({'error': str(e)}, status=500)
\ No newline at end of file
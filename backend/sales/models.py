@@ -22,6 +22,12 @@ class Invoice(models.Model):
 
     class Meta:
         ordering = ['-issue_date']
+        indexes = [
+            # Recent invoices and the FinancialSummaryView date range
+            models.Index(fields=['issue_date', 'status'], name='invoice_issue_status_idx'),
+            # Invoice list filtered by status, newest first
+            models.Index(fields=['status', 'issue_date'], name='invoice_status_issue_idx'),
+        ]
 
 class SalesDeal(models.Model):
     STAGE_CHOICES = [
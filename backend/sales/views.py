@@ -42,11 +42,16 @@ class FinancialSummaryView(generics.ListAPIView):
     def list(self, request, *args, **kwargs):
         today = timezone.now().date()
         last_month = today - timedelta(days=30)
-        invoices = Invoice.objects.filter(issue_date__gte=last_month)
-        paid_invoices = invoices.filter(status='paid')
-        total_revenue = paid_invoices.aggregate(total=Sum('amount'))['total'] or 0
-        outstanding_invoices = invoices.exclude(status='paid').aggregate(total=Sum('amount'))['total'] or 0
-        payment_success_rate = (paid_invoices.count() / invoices.count() * 100) if invoices.count() > 0 else 0
+        # One pass over the invoice_issue_status_idx range instead of five queries
+        totals = Invoice.objects.filter(issue_date__gte=last_month).aggregate(
+            revenue=Sum('amount', filter=Q(status='paid')),
+            outstanding=Sum('amount', filter=~Q(status='paid')),
+            paid=Count('id', filter=Q(status='paid')),
+            issued=Count('id'),
+        )
+        total_revenue = totals['revenue'] or 0
+        outstanding_invoices = totals['outstanding'] or 0
+        payment_success_rate = (totals['paid'] / totals['issued'] * 100) if totals['issued'] > 0 else 0
 
         # Placeholder for average deal size (based on closed-won deals)
         closed_deals = SalesDeal.objects.filter(stage='closed-won', close_date__gte=last_month)